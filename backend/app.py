@@ -1,84 +1,261 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, make_response, request
 from flask_cors import CORS
 from initialize_portfolio import initialize_portfolio
-from crud import get_portfolio as get_portfolio_items, handle_trade, get_cash_balance, add_funds, get_connection
-from datetime import datetime
+from crud import get_portfolio as get_portfolio_items, handle_trade, handle_trades, trade_timings, batch_trade_timings, add_funds, get_connection, check_portfolio_items, DEFAULT_ACCOUNT_ID
+from datetime import date, datetime
+from functools import wraps
+from urllib.parse import urlencode
 
-import requests_cache
+import base64
+import hashlib
+import time
+from live_updates import publisher as live_publisher
+import db_pool
+from export_streams import STREAM_FORMATS, fetch_page, stream_query, stream_response
+from intraday_series import DOWNSAMPLE_METHODS, MIN_POINTS, series_points
+import market_cache
+import metrics
+import money
+import price_history
+import shared_quotes
+from market_symbols import MARKET_INDICES, SECTOR_ETFS, ECONOMIC_INDICATORS, DOLLAR_INDEX_ALTERNATIVES
+from prefetcher import prefetcher, PREFETCH_ENABLED
+import single_flight
+from risk_metrics import format_risk_metrics, get_risk_metrics
+from quote_service import BATCH_SIZE as QUOTE_BATCH_SIZE, get_company_profile, get_quote, get_quotes, get_quotes_by_deadline
+from tax_lots import DEFAULT_LOT_METHOD, open_lots, validate_lot_selection
+from valuation import get_book_nav, get_snapshot, version as valuation_version
 import yfinance as yf
 
-requests_cache.install_cache('yfinance_cache', expire_after=86400)
 initialize_portfolio()
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:5000", "http://localhost:5173", "http://127.0.0.1:5173", "http://localhost:3000", "http://127.0.0.1:3000"])
 
+# Keep holdings, watchlist, index and sector quotes warm in the background
+if PREFETCH_ENABLED:
+    prefetcher.start()
+
+@app.before_request
+def open_unit_of_work():
+    """Share one pooled DB connection across all crud helpers used by this request."""
+    db_pool.begin_unit_of_work()
+
+@app.teardown_request
+def close_unit_of_work(exc):
+    db_pool.end_unit_of_work()
+
+def metrics_route():
+    # The route template, not the path, so /api/stock/<symbol> stays one series
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    metrics.begin_request(metrics_route())
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        metrics.end_request(metrics_route(), request.method, response.status_code,
+                            time.perf_counter() - started)
+    return response
+
+@metrics.registry.collector
+def collect_component_metrics():
+    """Cache, connection pool, single-flight and trade stage counters, read at scrape time."""
+    caches = market_cache.stats()
+    pool = db_pool.pool.stats()
+    flights = single_flight.stats()
+    stages = [("trade", trade_timings.stats()), ("batch", batch_trade_timings.stats())]
+    shared = shared_quotes.cache.stats() if shared_quotes.cache is not None else None
+    return [
+        ("portfolio_cache_hits_total", "counter", "Cache lookups answered from the tier.",
+         [({"tier": tier}, stats["hits"]) for tier, stats in caches.items()]),
+        ("portfolio_cache_misses_total", "counter", "Cache lookups that had to load.",
+         [({"tier": tier}, stats["misses"]) for tier, stats in caches.items()]),
+        ("portfolio_cache_hit_ratio", "gauge", "Hits over lookups since start.",
+         [({"tier": tier}, stats["hitRatio"]) for tier, stats in caches.items()]),
+        ("portfolio_cache_entries", "gauge", "Entries currently held by the tier.",
+         [({"tier": tier}, stats["size"]) for tier, stats in caches.items()]),
+        ("portfolio_db_pool_connections", "gauge", "Pooled DB connections by state.",
+         [({"state": "in_use"}, pool["inUse"]), ({"state": "idle"}, pool["idle"])]),
+        ("portfolio_db_pool_waits_total", "counter", "Checkouts that had to wait for a free connection.",
+         [({}, pool["waits"])]),
+        ("portfolio_db_pool_timeouts_total", "counter", "Checkouts that gave up waiting.",
+         [({}, pool["timeouts"])]),
+        ("portfolio_single_flight_executions_total", "counter", "Calls that ran their work.",
+         [({"group": group}, stats["executions"]) for group, stats in flights.items()]),
+        ("portfolio_single_flight_coalesced_total", "counter", "Calls that shared an in-flight result.",
+         [({"group": group}, stats["coalesced"]) for group, stats in flights.items()]),
+        ("portfolio_trade_stage_p95_seconds", "gauge", "p95 of recent trade stages.",
+         [({"kind": kind, "stage": stage}, values["p95Ms"] / 1000)
+          for kind, timings in stages for stage, values in timings.items() if "p95Ms" in values]),
+    ] + ([
+        ("portfolio_shared_cache_lookups_total", "counter", "Shared quote cache lookups by outcome.",
+         [({"result": result}, shared[key]) for result, key in (("hit", "hits"), ("miss", "misses"), ("stale", "stale"))]),
+        ("portfolio_shared_cache_refresher", "gauge", "1 if this worker refreshes the shared cache.",
+         [({}, int(shared["isRefresher"]))]),
+    ] if shared is not None else [])
+
+def coalesce_requests(view):
+    """Let concurrent identical GET requests share one run of the view.
+
+    Requests with the same path and query string that arrive while one is
+    being computed wait for it and get a copy of its response.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+
+        def render():
+            response = make_response(view(*args, **kwargs))
+            return response.get_data(), response.status_code, list(response.headers)
+
+        body, status, headers = single_flight.endpoints.do(key, render)
+        return Response(body, status=status, headers=headers)
+    return wrapper
+
+@app.route('/api/db_pool')
+def get_db_pool_stats():
+    """Connection pool size, health check and wait-time statistics."""
+    return jsonify(db_pool.pool.stats()), 200
+
 @app.route('/api/portfolio')
 def get_portfolio():
-    """API endpoint to get portfolio items with cash balance."""
+    """API endpoint to get portfolio items with cash balance.
+
+    The serialized body is memoized per portfolio version (trades, deposits
+    and quote changes) and day, and carries a strong ETag, so polling with
+    If-None-Match gets an empty 304 until something actually changed.
+    The version is per process: with several workers, the others keep
+    serving their memoized body until the responses tier expires it.
+    """
     try:
         num_entries = int(request.args.get('numEntries', 5))
         order_by = request.args.get('orderBy', 'pi_id')
-        portfolio_items = get_portfolio_items(order_by)
+        query = request.query_string
+
+        def render():
+            # Read the version first and only memoize the body if nothing changed
+            # while computing, as valuation.get_snapshot() does; otherwise a trade
+            # committed mid-compute would pin the pre-trade body under its version
+            version = valuation_version()
+            body = jsonify(get_portfolio_items(order_by)).get_data()
+            etag = hashlib.sha1(body).hexdigest()
+            if valuation_version() == version:
+                market_cache.responses.set(('/api/portfolio', query, version, date.today()), (body, etag))
+            return body, etag
+
+        cached = market_cache.responses.get(('/api/portfolio', query, valuation_version(), date.today()))
+        # Concurrent misses share one computation
+        body, etag = cached or single_flight.endpoints.do(('/api/portfolio', query), render)
 
         # Cash balance is already included in the response from   fixed crud.py
-        return jsonify(portfolio_items), 200
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/holdings/check', methods=['GET', 'POST'])
+def check_holdings():
+    """Consistency check of incrementally maintained holdings; POST also repairs them."""
+    try:
+        return jsonify(check_portfolio_items(repair=request.method == 'POST')), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/admin/nav')
+@coalesce_requests
+def get_admin_book_nav():
+    """Book-wide NAV: every account valued in one vectorized pass, plus book totals.
+
+    ?summary=1 leaves out the per-account rows.
+    """
+    try:
+        return jsonify(get_book_nav(include_accounts=request.args.get('summary') != '1')), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/market_cache')
+def get_market_cache_stats():
+    """Hit/miss and eviction counters for the quote, metadata and history caches."""
+    return jsonify(market_cache.stats()), 200
+
+@app.route('/api/stream/portfolio')
+def stream_portfolio():
+    """Server-Sent Events: a full snapshot, then only the portfolio and quote fields that changed.
+
+    One publisher thread computes each delta once for all subscribers. Each
+    open stream parks one server thread on its own queue, so serve the app
+    with gunicorn.conf.py, whose gthread workers are sized for many streams.
+    """
+    response = Response(live_publisher.stream(), mimetype='text/event-stream')
+    response.headers["Cache-Control"] = "no-cache"
+    # Ask reverse proxies (nginx) not to buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route('/api/stream/status')
+def get_stream_status():
+    """Subscriber count and publish counters for the live update stream."""
+    return jsonify(live_publisher.status()), 200
+
+@app.route('/metrics')
+def get_metrics():
+    """Route latency, DB query, Yahoo call, cache and pool metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/single_flight')
+def get_single_flight_stats():
+    """Executions vs coalesced callers for quotes, history loads and endpoint responses."""
+    return jsonify(single_flight.stats()), 200
+
+@app.route('/api/shared_cache')
+def get_shared_cache_stats():
+    """This worker's view of the cross-process quote cache and which process refreshes it."""
+    if shared_quotes.cache is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify(shared_quotes.cache.stats()), 200
+
+@app.route('/api/prefetcher')
+def get_prefetcher_status():
+    """Refresh cadence and last-refresh age for every prefetched symbol."""
+    return jsonify(prefetcher.status()), 200
+
+def mark_partial(response, late_symbols):
+    """Flag a response whose quote fan-out missed the deadline for some symbols.
+
+    The body keeps its usual shape (fallback zeros for the late symbols);
+    clients that care read X-Partial-Response and X-Missing-Symbols.
+    """
+    if late_symbols:
+        response.headers["X-Partial-Response"] = "true"
+        response.headers["X-Missing-Symbols"] = ",".join(late_symbols)
+    return response
+
 @app.route('/api/market_movers')
+@coalesce_requests
 def get_market_movers():
     try:
-        # Get S&P 500 data
-        sp500 = yf.Ticker("^GSPC")
-        sp500_info = sp500.info
-        
-        # Get Dow Jones data
-        dow = yf.Ticker("^DJI")
-        dow_info = dow.info
-        
-        # Get NASDAQ data
-        nasdaq = yf.Ticker("^IXIC")
-        nasdaq_info = nasdaq.info
-        
-        # Get Russell 2000 data
-        russell = yf.Ticker("^RUT")
-        russell_info = russell.info
-        
-        market_movers = {
-            "S&P 500": {
-                "name": "S&P 500",
-                "symbol": "^GSPC",
-                "value": round(sp500_info.get('regularMarketPrice', 0), 2),
-                "change": round(sp500_info.get('regularMarketChange', 0), 2),
-                "changePercent": round(sp500_info.get('regularMarketChangePercent', 0), 2),
-                "volume": sp500_info.get('volume', 0)
-            },
-            "Dow Jones": {
-                "name": "Dow Jones Industrial Average",
-                "symbol": "^DJI",
-                "value": round(dow_info.get('regularMarketPrice', 0), 2),
-                "change": round(dow_info.get('regularMarketChange', 0), 2),
-                "changePercent": round(dow_info.get('regularMarketChangePercent', 0), 2),
-                "volume": dow_info.get('volume', 0)
-            },
-            "NASDAQ": {
-                "name": "NASDAQ Composite",
-                "symbol": "^IXIC",
-                "value": round(nasdaq_info.get('regularMarketPrice', 0), 2),
-                "change": round(nasdaq_info.get('regularMarketChange', 0), 2),
-                "changePercent": round(nasdaq_info.get('regularMarketChangePercent', 0), 2),
-                "volume": nasdaq_info.get('volume', 0)
-            },
-            "Russell 2000": {
-                "name": "Russell 2000",
-                "symbol": "^RUT",
-                "value": round(russell_info.get('regularMarketPrice', 0), 2),
-                "change": round(russell_info.get('regularMarketChange', 0), 2),
-                "changePercent": round(russell_info.get('regularMarketChangePercent', 0), 2),
-                "volume": russell_info.get('volume', 0)
+        indices = MARKET_INDICES
+
+        # Concurrent requests for all four indices, bounded by the fan-out deadline
+        quotes, late = get_quotes_by_deadline([symbol for _, symbol in indices.values()])
+
+        market_movers = {}
+        for key, (name, symbol) in indices.items():
+            quote = quotes.get(symbol)
+            market_movers[key] = {
+                "name": name,
+                "symbol": symbol,
+                "value": round(quote.price, 2) if quote else 0,
+                "change": round(quote.change, 2) if quote else 0,
+                "changePercent": round(quote.change_percent, 2) if quote else 0,
+                "volume": quote.volume if quote else 0
             }
-        }
-        return jsonify(market_movers), 200
+        return mark_partial(jsonify(market_movers), late), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -86,33 +263,41 @@ def get_market_movers():
 def get_stock_data(symbol):
     """Get real-time stock data using yfinance."""
     try:
-        ticker = yf.Ticker(symbol.upper())
-        info = ticker.info
-        
-        # Get current price and previous close
-        current_price = info.get('regularMarketPrice', 0)
-        previous_close = info.get('regularMarketPreviousClose', current_price)
-        change = current_price - previous_close
-        change_percent = (change / previous_close * 100) if previous_close > 0 else 0
-        
+        quote = get_quote(symbol)
+        if quote is None:
+            return jsonify({"error": f"No quote available for {symbol.upper()}"}), 404
+
+        # Company profile is only needed for the name and market cap
+        profile = get_company_profile(symbol)
         
         stock_data = {
             "symbol": symbol.upper(),
-            "companyName": info.get('longName', symbol.upper()),
-            "price": round(current_price, 2),
-            "change": round(change, 2),
-            "changePercent": round(change_percent, 2),
-            "volume": info.get('volume', 0),
-            "marketCap": info.get('marketCap', 0),
-            "previousClose": info.get('regularMarketPreviousClose', 0),
-            "dayLow": info.get("regularMarketDayLow", 0),
-            "dayHigh": info.get("regularMarketDayHigh", 0)
+            "companyName": profile['longName'],
+            "price": round(quote.price, 2),
+            "change": round(quote.change, 2),
+            "changePercent": round(quote.change_percent, 2),
+            "volume": quote.volume,
+            "marketCap": profile['marketCap'],
+            "previousClose": quote.previous_close,
+            "dayLow": quote.day_low,
+            "dayHigh": quote.day_high
         }
         
         return jsonify(stock_data), 200
     except Exception as e:
         return jsonify({"error": f"Failed to fetch stock data for {symbol}: {str(e)}"}), 500
 
+def request_account_id(data):
+    """Cash account named by a request body's optional account_id; the default account otherwise."""
+    account_id = (data or {}).get('account_id', DEFAULT_ACCOUNT_ID)
+    try:
+        valid = not isinstance(account_id, bool) and int(account_id) == account_id and account_id > 0
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError("account_id must be a positive integer")
+    return int(account_id)
+
 @app.route('/api/add-funds', methods=['POST'])
 def add_funds_endpoint():
     """API endpoint to add funds to cash account -   EXACT TRANSACTION LOGIC."""
@@ -122,9 +307,12 @@ def add_funds_endpoint():
         
         if amount <= 0:
             return jsonify({"error": "Amount must be positive"}), 400
-        
-        # Use   exact add_funds function from crud.py
-        result = add_funds(amount)
+
+        try:
+            # Unknown accounts raise too
+            result = add_funds(amount, request_account_id(data))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         if result:
             return jsonify({
@@ -154,8 +342,11 @@ def buy_stock():
         if quantity <= 0:
             return jsonify({"error": "Quantity must be positive"}), 400
         
-        # Use handle_trade function from crud.py
-        handle_trade(symbol, quantity, 'BUY')
+        # Use handle_trade function from crud.py; an invalid or unknown account is a 400
+        try:
+            handle_trade(symbol, quantity, 'BUY', ca_id=request_account_id(data))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         print(f"Successfully processed buy for {symbol}")
         
@@ -180,8 +371,11 @@ def sell_stock():
         if quantity <= 0:
             return jsonify({"error": "Quantity must be positive"}), 400
         
-        # Use   handle_trade function from crud.py
-        handle_trade(symbol, quantity, 'SELL')
+        # Use   handle_trade function from crud.py; an invalid or unknown account is a 400
+        try:
+            handle_trade(symbol, quantity, 'SELL', ca_id=request_account_id(data))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         return jsonify({
             "message": f"Successfully sold {quantity} shares of {symbol}",
@@ -200,34 +394,198 @@ def trade():
         symbol = data.get('symbol', '').upper()
         amount = int(data.get('amount', 0))
         trade_type = data.get('trade_type', '').upper()
+        lot_method = data.get('lot_method', DEFAULT_LOT_METHOD)
+        lot_ids = data.get('lot_ids')
         
         if not symbol or amount <= 0 or trade_type not in ['BUY', 'SELL']:
             return jsonify({"error": "Invalid parameters. Required: symbol, amount, trade_type (BUY/SELL)"}), 400
-        
-        # Use the handle_trade function from crud.py
-        handle_trade(symbol, amount, trade_type)
+
+        try:
+            # Lot selection only applies to sells, as in handle_trade
+            if trade_type == 'SELL':
+                lot_method = validate_lot_selection(lot_method, lot_ids)
+            account_id = request_account_id(data)
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Use the handle_trade function from crud.py; ValueErrors (e.g. an unknown account) are a 400
+        try:
+            timings = handle_trade(symbol, amount, trade_type, lot_method=lot_method, lot_ids=lot_ids,
+                                   ca_id=account_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         return jsonify({
             "message": f"Successfully {trade_type.lower()}ed {amount} shares of {symbol}",
             "symbol": symbol,
             "quantity": amount,
-            "type": trade_type
+            "type": trade_type,
+            "accountId": account_id,
+            "timingsMs": {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
         }), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/trades/batch', methods=['POST'])
+def trade_batch():
+    """Execute several buys and sells atomically, e.g. a rebalance.
+
+    Body: {"trades": [{"symbol", "amount", "trade_type", "lot_method"?, "lot_ids"?}, ...],
+    "account_id"?}; every leg is booked in the same account.
+    Every leg is validated before anything is written; if one is invalid
+    (unknown symbol, insufficient funds or shares), none are executed.
+    """
+    try:
+        data = request.get_json() or {}
+        legs = data.get('trades')
+        if not isinstance(legs, list) or not legs:
+            return jsonify({"error": "Invalid parameters. Required: trades (non-empty list)"}), 400
+
+        try:
+            executed = handle_trades(legs, ca_id=request_account_id(data))
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify({
+            "message": f"Successfully executed {len(executed)} trades",
+            "trades": executed,
+            "count": len(executed)
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/trade_timings')
+def get_trade_timings():
+    """Per-stage latency (validate, price, metadata, persist) of recent single and batch trades."""
+    return jsonify({
+        "trade": trade_timings.stats(),
+        "batchTrade": batch_trade_timings.stats()
+    }), 200
+
+@app.route('/api/tax_lots')
+def get_tax_lots():
+    """Open tax lots of an account (?account, default account otherwise), optionally
+    filtered by symbol, for SPECIFIC lot selection."""
+    try:
+        account_id = int(request.args.get('account', DEFAULT_ACCOUNT_ID))
+    except ValueError:
+        return jsonify({"error": "account must be an integer"}), 400
+    try:
+        conn = get_connection()
+        lots = open_lots(conn, request.args.get('symbol'), account_id)
+        conn.close()
+
+        return jsonify([{
+            "id": lot['id'],
+            "accountId": lot['accountId'],
+            "symbol": lot['symbol'],
+            "date": lot['date'].strftime('%Y-%m-%d'),
+            "quantity": float(lot['quantity']),
+            "remainingQuantity": float(lot['remainingQuantity']),
+            "price": float(lot['price'])
+        } for lot in lots]), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/risk_metrics')
+@coalesce_requests
+def get_portfolio_risk_metrics():
+    """Beta, Sharpe, max drawdown, volatility and S&P 500 correlation of the current holdings.
+
+    Includes the rolling-window series (one point per window end); the
+    values are recomputed at most once per holdings change and trading day.
+    """
+    try:
+        return jsonify(get_risk_metrics(get_snapshot().holdings)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Page size bounds for /api/transactions
+TRANSACTIONS_DEFAULT_LIMIT = 100
+TRANSACTIONS_MAX_LIMIT = 1000
+
+def encode_transactions_cursor(row_date, row_id):
+    """Opaque keyset cursor pointing just past (pt_date, pt_id)."""
+    raw = f"{row_date.strftime('%Y-%m-%d')}:{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_transactions_cursor(value):
+    padded = value + '=' * (-len(value) % 4)
+    row_date, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+    return datetime.strptime(row_date, '%Y-%m-%d').date(), int(row_id)
+
+def parse_transaction_filters(args):
+    """Build the WHERE clause for the account, symbol, type and date range filters."""
+    conditions = []
+    params = []
+
+    # The default account unless another one, or all of them, is asked for
+    account = args.get('account', str(DEFAULT_ACCOUNT_ID))
+    if account != 'all':
+        conditions.append("pt_ca_id = %s")
+        params.append(int(account))
+
+    symbol = args.get('symbol')
+    if symbol:
+        conditions.append("pt_symbol = %s")
+        params.append(symbol.upper())
+
+    trade_type = args.get('type')
+    if trade_type:
+        trade_type = trade_type.upper()
+        if trade_type not in ('BUY', 'SELL'):
+            raise ValueError("type must be buy or sell")
+        conditions.append("pt_type = %s")
+        params.append(trade_type)
+
+    start_date = args.get('start_date')
+    if start_date:
+        conditions.append("pt_date >= %s")
+        params.append(datetime.strptime(start_date, '%Y-%m-%d').date())
+
+    end_date = args.get('end_date')
+    if end_date:
+        conditions.append("pt_date <= %s")
+        params.append(datetime.strptime(end_date, '%Y-%m-%d').date())
+
+    return conditions, params
+
 @app.route('/api/transactions')
 def get_transactions():
-    """Get all portfolio transactions ordered by date (most recent first)."""
+    """Get one page of portfolio transactions, most recent first.
+
+    Pages are keyset-paginated on (pt_date, pt_id): pass the X-Next-Cursor
+    response header back as ?cursor= to get the next page. Optional filters:
+    account (an id or "all"; the default account otherwise), symbol, type
+    (buy/sell), start_date and end_date (YYYY-MM-DD, inclusive).
+    """
+    try:
+        limit = min(int(request.args.get('limit', TRANSACTIONS_DEFAULT_LIMIT)), TRANSACTIONS_MAX_LIMIT)
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        conditions, params = parse_transaction_filters(request.args)
+
+        page_cursor = request.args.get('cursor')
+        if page_cursor:
+            cursor_date, cursor_id = decode_transactions_cursor(page_cursor)
+            conditions.append("(pt_date < %s OR (pt_date = %s AND pt_id < %s))")
+            params.extend([cursor_date, cursor_date, cursor_id])
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
     try:
         conn = get_connection()
         cursor = conn.cursor(dictionary=True)
-        
-        # Get all transactions ordered by date (most recent first)
-        cursor.execute("""
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # Fetch one extra row to know whether another page exists
+        cursor.execute(f"""
             SELECT 
                 pt_id as id,
+                pt_ca_id as accountId,
                 pt_symbol as symbol,
                 pt_name as companyName,
                 pt_sector as sector,
@@ -236,23 +594,28 @@ def get_transactions():
                 pt_price as price,
                 pt_type as type,
                 pt_date as date,
-                (pt_quantity * pt_price) as totalAmount
+                ROUND(pt_quantity * pt_price, 2) as totalAmount
             FROM portfolio_transaction 
+            {where}
             ORDER BY pt_date DESC, pt_id DESC
-        """)
+            LIMIT %s
+        """, (*params, limit + 1))
         
         transactions = cursor.fetchall()
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
         
         # Convert to proper format for frontend
         formatted_transactions = []
         for transaction in transactions:
             formatted_transactions.append({
                 "id": transaction['id'],
+                "accountId": transaction['accountId'],
                 "symbol": transaction['symbol'],
                 "companyName": transaction['companyName'],
                 "sector": transaction['sector'],
                 "industry": transaction['industry'],
-                "shares": transaction['shares'],
+                "shares": float(transaction['shares']),
                 "price": float(transaction['price']),
                 "type": transaction['type'].lower(),  # Convert BUY/SELL to buy/sell
                 "date": transaction['date'].strftime('%Y-%m-%d') if transaction['date'] else None,
@@ -263,14 +626,98 @@ def get_transactions():
         cursor.close()
         conn.close()
         
-        return jsonify(formatted_transactions), 200
+        # The body stays a plain array for existing clients; paging info goes in headers
+        response = jsonify(formatted_transactions)
+        if has_more:
+            last = transactions[-1]
+            next_cursor = encode_transactions_cursor(last['date'], last['id'])
+            args = request.args.to_dict()
+            args['cursor'] = next_cursor
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+        return response, 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/transactions/summary')
+def get_transactions_summary():
+    """Totals over every transaction matching the /api/transactions filters.
+
+    Lets clients show whole-history figures while loading the history itself
+    one page at a time. Amounts are summed in cents.
+    """
+    try:
+        conditions, params = parse_transaction_filters(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor.execute(f"""
+            SELECT
+                COUNT(*) AS total,
+                IFNULL(SUM(pt_type = 'BUY'), 0) AS buys,
+                IFNULL(SUM(pt_type = 'SELL'), 0) AS sells,
+                {money.column("IFNULL(SUM(CASE WHEN pt_type = 'BUY' THEN ROUND(pt_quantity * pt_price, 2) ELSE 0 END), 0)", money.CENTS)}
+                    AS buy_cents,
+                {money.column("IFNULL(SUM(CASE WHEN pt_type = 'SELL' THEN ROUND(pt_quantity * pt_price, 2) ELSE 0 END), 0)", money.CENTS)}
+                    AS sell_cents,
+                COUNT(DISTINCT pt_date) AS trading_days
+            FROM portfolio_transaction
+            {where}
+        """, params)
+        totals = cursor.fetchone()
+
+        cursor.execute(f"""
+            SELECT pt_symbol AS symbol
+            FROM portfolio_transaction
+            {where}
+            GROUP BY pt_symbol
+            ORDER BY COUNT(*) DESC, pt_symbol
+            LIMIT 1
+        """, params)
+        most_traded = cursor.fetchone()
+
+        cursor.close()
+        conn.close()
+
+        return jsonify({
+            "totalTransactions": int(totals['total']),
+            "buyTransactions": int(totals['buys']),
+            "sellTransactions": int(totals['sells']),
+            "totalBuyValue": money.dollars(totals['buy_cents']),
+            "totalSellValue": money.dollars(totals['sell_cents']),
+            "tradingDays": int(totals['trading_days']),
+            "mostTradedSymbol": most_traded['symbol'] if most_traded else None,
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/market_performance')
+@coalesce_requests
 def get_market_performance():
-    """Get intraday performance data for major market indices."""
+    """Get intraday performance data for major market indices.
+
+    ?points=N downsamples each series to about N points (LTTB by default,
+    ?downsample=minmax for per-bucket extremes) for charts that can't show
+    every 1-minute bar anyway.
+    """
+    try:
+        points = request.args.get('points')
+        points = int(points) if points else None
+        if points is not None and points < MIN_POINTS:
+            raise ValueError(f"points must be at least {MIN_POINTS}")
+        downsample = request.args.get('downsample', 'lttb').lower()
+        if downsample not in DOWNSAMPLE_METHODS:
+            raise ValueError(f"downsample must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
     try:
         import datetime
         
@@ -292,16 +739,12 @@ def get_market_performance():
                 ticker = yf.Ticker(symbol)
                 
                 # Get intraday data for today (1-minute intervals)
-                intraday = ticker.history(period="1d", interval="1m")
+                with metrics.yahoo_call("intraday", symbol):
+                    intraday = ticker.history(period="1d", interval="1m")
                 
                 if not intraday.empty:
-                    # Convert to list of time-value pairs
-                    data_points = []
-                    for timestamp, row in intraday.iterrows():
-                        data_points.append({
-                            "time": timestamp.strftime('%H:%M'),
-                            "value": round(row['Close'], 2)
-                        })
+                    # Convert to list of time-value pairs, column-wise
+                    data_points = series_points(intraday, points, downsample)
                     
                     performance_data[name] = {
                         "symbol": symbol,
@@ -312,8 +755,8 @@ def get_market_performance():
                         "changePercent": round(((intraday['Close'].iloc[-1] - intraday['Open'].iloc[0]) / intraday['Open'].iloc[0]) * 100, 2)
                     }
                 else:
-                    # Fallback to daily data if intraday not available
-                    daily = ticker.history(period="2d")
+                    # Fallback to the last two closed daily bars if intraday not available
+                    daily = price_history.get_history(symbol, datetime.date.today() - datetime.timedelta(days=10))
                     if len(daily) >= 2:
                         current = daily.iloc[-1]
                         previous = daily.iloc[-2]
@@ -348,41 +791,34 @@ def get_market_performance():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/sector_performance')
+@coalesce_requests
 def get_sector_performance():
     """Get real-time sector performance data from major sector ETFs."""
     try:
         # Define major sector ETFs with their symbols
-        sector_etfs = {
-            "Technology": "XLK",      # Technology Select Sector SPDR
-            "Healthcare": "XLV",      # Health Care Select Sector SPDR
-            "Financial": "XLF",       # Financial Select Sector SPDR
-            "Energy": "XLE",          # Energy Select Sector SPDR
-            "Consumer Discretionary": "XLY",  # Consumer Discretionary Select Sector SPDR
-            "Consumer Staples": "XLP", # Consumer Staples Select Sector SPDR
-            "Industrials": "XLI",     # Industrial Select Sector SPDR
-            "Materials": "XLB",       # Materials Select Sector SPDR
-            "Real Estate": "XLRE",    # Real Estate Select Sector SPDR
-            "Utilities": "XLU",       # Utilities Select Sector SPDR
-            "Communication Services": "XLC"  # Communication Services Select Sector SPDR
-        }
+        sector_etfs = SECTOR_ETFS
         
         sector_performance = []
+
+        # Concurrent requests for all sector ETFs, bounded by the fan-out deadline
+        quotes, late = get_quotes_by_deadline(list(sector_etfs.values()))
         
         for sector_name, symbol in sector_etfs.items():
             try:
-                ticker = yf.Ticker(symbol)
-                info = ticker.info
+                quote = quotes.get(symbol)
+                if quote is None:
+                    raise ValueError("no quote returned")
                 
                 # Get current price and previous close
-                current_price = info.get('regularMarketPrice', 0)
-                previous_close = info.get('regularMarketPreviousClose', current_price)
+                current_price = quote.price
+                previous_close = quote.previous_close
                 
                 # Calculate change and percentage change
-                change = current_price - previous_close
-                change_percent = (change / previous_close * 100) if previous_close > 0 else 0
+                change = quote.change
+                change_percent = quote.change_percent
                 
                 # Get volume
-                volume = info.get('volume', 0)
+                volume = quote.volume
                 volume_formatted = f"{(volume / 1000000):.1f}M" if volume > 0 else "N/A"
                 
                 # Get top holdings (simplified - just get the ETF name for now)
@@ -420,66 +856,46 @@ def get_sector_performance():
         # Sort by absolute change percentage (highest to lowest)
         sector_performance.sort(key=lambda x: abs(x['change']), reverse=True)
         
-        return jsonify(sector_performance), 200
+        return mark_partial(jsonify(sector_performance), late), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/economic_indicators')
+@coalesce_requests
 def get_economic_indicators():
     """Get real-time economic indicators data."""
     try:
         # Define economic indicators to track
-        indicators = {
-            "10-Year Treasury": "^TNX",
-            "30-Year Treasury": "^TYX", 
-            "Dollar Index": "DXY",
-            "Gold": "GC=F",
-            "Oil (WTI)": "CL=F",
-            "Natural Gas": "NG=F"
-        }
+        indicators = ECONOMIC_INDICATORS
         
         economic_data = {}
+
+        dollar_index_alternatives = DOLLAR_INDEX_ALTERNATIVES
+
+        # Concurrent requests for every indicator and the Dollar Index fallbacks,
+        # bounded by the fan-out deadline
+        quotes, late = get_quotes_by_deadline(list(indicators.values()) + dollar_index_alternatives)
         
         for name, symbol in indicators.items():
             try:
-                ticker = yf.Ticker(symbol)
-                
-                # Try multiple methods to get the data
                 current_value = 0
                 previous_close = 0
+
+                quote = quotes.get(symbol)
+                if quote is not None:
+                    current_value = quote.price
+                    previous_close = quote.previous_close
                 
-                # Method 1: Try ticker.info
-                info = ticker.info
-                current_value = info.get('regularMarketPrice', 0)
-                previous_close = info.get('regularMarketPreviousClose', current_value)
-                
-                # Method 2: If no data from info, try history
-                if current_value == 0:
-                    try:
-                        history = ticker.history(period="2d")
-                        if not history.empty and len(history) >= 2:
-                            current_value = history['Close'].iloc[-1]
-                            previous_close = history['Close'].iloc[-2]
-                    except Exception as hist_error:
-                        print(f"History method failed for {name} ({symbol}): {hist_error}")
-                
-                # Method 3: For Dollar Index specifically, try alternative symbols
+                # For Dollar Index specifically, try alternative symbols
                 if name == "Dollar Index" and current_value == 0:
-                    try:
-                        # Try alternative Dollar Index symbols
-                        alt_symbols = ["^DXY", "DX-Y.NYB", "UUP"]
-                        for alt_symbol in alt_symbols:
-                            alt_ticker = yf.Ticker(alt_symbol)
-                            alt_info = alt_ticker.info
-                            alt_value = alt_info.get('regularMarketPrice', 0)
-                            if alt_value > 0:
-                                current_value = alt_value
-                                previous_close = alt_info.get('regularMarketPreviousClose', alt_value)
-                                print(f"Found Dollar Index data using {alt_symbol}: {current_value}")
-                                break
-                    except Exception as alt_error:
-                        print(f"Alternative symbols failed for Dollar Index: {alt_error}")
+                    for alt_symbol in dollar_index_alternatives:
+                        alt_quote = quotes.get(alt_symbol)
+                        if alt_quote is not None and alt_quote.price > 0:
+                            current_value = alt_quote.price
+                            previous_close = alt_quote.previous_close
+                            print(f"Found Dollar Index data using {alt_symbol}: {current_value}")
+                            break
                 
                 # Calculate changes
                 change = current_value - previous_close
@@ -512,54 +928,175 @@ def get_economic_indicators():
                     "trend": "neutral"
                 }
         
-        return jsonify(economic_data), 200
+        return mark_partial(jsonify(economic_data), late), 200
     except Exception as e:
         return jsonify({"error": f"Failed to fetch economic indicators: {str(e)}"}), 500
 
+EXPORT_TRANSACTIONS_SQL = """
+    SELECT 
+        pt_id as id,
+        pt_ca_id as accountId,
+        pt_symbol as symbol,
+        pt_name as companyName,
+        pt_sector as sector,
+        pt_industry as industry,
+        pt_quantity as quantity,
+        pt_price as price,
+        pt_type as type,
+        pt_date as date,
+        ROUND(pt_quantity * pt_price, 2) as totalAmount
+    FROM portfolio_transaction 
+    {where}
+    ORDER BY pt_date DESC, pt_id DESC
+"""
+
+EXPORT_TRANSACTION_FIELDS = ["id", "accountId", "symbol", "companyName", "sector", "industry",
+                             "quantity", "price", "type", "date", "totalAmount"]
+
+# One keyset page of holdings after a symbol; quantity and avgPrice arrive as
+# integer share and price units (see money.py)
+EXPORT_HOLDINGS_SQL = f"""
+    SELECT 
+        pi_symbol as symbol,
+        pi_name as name,
+        pi_sector as sector,
+        pi_industry as industry,
+        {money.column("pi_total_quantity", money.SHARE_UNITS)} as quantity,
+        {money.column("pi_weighted_average_price", money.PRICE_UNITS)} as avgPrice
+    FROM portfolio_item
+    WHERE pi_ca_id = %s AND pi_symbol > %s
+    ORDER BY pi_symbol
+    LIMIT %s
+"""
+
+EXPORT_HOLDING_FIELDS = ["symbol", "name", "sector", "industry", "quantity", "avgPrice",
+                         "currentPrice", "marketValue", "costBasis", "gainLoss", "gainLossPercent"]
+
+def format_export_transaction(transaction):
+    return {
+        "id": transaction['id'],
+        "accountId": transaction['accountId'],
+        "symbol": transaction['symbol'],
+        "companyName": transaction['companyName'],
+        "sector": transaction['sector'],
+        "industry": transaction['industry'],
+        "quantity": float(transaction['quantity']),
+        "price": float(transaction['price']),
+        "type": transaction['type'],
+        "date": transaction['date'].strftime('%Y-%m-%d') if transaction['date'] else None,
+        "totalAmount": float(transaction['totalAmount'])
+    }
+
+def format_export_holding(holding, quantity, avg_price, current_price):
+    """Export row for one holding; quantity is in share units, the prices in price units."""
+    market_value = money.value_cents(quantity, current_price)
+    cost_basis = money.value_cents(quantity, avg_price)
+    gain_loss = market_value - cost_basis
+    gain_loss_percent = (gain_loss / cost_basis * 100) if cost_basis > 0 else 0
+    cents_per_price_unit = money.PRICE_UNITS // money.CENTS
+
+    return {
+        "symbol": holding['symbol'],
+        "name": holding['name'],
+        "sector": holding['sector'],
+        "industry": holding['industry'],
+        "quantity": quantity / money.SHARE_UNITS,
+        "avgPrice": money.dollars(money.rescale(avg_price, cents_per_price_unit)),
+        "currentPrice": money.dollars(money.rescale(current_price, cents_per_price_unit)),
+        "marketValue": money.dollars(market_value),
+        "costBasis": money.dollars(cost_basis),
+        "gainLoss": money.dollars(gain_loss),
+        "gainLossPercent": round(gain_loss_percent, 2)
+    }
+
+def stream_export_holdings():
+    """Yield holding rows, pricing them one quote batch at a time.
+
+    Each batch is a keyset page read on its own connection, which is back in
+    the pool before the batch is quoted, so no cursor stays open across the
+    Yahoo calls.
+    """
+    last_symbol = ""
+    while True:
+        batch = fetch_page(EXPORT_HOLDINGS_SQL, (DEFAULT_ACCOUNT_ID, last_symbol, QUOTE_BATCH_SIZE))
+        yield from _price_holdings_batch(batch)
+        if len(batch) < QUOTE_BATCH_SIZE:
+            return
+        last_symbol = batch[-1]['symbol']
+
+def _price_holdings_batch(holdings):
+    """Export rows of the quoted holdings; like build_export_holdings, unquoted ones are left out."""
+    if not holdings:
+        return
+    quotes = get_quotes([holding['symbol'] for holding in holdings])
+    prices = money.units_array([quotes[holding['symbol']].price if holding['symbol'] in quotes else 0
+                                for holding in holdings], money.PRICE_UNITS)
+    for holding, price in zip(holdings, prices.tolist()):
+        if price > 0:
+            yield format_export_holding(holding, holding['quantity'], holding['avgPrice'], price)
+
+def fetch_export_transactions(sql, params=()):
+    """Every transaction matched by sql, formatted for export."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    transactions = [format_export_transaction(transaction) for transaction in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return transactions
+
+def build_export_holdings(snapshot):
+    """Export rows and summary for the priced holdings of a valuation snapshot.
+
+    The summary totals are int64 sums of the snapshot's cent columns.
+    """
+    priced = snapshot.priced
+    formatted_holdings = [
+        format_export_holding(holding._asdict(), quantity, avg_price, price)
+        for holding, quantity, avg_price, price, has_price in zip(
+            snapshot.holdings, snapshot.quantities.tolist(), snapshot.avg_prices.tolist(),
+            snapshot.prices.tolist(), priced.tolist())
+        if has_price
+    ]
+    total_value = int(snapshot.market_values[priced].sum())
+    total_cost = int(snapshot.cost_bases[priced].sum())
+
+    total_gain_loss = total_value - total_cost
+    total_gain_loss_percent = (total_gain_loss / total_cost * 100) if total_cost > 0 else 0
+
+    return formatted_holdings, {
+        "totalValue": money.dollars(total_value),
+        "totalCost": money.dollars(total_cost),
+        "totalGainLoss": money.dollars(total_gain_loss),
+        "totalGainLossPercent": round(total_gain_loss_percent, 2),
+        "numberOfPositions": len(formatted_holdings),
+        "exportDate": snapshot.as_of.isoformat()
+    }
+
 @app.route('/api/export/transactions')
 def export_transactions():
-    """Export all portfolio transactions as JSON data."""
+    """Export all portfolio transactions as JSON data.
+
+    ?format=ndjson or ?format=csv streams the rows through an unbuffered
+    server-side cursor instead, with constant memory; the /api/transactions
+    filters (symbol, type, start_date, end_date) apply to every format.
+    """
+    try:
+        conditions, params = parse_transaction_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = EXPORT_TRANSACTIONS_SQL.format(where=where)
+
+    export_format = request.args.get('format', 'json').lower()
+    if export_format in STREAM_FORMATS:
+        rows = stream_query(sql, params, format_export_transaction)
+        return stream_response(rows, EXPORT_TRANSACTION_FIELDS, export_format, "transactions")
+
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        
         # Get all transactions ordered by date (most recent first)
-        cursor.execute("""
-            SELECT 
-                pt_id as id,
-                pt_symbol as symbol,
-                pt_name as companyName,
-                pt_sector as sector,
-                pt_industry as industry,
-                pt_quantity as quantity,
-                pt_price as price,
-                pt_type as type,
-                pt_date as date,
-                (pt_quantity * pt_price) as totalAmount
-            FROM portfolio_transaction 
-            ORDER BY pt_date DESC, pt_id DESC
-        """)
-        
-        transactions = cursor.fetchall()
-        
-        # Convert to proper format for export
-        formatted_transactions = []
-        for transaction in transactions:
-            formatted_transactions.append({
-                "id": transaction['id'],
-                "symbol": transaction['symbol'],
-                "companyName": transaction['companyName'],
-                "sector": transaction['sector'],
-                "industry": transaction['industry'],
-                "quantity": float(transaction['quantity']),
-                "price": float(transaction['price']),
-                "type": transaction['type'],
-                "date": transaction['date'].strftime('%Y-%m-%d') if transaction['date'] else None,
-                "totalAmount": float(transaction['totalAmount'])
-            })
-        
-        cursor.close()
-        conn.close()
+        formatted_transactions = fetch_export_transactions(sql, params)
         
         return jsonify({
             "success": True,
@@ -573,97 +1110,24 @@ def export_transactions():
 
 @app.route('/api/export/holdings')
 def export_holdings():
-    """Export current portfolio holdings as JSON data."""
+    """Export current portfolio holdings as JSON data.
+
+    ?format=ndjson or ?format=csv streams the holdings instead (without the
+    summary block), pricing them one quote batch at a time.
+    """
+    export_format = request.args.get('format', 'json').lower()
+    if export_format in STREAM_FORMATS:
+        return stream_response(stream_export_holdings(), EXPORT_HOLDING_FIELDS, export_format, "holdings")
+
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get current holdings from portfolio_item table
-        cursor.execute("""
-            SELECT 
-                pi_symbol as symbol,
-                pi_name as name,
-                pi_sector as sector,
-                pi_industry as industry,
-                pi_total_quantity as quantity,
-                pi_weighted_average_price as avgPrice
-            FROM portfolio_item
-            ORDER BY pi_symbol
-        """)
-        
-        holdings = cursor.fetchall()
-        
-        # Get current market prices and calculate performance
-        formatted_holdings = []
-        total_value = 0
-        total_cost = 0
-        
-        for holding in holdings:
-            try:
-                # Get current price using yfinance
-                ticker = yf.Ticker(holding['symbol'])
-                current_price = ticker.info.get('regularMarketPrice', 0)
-                
-                if current_price > 0:
-                    quantity = float(holding['quantity'])
-                    avg_price = float(holding['avgPrice'])
-                    market_value = current_price * quantity
-                    cost_basis = avg_price * quantity
-                    gain_loss = market_value - cost_basis
-                    gain_loss_percent = (gain_loss / cost_basis * 100) if cost_basis > 0 else 0
-                    
-                    formatted_holdings.append({
-                        "symbol": holding['symbol'],
-                        "name": holding['name'],
-                        "sector": holding['sector'],
-                        "industry": holding['industry'],
-                        "quantity": quantity,
-                        "avgPrice": round(avg_price, 2),
-                        "currentPrice": round(current_price, 2),
-                        "marketValue": round(market_value, 2),
-                        "costBasis": round(cost_basis, 2),
-                        "gainLoss": round(gain_loss, 2),
-                        "gainLossPercent": round(gain_loss_percent, 2)
-                    })
-                    
-                    total_value += market_value
-                    total_cost += cost_basis
-                    
-            except Exception as e:
-                print(f"Error processing holding {holding['symbol']}: {e}")
-                # Add holding with basic info if price fetch fails
-                formatted_holdings.append({
-                    "symbol": holding['symbol'],
-                    "name": holding['name'],
-                    "sector": holding['sector'],
-                    "industry": holding['industry'],
-                    "quantity": float(holding['quantity']),
-                    "avgPrice": round(float(holding['avgPrice']), 2),
-                    "currentPrice": 0,
-                    "marketValue": 0,
-                    "costBasis": round(float(holding['avgPrice']) * float(holding['quantity']), 2),
-                    "gainLoss": 0,
-                    "gainLossPercent": 0
-                })
-        
-        cursor.close()
-        conn.close()
-        
-        # Calculate portfolio summary
-        total_gain_loss = total_value - total_cost
-        total_gain_loss_percent = (total_gain_loss / total_cost * 100) if total_cost > 0 else 0
+        # Holdings and prices come from the shared valuation snapshot, so this
+        # export agrees with /api/portfolio taken at the same moment
+        formatted_holdings, summary = build_export_holdings(get_snapshot())
         
         return jsonify({
             "success": True,
             "data": formatted_holdings,
-            "summary": {
-                "totalValue": round(total_value, 2),
-                "totalCost": round(total_cost, 2),
-                "totalGainLoss": round(total_gain_loss, 2),
-                "totalGainLossPercent": round(total_gain_loss_percent, 2),
-                "numberOfPositions": len(formatted_holdings),
-                "exportDate": datetime.now().isoformat()
-            }
+            "summary": summary
         }), 200
         
     except Exception as e:
@@ -673,22 +1137,17 @@ def export_holdings():
 def export_full_portfolio():
     """Export complete portfolio data including holdings, transactions, and analytics."""
     try:
-        # Get holdings data
-        holdings_response = export_holdings()
-        if holdings_response[1] != 200:
-            return jsonify({"error": "Failed to fetch holdings data"}), 500
-        
-        holdings_data = holdings_response[0].json
+        # Holdings, prices and cash all come from one valuation snapshot
+        snapshot = get_snapshot()
+        holdings, holdings_summary = build_export_holdings(snapshot)
+        holdings_data = {"data": holdings, "summary": holdings_summary}
         
         # Get transactions data
-        transactions_response = export_transactions()
-        if transactions_response[1] != 200:
-            return jsonify({"error": "Failed to fetch transactions data"}), 500
-        
-        transactions_data = transactions_response[0].json
+        transactions_data = {"data": fetch_export_transactions(
+            EXPORT_TRANSACTIONS_SQL.format(where="WHERE pt_ca_id = %s"), (DEFAULT_ACCOUNT_ID, ))}
         
         # Get cash balance
-        cash_balance = get_cash_balance()
+        cash_balance = snapshot.cash_balance
         
         # Calculate additional metrics
         total_portfolio_value = holdings_data['summary']['totalValue'] + cash_balance
@@ -729,19 +1188,18 @@ def export_full_portfolio():
         # Sort by return
         performance_metrics.sort(key=lambda x: float(x['return'].replace('%', '')), reverse=True)
         
-        # Risk metrics (simplified)
-        risk_metrics = [
-            {"metric": "Portfolio Beta", "value": "1.15"},
-            {"metric": "Sharpe Ratio", "value": "0.85"},
-            {"metric": "Max Drawdown", "value": "-8.5%"},
-            {"metric": "Volatility", "value": "12.3%"},
-            {"metric": "Correlation with S&P 500", "value": "0.78"}
-        ]
+        # Risk metrics from the daily returns of the holdings vs the S&P 500,
+        # computed once per holdings and trading day
+        try:
+            risk_metrics = format_risk_metrics(get_risk_metrics(snapshot.holdings))
+        except Exception as e:
+            print(f"Error computing risk metrics: {e}")
+            risk_metrics = []
         
         # Compile full export data
         full_export = {
             "success": True,
-            "exportDate": datetime.now().isoformat(),
+            "exportDate": snapshot.as_of.isoformat(),
             "portfolioSummary": {
                 "totalPortfolioValue": round(total_portfolio_value, 2),
                 "totalStockValue": holdings_data['summary']['totalValue'],
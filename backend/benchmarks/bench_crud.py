@@ -0,0 +1,215 @@
+"""Offline timings of the crud.py hot paths on synthetic portfolios.
+
+Runs entirely in-process against an embedded SQLite copy of the schema
+(sqlite_store.py) and deterministic fake market data (fake_market.py), so
+no MySQL server or network is needed and runs are comparable across
+commits. For every book size it times:
+
+  get_portfolio                       snapshot and NAV memo dropped before each run
+  get_portfolio[memoized]             back-to-back calls, as repeated polls see them
+  calculate_realized_gains            steady state (lots already synced)
+  calculate_realized_gains[rebuild]   tax lots replayed from an empty lot table
+  calculate_sector_allocation
+  calculate_monthly_returns
+  handle_trade                        1-share BUY of a held symbol
+  get_book_nav                        every account valued in one vectorized pass
+
+Each case runs inside a unit of work, like a request, after one untimed
+warm-up call. Quotes and stored daily bars stay cached between runs; they
+model the network, not crud.py.
+
+Usage:
+    python benchmarks/bench_crud.py [--holdings 10 1000 10000]
+                                    [--transactions 1000 100000 1000000] [--accounts 1]
+                                    [--json results.json] [--compare baseline.json]
+
+--accounts spreads the holdings over that many cash accounts; the
+dashboard cases then only see the default account's share, while
+get_book_nav values them all. Books with fewer transactions than holdings
+are skipped. The first call on a
+large book also downloads and stores its daily bars, which takes a while at
+10k holdings; --holdings 10 1000 --transactions 1000 100000 is a quick run.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from synthetic_book import BACKEND_DIR, build_book, use_offline_backend
+
+# Backend modules; importable once synthetic_book has put the backend on sys.path
+import crud  # noqa: E402
+import db_pool  # noqa: E402
+import market_cache  # noqa: E402
+import nav_history  # noqa: E402
+import valuation  # noqa: E402
+
+
+def timed_runs(fn, setup=None, iterations=20, budget=10.0):
+    """Latencies in ms of up to `iterations` calls (at least 3), stopping after `budget` seconds."""
+    latencies = []
+    deadline = time.perf_counter() + budget
+    while len(latencies) < iterations and (len(latencies) < 3 or time.perf_counter() < deadline):
+        if setup is not None:
+            setup()
+        with db_pool.unit_of_work():
+            started = time.perf_counter()
+            fn()
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "iterations": len(ordered),
+        "meanMs": round(statistics.fmean(ordered), 3),
+        "p50Ms": round(ordered[len(ordered) // 2], 3),
+        "p95Ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "minMs": round(ordered[0], 3),
+        "maxMs": round(ordered[-1], 3),
+    }
+
+
+def drop_memos():
+    valuation.invalidate()
+    with nav_history._memo_lock:
+        nav_history._memo["key"] = None
+
+
+def cases(symbols):
+    """(name, fn, setup) for every timed case on the loaded book."""
+    def drop_tax_lots():
+        conn = db_pool.pool.acquire()
+        cursor = conn.cursor()
+        for table in ("realized_gain", "tax_lot", "tax_lot_sync"):
+            cursor.execute(f"DELETE FROM {table}")
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    with db_pool.unit_of_work():
+        portfolio = crud.get_portfolio("pi_id")
+    assets, total_value, history = portfolio["assets"], portfolio["totalValue"], portfolio["history"]
+    trade_symbols = iter(symbols * 1000)
+
+    return [
+        ("get_portfolio", lambda: crud.get_portfolio("pi_id"), drop_memos),
+        ("get_portfolio[memoized]", lambda: crud.get_portfolio("pi_id"), None),
+        ("calculate_realized_gains", crud.calculate_realized_gains, None),
+        ("calculate_realized_gains[rebuild]", crud.calculate_realized_gains, drop_tax_lots),
+        ("calculate_sector_allocation", lambda: crud.calculate_sector_allocation(assets, total_value), None),
+        ("calculate_monthly_returns", lambda: crud.calculate_monthly_returns(history), None),
+        ("handle_trade", lambda: crud.handle_trade(next(trade_symbols), 1, "BUY"), None),
+        ("get_book_nav", valuation.get_book_nav, None),
+    ]
+
+
+def run_book(holdings, transactions, args):
+    """Time every case on a fresh book; returns one result dict per case."""
+    with tempfile.TemporaryDirectory() as scratch:
+        database, provider = use_offline_backend(os.path.join(scratch, "bench.sqlite"))
+        # Every book starts with cold caches and memos
+        for tier in market_cache.TIERS:
+            tier.clear()
+        drop_memos()
+        # Keep every quote of the book for the whole run: a 10k-symbol book would
+        # otherwise evict its own quotes, and pricing it cold outlasts the quote TTL
+        market_cache.quotes.ttl = None
+        market_cache.quotes.max_size = max(market_cache.quotes.max_size, holdings)
+
+        started = time.perf_counter()
+        accounts = min(args.accounts, holdings)
+        symbols = build_book(database, provider, holdings, transactions, days=args.days, accounts=accounts)
+        load_seconds = time.perf_counter() - started
+
+        results = []
+        # The backend prints per trade and per download; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            book_cases = cases(symbols)
+            warmup_seconds = time.perf_counter() - started
+            for name, fn, setup in book_cases:
+                if setup is not None:
+                    setup()
+                fn()
+                summary = summarize(timed_runs(fn, setup, args.iterations, args.budget))
+                results.append({"case": name, "holdings": holdings, "transactions": transactions,
+                                "accounts": accounts, **summary})
+
+        print(f"{holdings:>6,} holdings {transactions:>9,} trades {accounts:>6,} accounts  "
+              f"(load {load_seconds:.1f}s, first portfolio {warmup_seconds:.1f}s)")
+        for result in results:
+            print(f"    {result['case']:<36} p50 {result['p50Ms']:>10.3f} ms  "
+                  f"p95 {result['p95Ms']:>10.3f} ms  ({result['iterations']} runs)")
+        return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print the p50 change of every case that is also in the baseline file."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["case"], r["holdings"], r["transactions"], r.get("accounts", 1)): r for r in baseline["results"]}
+
+    print(f"\nChange in p50 vs {baseline.get('commit') or baseline_path}:")
+    for result in results:
+        before = previous.get((result["case"], result["holdings"], result["transactions"], result["accounts"]))
+        if before is None or not before["p50Ms"]:
+            continue
+        change = (result["p50Ms"] / before["p50Ms"] - 1) * 100
+        print(f"    {result['case']:<36} {result['holdings']:>6,} / {result['transactions']:>9,}  "
+              f"{before['p50Ms']:>10.3f} -> {result['p50Ms']:>10.3f} ms  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--holdings", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--transactions", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--days", type=int, default=730, help="calendar days the ledger is spread over")
+    parser.add_argument("--accounts", type=int, default=1, help="cash accounts the holdings are spread over")
+    parser.add_argument("--iterations", type=int, default=20, help="timed runs per case")
+    parser.add_argument("--budget", type=float, default=10.0,
+                        help="seconds per case after which fewer runs are kept (minimum 3)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to compare p50s against")
+    args = parser.parse_args()
+
+    results = []
+    for holdings in args.holdings:
+        for transactions in args.transactions:
+            if transactions < holdings:
+                print(f"{holdings:>6,} holdings {transactions:>9,} trades  skipped (fewer trades than holdings)")
+                continue
+            results.extend(run_book(holdings, transactions, args))
+
+    report = {
+        "commit": git_commit(),
+        "createdAt": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
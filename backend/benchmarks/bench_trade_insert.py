@@ -0,0 +1,212 @@
+"""Trade-insert latency against ledgers of 10k, 100k and 1M rows.
+
+Builds a scratch copy of the schema in its own database (never touches
+portfolio_manager), bulk-loads a synthetic ledger of each size, then times
+single-row inserts into portfolio_transaction with:
+
+  incremental  the current trigger (apply_portfolio_transaction, O(1) per trade)
+  rebuild      the old trigger body (recalculate_portfolio_items(), O(ledger))
+
+Usage:
+    python benchmarks/bench_trade_insert.py [--sizes 10000 100000 1000000]
+                                            [--trades 200] [--json results.json]
+
+Connection settings come from the same DB_* variables as db_pool.py.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import mysql.connector
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db_pool import DB_CONFIG  # noqa: E402
+
+DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "db")
+BENCH_DATABASE = os.getenv("BENCH_DB_NAME", "portfolio_manager_bench")
+SYMBOL_COUNT = 500
+
+REBUILD_TRIGGER = """
+CREATE TRIGGER trg_portfolio_transaction_insert
+AFTER INSERT ON portfolio_transaction
+FOR EACH ROW
+BEGIN
+    IF NEW.pt_type = 'BUY' THEN
+        INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note, ct_source)
+        VALUES (NEW.pt_ca_id, 'WITHDRAWAL', ROUND(NEW.pt_quantity * NEW.pt_price, 2), NEW.pt_date,
+                CONCAT('Purchase of ', NEW.pt_quantity, ' shares of ', NEW.pt_symbol), 'TRADE');
+    ELSEIF NEW.pt_type = 'SELL' THEN
+        INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note, ct_source)
+        VALUES (NEW.pt_ca_id, 'DEPOSIT', ROUND(NEW.pt_quantity * NEW.pt_price, 2), NEW.pt_date,
+                CONCAT('Sale of ', NEW.pt_quantity, ' shares of ', NEW.pt_symbol), 'TRADE');
+    END IF;
+
+    CALL recalculate_portfolio_items();
+    CALL recalculate_portfolio_snapshot();
+END
+"""
+
+
+def sql_statements(path):
+    """Split a mysql-client script into statements, honouring DELIMITER lines."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().replace("portfolio_manager", BENCH_DATABASE)
+
+    delimiter = ";"
+    statement = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split()[1]
+            continue
+        if not statement and (not stripped or stripped.startswith("--")):
+            continue
+        if stripped.startswith("source "):
+            continue
+        statement.append(line)
+        if stripped.endswith(delimiter):
+            sql = "\n".join(statement).strip()
+            sql = sql[:-len(delimiter)].strip()
+            statement = []
+            if sql:
+                yield sql
+    tail = "\n".join(statement).strip()
+    if tail:
+        yield tail
+
+
+def run_script(cursor, name):
+    for sql in sql_statements(os.path.join(DB_DIR, name)):
+        cursor.execute(sql)
+
+
+def create_schema(conn):
+    cursor = conn.cursor()
+    for name in ("schema.sql", "procedures.sql", "triggers.sql"):
+        run_script(cursor, name)
+    conn.commit()
+    cursor.close()
+
+
+def load_ledger(conn, rows):
+    """Bulk-load a synthetic ledger with triggers disabled, then rebuild holdings once."""
+    cursor = conn.cursor()
+    cursor.execute("DROP TRIGGER IF EXISTS trg_portfolio_transaction_before_insert")
+    cursor.execute("DROP TRIGGER IF EXISTS trg_portfolio_transaction_insert")
+
+    cursor.execute("INSERT INTO cash_account (ca_name, ca_balance) VALUES ('Bench', 1e12)")
+
+    rng = random.Random(42)
+    start = date(2015, 1, 1)
+    symbols = [f"S{i:04d}" for i in range(SYMBOL_COUNT)]
+    batch = []
+    for i in range(rows):
+        # Mostly buys so that every symbol keeps an open position
+        trade_type = "SELL" if i % 5 == 4 else "BUY"
+        batch.append((
+            rng.choice(symbols), "Synthetic Co", "Technology", "Software",
+            rng.randint(1, 3) if trade_type == "SELL" else rng.randint(5, 20),
+            round(rng.uniform(10, 500), 2), trade_type,
+            start + timedelta(days=i * 3650 // max(rows, 1)),
+        ))
+        if len(batch) == 10000:
+            _insert_ledger_rows(cursor, batch)
+            batch = []
+    if batch:
+        _insert_ledger_rows(cursor, batch)
+
+    cursor.execute("CALL recalculate_portfolio_items()")
+    conn.commit()
+    cursor.close()
+    return symbols
+
+
+def _insert_ledger_rows(cursor, batch):
+    cursor.executemany(
+        "INSERT INTO portfolio_transaction (pt_symbol, pt_name, pt_sector, pt_industry, pt_quantity, pt_price, pt_type, pt_date, pt_ca_id) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 1)",
+        batch)
+
+
+def install_triggers(conn, mode):
+    cursor = conn.cursor()
+    for trigger in ("trg_cash_transaction_insert", "trg_portfolio_transaction_before_insert",
+                    "trg_portfolio_transaction_insert"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    run_script(cursor, "triggers.sql")
+    if mode == "rebuild":
+        cursor.execute("DROP TRIGGER IF EXISTS trg_portfolio_transaction_insert")
+        cursor.execute(REBUILD_TRIGGER)
+    conn.commit()
+    cursor.close()
+
+
+def time_trades(conn, symbols, trades):
+    """Insert trades one at a time (one commit each, like handle_trade) and return latencies in ms."""
+    cursor = conn.cursor()
+    rng = random.Random(7)
+    latencies = []
+    for _ in range(trades):
+        row = (rng.choice(symbols), "Synthetic Co", "Technology", "Software",
+               1, round(rng.uniform(10, 500), 2), "BUY", date.today())
+        started = time.perf_counter()
+        _insert_ledger_rows(cursor, [row])
+        conn.commit()
+        latencies.append((time.perf_counter() - started) * 1000)
+    cursor.close()
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "trades": len(ordered),
+        "meanMs": round(statistics.fmean(ordered), 3),
+        "p50Ms": round(ordered[len(ordered) // 2], 3),
+        "p99Ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--trades", type=int, default=200,
+                        help="timed inserts per size for the incremental trigger")
+    parser.add_argument("--rebuild-trades", type=int, default=10,
+                        help="timed inserts per size for the full-rebuild trigger (slow at 1M rows)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    config = {k: v for k, v in DB_CONFIG.items() if k != "database"}
+    results = []
+
+    for size in args.sizes:
+        conn = mysql.connector.connect(**config)
+        create_schema(conn)
+        symbols = load_ledger(conn, size)
+
+        for mode, trades in (("incremental", args.trades), ("rebuild", args.rebuild_trades)):
+            install_triggers(conn, mode)
+            summary = summarize(time_trades(conn, symbols, trades))
+            summary.update({"ledgerRows": size, "mode": mode})
+            results.append(summary)
+            print(f"{size:>9,} rows  {mode:<12} mean {summary['meanMs']:>10.3f} ms  "
+                  f"p50 {summary['p50Ms']:>10.3f} ms  p99 {summary['p99Ms']:>10.3f} ms")
+
+        cursor = conn.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DATABASE}")
+        cursor.close()
+        conn.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
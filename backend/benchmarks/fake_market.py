@@ -0,0 +1,128 @@
+"""Deterministic stand-in for the parts of yfinance the backend calls.
+
+FakeYahoo answers yf.download(), yf.Ticker(...).history() and
+yf.Ticker(...).info from a seeded random walk per symbol, so every run sees
+the same prices without touching the network. install() swaps it in for the
+yf module in every backend module that imports it; the quote cache, price
+history store and single-flight layers above it run unchanged.
+"""
+import sys
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# First day of every generated series; all lookups index into it
+EPOCH = date(2020, 1, 1)
+SECTORS = ("Technology", "Healthcare", "Financial Services", "Consumer Cyclical", "Industrials",
+           "Energy", "Utilities", "Real Estate", "Basic Materials", "Communication Services")
+COLUMNS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+# Backend modules that do `import yfinance as yf`
+PATCHED_MODULES = ("quote_service", "price_history", "app")
+
+
+class FakeYahoo:
+    """Module-like object with download() and Ticker(); latency is added to every call."""
+
+    def __init__(self, latency=0.0, seed=0):
+        self.latency = latency
+        self.seed = seed
+        self.calls = 0
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def closes(self, symbol):
+        """Daily closes of symbol from EPOCH through next week, one per calendar day.
+
+        Regenerated on every call (a few microseconds) rather than kept, so
+        books with tens of thousands of symbols don't hold their series in memory.
+        """
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()) + self.seed)
+        start = rng.uniform(10, 500)
+        return start * np.exp(np.cumsum(rng.normal(0.0003, 0.015, (date.today() - EPOCH).days + 8)))
+
+    def bars(self, symbol, start, end):
+        """Weekday OHLCV bars for [start, end) as yfinance returns them."""
+        start = max(start, EPOCH)
+        days = pd.bdate_range(start, end - timedelta(days=1))
+        if len(days) == 0:
+            return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name="Date"))
+        offsets = (days - pd.Timestamp(EPOCH)).days.to_numpy()
+        closes = self.closes(symbol.upper())[offsets]
+        frame = pd.DataFrame({
+            "Open": closes * 0.998,
+            "High": closes * 1.01,
+            "Low": closes * 0.99,
+            "Close": closes,
+            "Adj Close": closes,
+            "Volume": (offsets % 97 + 1) * 10_000,
+        }, index=pd.DatetimeIndex(days, name="Date"))
+        return frame
+
+    def download(self, symbols, period="5d", interval="1d", group_by="ticker", **kwargs):
+        self._wait()
+        if isinstance(symbols, str):
+            symbols = symbols.split()
+        end = date.today() + timedelta(days=1)
+        start = end - timedelta(days=int(period.rstrip("d")) + 4)
+        frames = {symbol: self.bars(symbol, start, end).tail(int(period.rstrip("d"))) for symbol in symbols}
+        return pd.concat(frames, axis=1)
+
+    def Ticker(self, symbol):
+        return _FakeTicker(self, symbol.upper())
+
+
+class _FakeTicker:
+    def __init__(self, provider, symbol):
+        self._provider = provider
+        self.symbol = symbol
+
+    @property
+    def info(self):
+        self._provider._wait()
+        sector = SECTORS[zlib.crc32(self.symbol.encode()) % len(SECTORS)]
+        price = float(self._provider.closes(self.symbol)[(date.today() - EPOCH).days])
+        return {
+            "longName": f"{self.symbol} Holdings Inc.",
+            "sector": sector,
+            "industry": f"{sector} Services",
+            "marketCap": int(price * 1_000_000_000),
+            "currentPrice": price,
+        }
+
+    def history(self, start=None, end=None, period=None, interval="1d", **kwargs):
+        self._provider._wait()
+        if interval == "1m":
+            return self._intraday()
+        end = datetime.strptime(end, "%Y-%m-%d").date() if end else date.today() + timedelta(days=1)
+        if start:
+            start = datetime.strptime(start, "%Y-%m-%d").date()
+        else:
+            start = end - timedelta(days=int((period or "30d").rstrip("d")))
+        return self._provider.bars(self.symbol, start, end).drop(columns=["Adj Close"])
+
+    def _intraday(self):
+        """390 one-minute bars around the last close."""
+        last = self._provider.bars(self.symbol, date.today() - timedelta(days=7), date.today() + timedelta(days=1))
+        base = float(last["Close"].iloc[-1])
+        rng = np.random.default_rng(zlib.crc32(self.symbol.encode()))
+        closes = base * np.exp(np.cumsum(rng.normal(0, 0.0005, 390)))
+        index = pd.date_range(datetime.combine(date.today(), datetime.min.time()) + timedelta(hours=9, minutes=30),
+                              periods=390, freq="1min")
+        return pd.DataFrame({"Open": closes, "High": closes * 1.0005, "Low": closes * 0.9995,
+                             "Close": closes, "Volume": 1000}, index=index)
+
+
+def install(provider):
+    """Point every already-imported backend module's yf at provider."""
+    for name in PATCHED_MODULES:
+        module = sys.modules.get(name)
+        if module is not None and hasattr(module, "yf"):
+            module.yf = provider
+    return provider
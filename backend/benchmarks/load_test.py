@@ -0,0 +1,289 @@
+"""HTTP load test of the Flask app under a dashboard-like request mix.
+
+By default it builds a synthetic book, starts offline_app.py on it (the real
+app.py routes, a SQLite database and a fake Yahoo Finance that sleeps
+--yahoo-latency seconds per call) and drives it with --users concurrent
+clients for --duration seconds. Each client loops over a weighted mix of
+portfolio polls (with If-None-Match), market endpoints, transaction pages,
+exports and trades. Pass --server to start it under another server, or
+--url to load an already running app instead.
+
+Reports requests, throughput, error rate and p50 / p90 / p99 / max latency
+per route, plus the server's connection pool statistics.
+
+Usage:
+    python benchmarks/load_test.py [--users 16] [--duration 30] [--yahoo-latency 0.05]
+                                   [--holdings 50] [--transactions 5000] [--pool-size 8]
+                                   [--server "gunicorn -w 4 --threads 8 -b 127.0.0.1:{port} offline_app:app"]
+                                   [--url http://localhost:8000] [--json results.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from bench_crud import git_commit
+from synthetic_book import build_book, use_offline_backend
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (route label, weight, method, path); {symbol} is a random held symbol
+DASHBOARD_MIX = [
+    ("GET /api/portfolio", 30, "GET", "/api/portfolio"),
+    ("GET /api/market_movers", 10, "GET", "/api/market_movers"),
+    ("GET /api/sector_performance", 8, "GET", "/api/sector_performance"),
+    ("GET /api/economic_indicators", 8, "GET", "/api/economic_indicators"),
+    ("GET /api/market_performance", 6, "GET", "/api/market_performance?points=200"),
+    ("GET /api/transactions", 10, "GET", "/api/transactions?limit=50"),
+    ("GET /api/stocks/<symbol>", 6, "GET", "/api/stocks/{symbol}"),
+    ("GET /api/risk_metrics", 4, "GET", "/api/risk_metrics"),
+    ("GET /api/export/holdings", 3, "GET", "/api/export/holdings"),
+    ("GET /api/export/transactions", 2, "GET", "/api/export/transactions?format=ndjson"),
+    ("POST /api/trade", 5, "POST", "/api/trade"),
+]
+
+
+class Recorder:
+    """Latencies and outcomes per route, shared by every client thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, route, latency, status):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(latency)
+            self.statuses.setdefault(route, {}).setdefault(status, 0)
+            self.statuses[route][status] += 1
+            # Connection failures and 5xx count as errors; 304 and 4xx are answers
+            if status is None or status >= 500:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, seconds):
+        def percentile(ordered, fraction):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 3)
+
+        with self._lock:
+            routes = {route: sorted(latencies) for route, latencies in self.latencies.items()}
+            errors = dict(self.errors)
+            statuses = {route: dict(counts) for route, counts in self.statuses.items()}
+
+        results = []
+        for route, ordered in sorted(routes.items()):
+            results.append({
+                "route": route,
+                "requests": len(ordered),
+                "throughputRps": round(len(ordered) / seconds, 2),
+                "errors": errors.get(route, 0),
+                "errorRate": round(errors.get(route, 0) / len(ordered), 4),
+                "statuses": {str(status): count for status, count in statuses[route].items()},
+                "meanMs": round(statistics.fmean(ordered) * 1000, 3),
+                "p50Ms": percentile(ordered, 0.50),
+                "p90Ms": percentile(ordered, 0.90),
+                "p99Ms": percentile(ordered, 0.99),
+                "maxMs": round(ordered[-1] * 1000, 3),
+            })
+        return results
+
+
+class Client(threading.Thread):
+    """One simulated dashboard user issuing back-to-back requests until stopped."""
+
+    def __init__(self, base_url, symbols, recorder, stop, recording, seed):
+        super().__init__(daemon=True)
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.symbols = symbols
+        self.recorder = recorder
+        self.stop = stop
+        self.recording = recording
+        self.rng = random.Random(seed)
+        self.etag = None
+
+    def request(self, method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            response.read()
+            return response
+        finally:
+            conn.close()
+
+    def run(self):
+        weights = [weight for _, weight, _, _ in DASHBOARD_MIX]
+        while not self.stop.is_set():
+            route, _, method, path = self.rng.choices(DASHBOARD_MIX, weights)[0]
+            symbol = self.rng.choice(self.symbols)
+            headers, body = {}, None
+            if route == "GET /api/portfolio" and self.etag:
+                # The dashboard re-polls with the ETag it already has
+                headers["If-None-Match"] = self.etag
+            if method == "POST":
+                body = json.dumps({"symbol": symbol, "amount": 1,
+                                   "trade_type": self.rng.choice(("BUY", "SELL"))})
+                headers["Content-Type"] = "application/json"
+
+            started = time.perf_counter()
+            try:
+                response = self.request(method, path.format(symbol=symbol), body, headers)
+                status = response.status
+                if route == "GET /api/portfolio" and response.getheader("ETag"):
+                    self.etag = response.getheader("ETag")
+            except (OSError, http.client.HTTPException):
+                status = None
+            if self.recording.is_set():
+                self.recorder.record(route, time.perf_counter() - started, status)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(base_url, timeout=120):
+    parts = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=5)
+            conn.request("GET", "/api/db_pool")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout}s")
+
+
+def fetch_json(base_url, path):
+    parts = urlsplit(base_url)
+    try:
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+        conn.request("GET", path)
+        body = conn.getresponse().read()
+        conn.close()
+        return json.loads(body)
+    except (OSError, ValueError, http.client.HTTPException):
+        return None
+
+
+def held_symbols(base_url):
+    holdings = fetch_json(base_url, "/api/export/holdings") or {}
+    return [row["symbol"] for row in holdings.get("data", [])] or ["AAPL"]
+
+
+def start_server(args, book_path):
+    """Start the offline app in a child process on a free port; returns (process, base URL)."""
+    port = free_port()
+    env = dict(os.environ,
+               OFFLINE_DB=book_path,
+               OFFLINE_YAHOO_LATENCY=str(args.yahoo_latency),
+               DB_POOL_SIZE=str(args.pool_size))
+    if args.server:
+        command = shlex.split(args.server.format(port=port))
+    else:
+        command = [sys.executable, "offline_app.py", "--port", str(port)]
+    process = subprocess.Popen(command, cwd=BENCHMARKS_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def print_report(results, seconds):
+    total = sum(result["requests"] for result in results)
+    errors = sum(result["errors"] for result in results)
+    print(f"\n{total:,} requests in {seconds:.1f}s: {total / seconds:.1f} req/s, "
+          f"{errors} errors ({errors / total * 100 if total else 0:.2f}%)\n")
+    print(f"{'route':<32} {'req':>7} {'req/s':>8} {'err%':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for result in results:
+        print(f"{result['route']:<32} {result['requests']:>7} {result['throughputRps']:>8.1f} "
+              f"{result['errorRate'] * 100:>6.2f} {result['p50Ms']:>9.1f} {result['p90Ms']:>9.1f} "
+              f"{result['p99Ms']:>9.1f} {result['maxMs']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before recording")
+    parser.add_argument("--yahoo-latency", type=float, default=0.05, help="seconds per fake Yahoo call")
+    parser.add_argument("--holdings", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--pool-size", type=int, default=8, help="DB_POOL_SIZE of the server")
+    parser.add_argument("--server", help="command that serves offline_app:app, with {port} in it")
+    parser.add_argument("--url", help="load this running app instead of starting one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    process = None
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            book_path = os.path.join(scratch, "load_test.sqlite")
+            database, provider = use_offline_backend(book_path)
+            build_book(database, provider, args.holdings, args.transactions)
+            process, base_url = start_server(args, book_path)
+
+        try:
+            wait_until_up(base_url)
+            symbols = held_symbols(base_url)
+
+            recorder = Recorder()
+            stop, recording = threading.Event(), threading.Event()
+            clients = [Client(base_url, symbols, recorder, stop, recording, args.seed + i)
+                       for i in range(args.users)]
+            for client in clients:
+                client.start()
+            time.sleep(args.warmup)
+            recording.set()
+            started = time.perf_counter()
+            time.sleep(args.duration)
+            recording.clear()
+            seconds = time.perf_counter() - started
+            stop.set()
+            for client in clients:
+                client.join(timeout=60)
+
+            results = recorder.summary(seconds)
+            pool_stats = fetch_json(base_url, "/api/db_pool")
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    print_report(results, seconds)
+    if pool_stats:
+        print(f"\nDB pool: {pool_stats.get('checkouts')} checkouts, {pool_stats.get('waits')} waits, "
+              f"{pool_stats.get('timeouts')} timeouts, max wait {pool_stats.get('maxWaitMs')} ms")
+
+    if args.json:
+        report = {
+            "commit": git_commit(),
+            "createdAt": datetime.now().isoformat(timespec="seconds"),
+            "settings": {key: value for key, value in vars(args).items() if key != "json"},
+            "durationSeconds": round(seconds, 3),
+            "results": results,
+            "dbPool": pool_stats,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
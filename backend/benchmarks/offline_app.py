@@ -0,0 +1,38 @@
+"""The real Flask app on a synthetic book, with Yahoo Finance replaced by a slow fake.
+
+Configured through the environment so any WSGI server can load it:
+
+  OFFLINE_DB              SQLite book built by synthetic_book.build_book (required)
+  OFFLINE_YAHOO_LATENCY   seconds added to every fake Yahoo call (default 0.05)
+  DB_POOL_SIZE            as for the real app
+
+    python benchmarks/offline_app.py --port 8001
+    cd benchmarks && gunicorn -w 4 --threads 8 -b 127.0.0.1:8001 offline_app:app
+"""
+import argparse
+import os
+
+from fake_market import install
+from synthetic_book import use_offline_backend
+
+YAHOO_LATENCY = float(os.getenv("OFFLINE_YAHOO_LATENCY", "0.05"))
+
+_database, provider = use_offline_backend(os.environ["OFFLINE_DB"], latency=YAHOO_LATENCY)
+
+import app as backend  # noqa: E402
+
+# app.py imports yfinance itself, after use_offline_backend patched the rest
+install(provider)
+app = backend.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the offline app with the threaded development server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    app.run(host=args.host, port=args.port, threaded=True, debug=False, use_reloader=False)
+
+
+if __name__ == "__main__":
+    main()
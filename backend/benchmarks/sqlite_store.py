@@ -0,0 +1,468 @@
+"""Embedded SQLite stand-in for the MySQL database, for offline benchmarks.
+
+SqliteDatabase creates the tables of db/schema.sql, the holding and cash
+triggers of db/triggers.sql and the stored procedures the app calls, in a
+single SQLite file. Its connect() returns connections that speak the small
+part of the mysql-connector API the backend uses (dictionary cursors,
+%s parameters, lastrowid, callproc, commit / rollback), translating the
+MySQL-only statements on the fly:
+
+  SELECT ... FOR UPDATE            BEGIN IMMEDIATE, then the plain SELECT
+  INSERT IGNORE                    INSERT OR IGNORE
+  ON DUPLICATE KEY UPDATE VALUES() ON CONFLICT DO UPDATE ... excluded.
+  SET @pm_batch_trade = ...        the pm_session row the triggers read
+  CALL procedure()                 the equivalent SQL below
+  CAST(... AS SIGNED)              CAST(... AS INTEGER)
+
+SQLite has no exact DECIMAL, so the money columns are REAL here; the
+triggers round cash legs to cents and holdings to 4 places as the DECIMAL
+columns do, and the backend reads them through money.column(), so it sees
+the same integer units either way.
+
+Pass SqliteDatabase(path).connect to db_pool.ConnectionPool(connect=...).
+"""
+import re
+import sqlite3
+from datetime import date
+from decimal import Decimal
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cash_account (
+    ca_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ca_name TEXT NOT NULL,
+    ca_balance REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cash_transaction (
+    ct_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ct_ca_id INTEGER NOT NULL DEFAULT 1 REFERENCES cash_account(ca_id),
+    ct_type TEXT NOT NULL CHECK (ct_type IN ('DEPOSIT', 'WITHDRAWAL')),
+    ct_amount REAL NOT NULL,
+    ct_date DATE NOT NULL,
+    ct_note TEXT,
+    ct_source TEXT NOT NULL DEFAULT 'MANUAL' CHECK (ct_source IN ('MANUAL', 'TRADE'))
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_item (
+    pi_ca_id INTEGER NOT NULL DEFAULT 1 REFERENCES cash_account(ca_id),
+    pi_symbol TEXT NOT NULL,
+    pi_name TEXT NOT NULL,
+    pi_sector TEXT,
+    pi_industry TEXT,
+    pi_total_quantity REAL NOT NULL,
+    pi_weighted_average_price REAL NOT NULL,
+    PRIMARY KEY (pi_ca_id, pi_symbol)
+);
+CREATE INDEX IF NOT EXISTS idx_pi_symbol ON portfolio_item (pi_symbol);
+
+CREATE TABLE IF NOT EXISTS portfolio_transaction (
+    pt_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pt_symbol TEXT NOT NULL,
+    pt_name TEXT NOT NULL,
+    pt_sector TEXT,
+    pt_industry TEXT,
+    pt_quantity REAL NOT NULL,
+    pt_price REAL NOT NULL,
+    pt_type TEXT NOT NULL CHECK (pt_type IN ('BUY', 'SELL')),
+    pt_date DATE NOT NULL,
+    pt_ca_id INTEGER NOT NULL DEFAULT 1 REFERENCES cash_account(ca_id)
+);
+CREATE INDEX IF NOT EXISTS idx_pt_account_date_id ON portfolio_transaction (pt_ca_id, pt_date, pt_id);
+CREATE INDEX IF NOT EXISTS idx_pt_account_symbol_date_id ON portfolio_transaction (pt_ca_id, pt_symbol, pt_date, pt_id);
+CREATE INDEX IF NOT EXISTS idx_pt_account_type_date_id ON portfolio_transaction (pt_ca_id, pt_type, pt_date, pt_id);
+CREATE INDEX IF NOT EXISTS idx_pt_date_id ON portfolio_transaction (pt_date, pt_id);
+CREATE INDEX IF NOT EXISTS idx_pt_symbol_date_id ON portfolio_transaction (pt_symbol, pt_date, pt_id);
+CREATE INDEX IF NOT EXISTS idx_pt_type_date_id ON portfolio_transaction (pt_type, pt_date, pt_id);
+
+CREATE TABLE IF NOT EXISTS portfolio_position_total (
+    ppt_ca_id INTEGER NOT NULL DEFAULT 1,
+    ppt_symbol TEXT NOT NULL,
+    ppt_buy_quantity REAL NOT NULL DEFAULT 0,
+    ppt_buy_cost REAL NOT NULL DEFAULT 0,
+    ppt_sell_quantity REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (ppt_ca_id, ppt_symbol)
+);
+
+CREATE TABLE IF NOT EXISTS tax_lot (
+    tl_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tl_pt_id INTEGER NOT NULL REFERENCES portfolio_transaction(pt_id),
+    tl_ca_id INTEGER NOT NULL DEFAULT 1,
+    tl_symbol TEXT NOT NULL,
+    tl_date DATE NOT NULL,
+    tl_quantity REAL NOT NULL,
+    tl_remaining_quantity REAL NOT NULL,
+    tl_price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tax_lot_open ON tax_lot (tl_ca_id, tl_symbol, tl_remaining_quantity);
+
+CREATE TABLE IF NOT EXISTS realized_gain (
+    rg_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rg_pt_id INTEGER NOT NULL REFERENCES portfolio_transaction(pt_id),
+    rg_tl_id INTEGER NOT NULL REFERENCES tax_lot(tl_id),
+    rg_symbol TEXT NOT NULL,
+    rg_date DATE NOT NULL,
+    rg_quantity REAL NOT NULL,
+    rg_cost_price REAL NOT NULL,
+    rg_sale_price REAL NOT NULL,
+    rg_gain REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tax_lot_sync (
+    tls_id INTEGER PRIMARY KEY,
+    tls_last_pt_id INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_snapshot (
+    ps_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ps_date DATE NOT NULL UNIQUE,
+    ps_total_cash REAL NOT NULL,
+    ps_total_equity REAL NOT NULL,
+    ps_total_value REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS watchlist_item (
+    wi_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    wi_symbol TEXT NOT NULL UNIQUE,
+    wi_sector TEXT,
+    wi_added_date DATE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS price_history (
+    ph_symbol TEXT NOT NULL,
+    ph_date DATE NOT NULL,
+    ph_open REAL NOT NULL,
+    ph_high REAL NOT NULL,
+    ph_low REAL NOT NULL,
+    ph_close REAL NOT NULL,
+    ph_volume INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (ph_symbol, ph_date)
+);
+
+CREATE TABLE IF NOT EXISTS price_history_sync (
+    phs_symbol TEXT PRIMARY KEY,
+    phs_start DATE NOT NULL,
+    phs_end DATE NOT NULL
+);
+
+-- Stands in for the @pm_batch_trade session variable; SQLite serializes writers
+CREATE TABLE IF NOT EXISTS pm_session (
+    ps_id INTEGER PRIMARY KEY CHECK (ps_id = 1),
+    ps_batch_trade INTEGER
+);
+INSERT OR IGNORE INTO pm_session (ps_id, ps_batch_trade) VALUES (1, NULL);
+"""
+
+RECALCULATE_SNAPSHOT = """
+INSERT INTO portfolio_snapshot (ps_date, ps_total_cash, ps_total_equity, ps_total_value)
+SELECT date('now', 'localtime'), cash, equity, cash + equity FROM (
+    SELECT (SELECT IFNULL(SUM(ca_balance), 0) FROM cash_account) AS cash,
+           (SELECT IFNULL(ROUND(SUM(pi_total_quantity * pi_weighted_average_price), 2), 0) FROM portfolio_item) AS equity
+) WHERE true
+ON CONFLICT (ps_date) DO UPDATE SET
+    ps_total_cash = excluded.ps_total_cash,
+    ps_total_equity = excluded.ps_total_equity,
+    ps_total_value = excluded.ps_total_value
+"""
+
+TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_cash_transaction_insert
+AFTER INSERT ON cash_transaction
+FOR EACH ROW
+BEGIN
+    UPDATE cash_account
+    SET ca_balance = ca_balance + CASE NEW.ct_type WHEN 'DEPOSIT' THEN NEW.ct_amount ELSE -NEW.ct_amount END
+    WHERE ca_id = NEW.ct_ca_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_portfolio_transaction_before_insert
+BEFORE INSERT ON portfolio_transaction
+FOR EACH ROW
+BEGIN
+    SELECT RAISE(ABORT, 'Insufficient funds: Cannot complete BUY transaction.')
+    WHERE NEW.pt_type = 'BUY'
+      AND (SELECT ca_balance FROM cash_account WHERE ca_id = NEW.pt_ca_id) < ROUND(NEW.pt_quantity * NEW.pt_price, 2);
+    SELECT RAISE(ABORT, 'Insufficient shares: Cannot complete SELL transaction.')
+    WHERE NEW.pt_type = 'SELL'
+      AND COALESCE((SELECT pi_total_quantity FROM portfolio_item
+                        WHERE pi_ca_id = NEW.pt_ca_id AND pi_symbol = NEW.pt_symbol), 0) < NEW.pt_quantity;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_portfolio_transaction_insert
+AFTER INSERT ON portfolio_transaction
+FOR EACH ROW
+BEGIN
+    INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note, ct_source)
+    VALUES (NEW.pt_ca_id,
+            CASE NEW.pt_type WHEN 'BUY' THEN 'WITHDRAWAL' ELSE 'DEPOSIT' END,
+            ROUND(NEW.pt_quantity * NEW.pt_price, 2), NEW.pt_date,
+            CASE NEW.pt_type WHEN 'BUY' THEN 'Purchase of ' ELSE 'Sale of ' END
+                || NEW.pt_quantity || ' shares of ' || NEW.pt_symbol, 'TRADE');
+
+    -- apply_portfolio_transaction()
+    INSERT INTO portfolio_position_total (ppt_ca_id, ppt_symbol, ppt_buy_quantity, ppt_buy_cost, ppt_sell_quantity)
+    VALUES (NEW.pt_ca_id, NEW.pt_symbol,
+            CASE WHEN NEW.pt_type = 'BUY' THEN NEW.pt_quantity ELSE 0 END,
+            CASE WHEN NEW.pt_type = 'BUY' THEN NEW.pt_quantity * NEW.pt_price ELSE 0 END,
+            CASE WHEN NEW.pt_type = 'SELL' THEN NEW.pt_quantity ELSE 0 END)
+    ON CONFLICT (ppt_ca_id, ppt_symbol) DO UPDATE SET
+        ppt_buy_quantity = ppt_buy_quantity + excluded.ppt_buy_quantity,
+        ppt_buy_cost = ppt_buy_cost + excluded.ppt_buy_cost,
+        ppt_sell_quantity = ppt_sell_quantity + excluded.ppt_sell_quantity;
+
+    INSERT INTO portfolio_item (pi_ca_id, pi_symbol, pi_name, pi_sector, pi_industry,
+                                pi_total_quantity, pi_weighted_average_price)
+    SELECT NEW.pt_ca_id, NEW.pt_symbol, NEW.pt_name, NEW.pt_sector, NEW.pt_industry,
+           ROUND(ppt_buy_quantity - ppt_sell_quantity, 4), ROUND(ppt_buy_cost / NULLIF(ppt_buy_quantity, 0), 4)
+    FROM portfolio_position_total
+    WHERE ppt_ca_id = NEW.pt_ca_id AND ppt_symbol = NEW.pt_symbol AND ppt_buy_quantity - ppt_sell_quantity > 0
+    ON CONFLICT (pi_ca_id, pi_symbol) DO UPDATE SET
+        pi_name = excluded.pi_name,
+        pi_sector = excluded.pi_sector,
+        pi_industry = excluded.pi_industry,
+        pi_total_quantity = excluded.pi_total_quantity,
+        pi_weighted_average_price = excluded.pi_weighted_average_price;
+
+    DELETE FROM portfolio_item
+    WHERE pi_ca_id = NEW.pt_ca_id AND pi_symbol = NEW.pt_symbol
+      AND (SELECT ppt_buy_quantity - ppt_sell_quantity FROM portfolio_position_total
+           WHERE ppt_ca_id = NEW.pt_ca_id AND ppt_symbol = NEW.pt_symbol) <= 0;
+
+    -- recalculate_portfolio_snapshot(), skipped for all but the end of a batch
+    INSERT INTO portfolio_snapshot (ps_date, ps_total_cash, ps_total_equity, ps_total_value)
+    SELECT date('now', 'localtime'), cash, equity, cash + equity FROM (
+        SELECT (SELECT IFNULL(SUM(ca_balance), 0) FROM cash_account) AS cash,
+               (SELECT IFNULL(ROUND(SUM(pi_total_quantity * pi_weighted_average_price), 2), 0) FROM portfolio_item) AS equity
+    ) WHERE (SELECT ps_batch_trade FROM pm_session WHERE ps_id = 1) IS NULL
+    ON CONFLICT (ps_date) DO UPDATE SET
+        ps_total_cash = excluded.ps_total_cash,
+        ps_total_equity = excluded.ps_total_equity,
+        ps_total_value = excluded.ps_total_value;
+END;
+"""
+
+TRIGGER_NAMES = ("trg_cash_transaction_insert", "trg_portfolio_transaction_before_insert",
+                 "trg_portfolio_transaction_insert")
+
+RECALCULATE_ITEMS = (
+    "DELETE FROM portfolio_position_total",
+    """
+    INSERT INTO portfolio_position_total (ppt_ca_id, ppt_symbol, ppt_buy_quantity, ppt_buy_cost, ppt_sell_quantity)
+    SELECT pt_ca_id, pt_symbol,
+           SUM(CASE WHEN pt_type = 'BUY' THEN pt_quantity ELSE 0 END),
+           SUM(CASE WHEN pt_type = 'BUY' THEN pt_quantity * pt_price ELSE 0 END),
+           SUM(CASE WHEN pt_type = 'SELL' THEN pt_quantity ELSE 0 END)
+    FROM portfolio_transaction
+    GROUP BY pt_ca_id, pt_symbol
+    """,
+    "DELETE FROM portfolio_item",
+    """
+    INSERT INTO portfolio_item (pi_ca_id, pi_symbol, pi_name, pi_sector, pi_industry,
+                                pi_total_quantity, pi_weighted_average_price)
+    SELECT ppt_ca_id, ppt_symbol, pt.pt_name, pt.pt_sector, pt.pt_industry,
+           ROUND(ppt_buy_quantity - ppt_sell_quantity, 4), ROUND(ppt_buy_cost / NULLIF(ppt_buy_quantity, 0), 4)
+    FROM portfolio_position_total
+    JOIN (
+        SELECT pt_ca_id, pt_symbol, MAX(pt_id) AS last_pt_id
+        FROM portfolio_transaction
+        GROUP BY pt_ca_id, pt_symbol
+    ) AS latest ON latest.pt_ca_id = ppt_ca_id AND latest.pt_symbol = ppt_symbol
+    JOIN portfolio_transaction AS pt ON pt.pt_id = latest.last_pt_id
+    WHERE ppt_buy_quantity - ppt_sell_quantity > 0
+    """,
+)
+
+CHECK_ITEMS = """
+SELECT expected.account_id, expected.symbol, expected.quantity AS expected_quantity,
+       pi_total_quantity AS actual_quantity
+FROM (
+    SELECT pt_ca_id AS account_id, pt_symbol AS symbol,
+           SUM(CASE WHEN pt_type = 'BUY' THEN pt_quantity ELSE -pt_quantity END) AS quantity
+    FROM portfolio_transaction
+    GROUP BY pt_ca_id, pt_symbol
+) AS expected
+LEFT JOIN portfolio_item ON pi_ca_id = expected.account_id AND pi_symbol = expected.symbol
+WHERE (expected.quantity > 0 OR pi_symbol IS NOT NULL)
+  AND ABS(expected.quantity - IFNULL(pi_total_quantity, 0)) > 1e-6
+"""
+
+PROCEDURES = {
+    "recalculate_portfolio_snapshot": (RECALCULATE_SNAPSHOT, ),
+    "recalculate_portfolio_items": RECALCULATE_ITEMS,
+    "check_portfolio_items": (CHECK_ITEMS, ),
+}
+
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\s*$", re.IGNORECASE)
+_CALL = re.compile(r"^\s*CALL\s+(\w+)\s*\(\s*\)\s*$", re.IGNORECASE)
+_SET_BATCH = re.compile(r"^\s*SET\s+@pm_batch_trade\s*=\s*(\S+)\s*$", re.IGNORECASE)
+_ON_DUPLICATE = re.compile(r"ON\s+DUPLICATE\s+KEY\s+UPDATE", re.IGNORECASE)
+_VALUES_OF = re.compile(r"VALUES\((\w+)\)", re.IGNORECASE)
+_AS_SIGNED = re.compile(r"\bAS\s+SIGNED\b", re.IGNORECASE)
+
+
+def translate(sql):
+    """MySQL statement -> (SQLite statement, needs the write lock)."""
+    sql = sql.strip().rstrip(";")
+    locking = bool(_FOR_UPDATE.search(sql))
+    if locking:
+        sql = _FOR_UPDATE.sub("", sql)
+    sql = re.sub(r"^INSERT\s+IGNORE\b", "INSERT OR IGNORE", sql, flags=re.IGNORECASE)
+    sql = _AS_SIGNED.sub("AS INTEGER", sql)
+
+    match = _ON_DUPLICATE.search(sql)
+    if match:
+        head, tail = sql[:match.start()], sql[match.end():]
+        sql = head + "ON CONFLICT DO UPDATE SET" + _VALUES_OF.sub(r"excluded.\1", tail)
+
+    return sql.replace("%s", "?"), locking
+
+
+class _StoredResult:
+    """Result set of a SELECT inside a procedure, as returned by stored_results()."""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+class SqliteCursor:
+    """mysql-connector style cursor over a sqlite3 cursor."""
+
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+        self._dictionary = dictionary
+        self._stored = []
+        self.lastrowid = None
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((column[0] for column in self._cursor.description), row))
+
+    def execute(self, operation, params=()):
+        match = _SET_BATCH.match(operation)
+        if match:
+            value = None if match.group(1).upper() == "NULL" else match.group(1)
+            self._cursor.execute("UPDATE pm_session SET ps_batch_trade = ? WHERE ps_id = 1", (value, ))
+            return
+        match = _CALL.match(operation)
+        if match:
+            self.callproc(match.group(1))
+            return
+
+        sql, locking = translate(operation)
+        if locking:
+            self._connection.begin_write()
+        self._cursor.execute(sql, tuple(params or ()))
+        if self._cursor.lastrowid:
+            self.lastrowid = self._cursor.lastrowid
+
+    def executemany(self, operation, seq_params):
+        sql, _ = translate(operation)
+        first_id = None
+        for params in seq_params:
+            self._cursor.execute(sql, tuple(params))
+            if first_id is None:
+                first_id = self._cursor.lastrowid
+        # Like a multi-row MySQL INSERT, lastrowid is the id of the first row
+        if first_id:
+            self.lastrowid = first_id
+
+    def callproc(self, procname, args=()):
+        if procname not in PROCEDURES:
+            raise NotImplementedError(f"Procedure {procname} has no SQLite equivalent")
+        self._stored = []
+        for sql in PROCEDURES[procname]:
+            self._cursor.execute(sql)
+            if self._cursor.description is not None:
+                self._stored.append(_StoredResult(self.fetchall()))
+        return args
+
+    def stored_results(self):
+        return iter(self._stored)
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._row(row) for row in self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    """mysql-connector style connection to the benchmark database."""
+
+    def __init__(self, path):
+        self.raw = sqlite3.connect(path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   check_same_thread=False)
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def begin_write(self):
+        """Take the database write lock up front, as SELECT ... FOR UPDATE does for its rows."""
+        if not self.raw.in_transaction:
+            self.raw.execute("BEGIN IMMEDIATE")
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SqliteCursor(self, dictionary)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def ping(self, reconnect=False):
+        self.raw.execute("SELECT 1")
+
+    def close(self):
+        self.raw.close()
+
+
+class SqliteDatabase:
+    """One SQLite file holding the portfolio schema; connect() is a db_pool connection factory."""
+
+    def __init__(self, path):
+        self.path = path
+        raw = sqlite3.connect(path)
+        raw.execute("PRAGMA journal_mode = WAL")
+        raw.executescript(SCHEMA + TRIGGERS)
+        raw.commit()
+        raw.close()
+
+    def connect(self):
+        conn = SqliteConnection(self.path)
+        conn.raw.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def drop_triggers(self, conn):
+        """Bulk loads run without the per-row triggers, then call recalculate_portfolio_items."""
+        for name in TRIGGER_NAMES:
+            conn.raw.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    def create_triggers(self, conn):
+        conn.raw.executescript(TRIGGERS)
@@ -0,0 +1,138 @@
+"""Synthetic portfolios in an embedded database, with fake market data.
+
+use_offline_backend() points the backend at a SQLite file and a FakeYahoo;
+build_book() fills that file with a ledger of the requested size. Both the
+function benchmarks and the HTTP load test start from here.
+"""
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+import db_pool  # noqa: E402
+from fake_market import EPOCH, SECTORS, FakeYahoo, install  # noqa: E402
+from sqlite_store import SqliteDatabase  # noqa: E402
+
+SELL_SHARE = 0.3
+
+
+def use_offline_backend(path, latency=0.0, pool_size=db_pool.POOL_SIZE):
+    """Swap the connection pool for one over a SQLite file and yfinance for a FakeYahoo.
+
+    Call it before the backend handles any request; modules imported later
+    (e.g. app) are patched again by calling fake_market.install(provider).
+    """
+    database = SqliteDatabase(path)
+    db_pool.pool = db_pool.ConnectionPool(size=pool_size, connect=database.connect)
+
+    # Imported after the pool swap so nothing grabs a MySQL connection first
+    import crud  # noqa: F401
+    import price_history  # noqa: F401
+    import quote_service  # noqa: F401
+
+    provider = install(FakeYahoo(latency=latency))
+    return database, provider
+
+
+def _ledger(provider, holdings, transactions, days, rng, accounts=1):
+    """(rows, symbols): BUY/SELL rows over the last `days` days that leave exactly `holdings` open positions.
+
+    Symbol j is traded in account j % accounts + 1, so the positions are
+    spread evenly over the accounts.
+    """
+    symbols = [f"S{i:05d}" for i in range(holdings)]
+    end = date.today() - timedelta(days=1)
+    start = max(end - timedelta(days=days), EPOCH)
+    span = (end - start).days
+
+    # Every symbol is bought first, so every later SELL has shares to close
+    picks = np.concatenate((np.arange(holdings), rng.integers(0, holdings, transactions - holdings)))
+    day_offsets = np.sort(rng.integers(0, span + 1, transactions))
+    sells = np.zeros(transactions, dtype=bool)
+    sells[holdings:] = rng.random(transactions - holdings) < SELL_SHARE
+    quantities = rng.integers(5, 50, transactions).astype(float)
+
+    # Each trade is priced at its symbol's close that day; group rows by symbol once
+    prices = np.empty(transactions)
+    calendar_offset = (start - EPOCH).days
+    order = np.argsort(picks, kind="stable")
+    bounds = np.searchsorted(picks[order], np.arange(holdings + 1))
+    for j, symbol in enumerate(symbols):
+        rows = order[bounds[j]:bounds[j + 1]]
+        prices[rows] = provider.closes(symbol)[calendar_offset + day_offsets[rows]]
+
+    rows = []
+    positions = np.zeros(holdings)
+    for i in range(transactions):
+        j = picks[i]
+        quantity = quantities[i]
+        if sells[i]:
+            # Never close a position completely: the book keeps its size
+            quantity = min(quantity, positions[j] - 1)
+            if quantity < 1:
+                sells[i] = False
+                quantity = quantities[i]
+        positions[j] += -quantity if sells[i] else quantity
+        sector = SECTORS[j % len(SECTORS)]
+        rows.append((symbols[j], f"{symbols[j]} Holdings Inc.", sector, f"{sector} Services",
+                     quantity, round(float(prices[i]), 2), "SELL" if sells[i] else "BUY",
+                     start + timedelta(days=int(day_offsets[i])), int(j % accounts) + 1))
+    return rows, symbols
+
+
+def build_book(database, provider, holdings, transactions, days=730, seed=42, accounts=1):
+    """Load a ledger of `transactions` trades over `holdings` symbols into an empty database.
+
+    The holdings are spread over `accounts` cash accounts, each funded with
+    one opening deposit that covers its purchases plus a reserve for
+    benchmark trades. Rows are bulk-inserted
+    with the triggers dropped, with their cash legs written directly, and
+    holdings are then rebuilt once, as bench_trade_insert.py does for MySQL.
+    Returns the symbols.
+    """
+    if transactions < holdings:
+        raise ValueError(f"{holdings} holdings need at least as many transactions, not {transactions}")
+    if not 1 <= accounts <= holdings:
+        raise ValueError(f"{holdings} holdings can be spread over 1 to {holdings} accounts, not {accounts}")
+
+    rng = np.random.default_rng(seed)
+    rows, symbols = _ledger(provider, holdings, transactions, days, rng, accounts)
+    spent = np.zeros(accounts + 1)
+    for row in rows:
+        if row[6] == "BUY":
+            spent[row[8]] += row[4] * row[5]
+
+    conn = database.connect()
+    database.drop_triggers(conn)
+    raw = conn.raw
+    raw.executemany("INSERT INTO cash_account (ca_id, ca_name, ca_balance) VALUES (?, ?, 0)",
+                    ((account, f"Synthetic {account}") for account in range(1, accounts + 1)))
+    raw.executemany(
+        "INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note) VALUES (?, 'DEPOSIT', ?, ?, ?)",
+        ((account, round(float(spent[account]) * 1.1 + 1_000_000, 2), rows[0][7], "Opening deposit")
+         for account in range(1, accounts + 1)))
+    raw.executemany(
+        "INSERT INTO portfolio_transaction (pt_symbol, pt_name, pt_sector, pt_industry, pt_quantity, pt_price, pt_type, pt_date, pt_ca_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows)
+    raw.executemany(
+        "INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note, ct_source) VALUES (?, ?, ?, ?, ?, 'TRADE')",
+        ((row[8], "WITHDRAWAL" if row[6] == "BUY" else "DEPOSIT", round(row[4] * row[5], 2), row[7],
+          f"{'Purchase' if row[6] == 'BUY' else 'Sale'} of {row[4]} shares of {row[0]}") for row in rows))
+    raw.execute("""
+        UPDATE cash_account SET ca_balance = (
+            SELECT SUM(CASE WHEN ct_type = 'DEPOSIT' THEN ct_amount ELSE -ct_amount END)
+            FROM cash_transaction WHERE ct_ca_id = ca_id
+        )
+    """)
+    cursor = conn.cursor()
+    cursor.callproc("recalculate_portfolio_items")
+    cursor.close()
+    conn.commit()
+    database.create_triggers(conn)
+    conn.close()
+    return symbols
@@ -1,28 +1,37 @@
-import mysql.connector
 import os
 import json
-import yfinance as yf
-import pandas as pd
-from decimal import Decimal
+import numpy as np
+import db_pool
+import money
+import price_history
+import tax_lots
+import valuation
+from nav_history import get_nav_history
+from quote_service import get_company_profile, get_quote, get_quotes
+from stage_timings import StageTimings, format_timings
 from math_operations import calculate_change
 from dotenv import load_dotenv
-from datetime import datetime, date, timedelta
-from flask import Flask, jsonify, request, render_template
-
-from math_operations import calculate_change
+from datetime import datetime, date
 
 load_dotenv()
 
+# Cash account used by the dashboard, exports and API calls that don't name one
+DEFAULT_ACCOUNT_ID = int(os.getenv("DEFAULT_ACCOUNT_ID", "1"))
+
+# Where trade latency goes: request checks, quote lookup, company profile, DB write
+TRADE_STAGES = ("validate", "price", "metadata", "persist")
+trade_timings = StageTimings("trade", TRADE_STAGES)
+batch_trade_timings = StageTimings("batch_trade", TRADE_STAGES)
+
 
 def get_connection():
-    """Establish a connection to the MySQL database."""
+    """Get a pooled connection to the MySQL database.
 
-    return mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password=os.getenv('DB_PASSWORD'),
-        database='portfolio_manager',
-    )
+    Inside a request every helper shares the same connection (see
+    db_pool.unit_of_work), so close() only releases it outside a request.
+    """
+
+    return db_pool.get_connection()
 
 
 def calculate_sector_allocation(assets, total_value):
@@ -59,11 +68,9 @@ def calculate_sector_allocation(assets, total_value):
 def calculate_monthly_returns(history_data):
     """Calculate monthly returns for portfolio vs S&P 500."""
     try:
-        # Get S&P 500 data from yfinance
-        sp500 = yf.Ticker("^GSPC")
-        
-        # Get S&P 500 historical data from April 2025 to now
-        sp500_history = sp500.history(start="2025-04-01", end=datetime.now().strftime("%Y-%m-%d"))
+        # Get S&P 500 historical data from April 2025 to now from the local
+        # price store, which only downloads the days it has not seen yet
+        sp500_history = price_history.get_history("^GSPC", "2025-04-01")
         
         # Calculate monthly returns for both portfolio and S&P 500
         monthly_returns = []
@@ -135,82 +142,20 @@ def calculate_monthly_returns(history_data):
         ]
 
 
-def calculate_realized_gains():
-    """Calculate realized gains/losses from completed trades."""
+def calculate_realized_gains(ca_id=DEFAULT_ACCOUNT_ID):
+    """Calculate realized gains/losses from the account's completed trades.
+
+    Sells close persisted tax lots as they land (see tax_lots.py), so this is
+    a single SUM over realized_gain rather than a replay of the ledger.
+    """
     conn = get_connection()
     if conn is None:
         return 0.0
     
     try:
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get all completed trades (BUY and SELL pairs)
-        cursor.execute("""
-            SELECT 
-                pt_symbol,
-                pt_type,
-                pt_quantity,
-                pt_price,
-                pt_date
-            FROM portfolio_transaction 
-            WHERE pt_type IN ('BUY', 'SELL')
-            ORDER BY pt_symbol, pt_date
-        """)
-        
-        transactions = cursor.fetchall()
-        cursor.close()
+        total_realized_gains = tax_lots.total_realized_gains(conn, ca_id)
         conn.close()
-        
-        # Group transactions by symbol
-        symbol_transactions = {}
-        for transaction in transactions:
-            symbol = transaction['pt_symbol']
-            if symbol not in symbol_transactions:
-                symbol_transactions[symbol] = []
-            symbol_transactions[symbol].append(transaction)
-        
-        # Calculate realized gains for each symbol
-        total_realized_gains = 0.0
-        
-        for symbol, trades in symbol_transactions.items():
-            # Sort trades by date
-            trades.sort(key=lambda x: x['pt_date'])
-            
-            # Use FIFO method to calculate realized gains
-            buy_trades = []
-            sell_trades = []
-            
-            for trade in trades:
-                if trade['pt_type'] == 'BUY':
-                    buy_trades.append(trade)
-                else:  # SELL
-                    sell_trades.append(trade)
-            
-            # Calculate realized gains for each sell trade
-            for sell_trade in sell_trades:
-                sell_quantity = sell_trade['pt_quantity']
-                sell_price = sell_trade['pt_price']
-                remaining_quantity = sell_quantity
-                
-                # Match with buy trades using FIFO
-                for buy_trade in buy_trades:
-                    if remaining_quantity <= 0:
-                        break
-                    
-                    buy_quantity = buy_trade['pt_quantity']
-                    buy_price = buy_trade['pt_price']
-                    
-                    # Calculate how many shares to match
-                    match_quantity = min(remaining_quantity, buy_quantity)
-                    
-                    # Calculate realized gain/loss for this match
-                    realized_gain = (sell_price - buy_price) * match_quantity
-                    total_realized_gains += realized_gain
-                    
-                    remaining_quantity -= match_quantity
-                    buy_trade['pt_quantity'] -= match_quantity
-        
-        return round(total_realized_gains, 2)
+        return money.dollars(total_realized_gains)
         
     except Exception as e:
         print(f"Error calculating realized gains: {e}")
@@ -220,7 +165,7 @@ def calculate_realized_gains():
 
 
 def get_portfolio(orderBy, numEntries=None):
-    """Fetch the portfolio items from the database."""
+    """Fetch the portfolio items of the default account from the database."""
     conn = get_connection()
     if conn is None:
         # Return fallback data when database is not available
@@ -234,59 +179,64 @@ def get_portfolio(orderBy, numEntries=None):
             "assets": []  # Empty assets when DB unavailable
         }
     
-    try:
-        cursor = conn.cursor(dictionary=True)
-
-        if numEntries is None:
-            # Count total number of rows in the table
-            cursor.execute("SELECT COUNT(*) as total FROM portfolio_item")
-            numEntries = cursor.fetchone()['total']
-
-        cursor.execute("SELECT * FROM portfolio_item ORDER BY %s DESC LIMIT %s",
-                       (orderBy, numEntries))
-        result = cursor.fetchall()
+    conn.close()
+    conn = None
 
-        cursor.close()
-        conn.close()
+    try:
+        # Holdings, quotes, cash and deposits come from the shared valuation
+        # snapshot, which the export endpoints reuse within its freshness window
+        snapshot = valuation.get_snapshot()
+        count = len(snapshot.holdings) if numEntries is None else numEntries
+        holdings = snapshot.holdings[:count]
+
+        # Position math runs on the snapshot's int64 columns (money.py units);
+        # unpriced holdings are valued at their weighted buy price and flagged
+        priced = snapshot.priced[:count]
+        avg_prices = snapshot.avg_prices[:count]
+        cost_bases = snapshot.cost_bases[:count]
+        market_values = np.where(priced, snapshot.market_values[:count], cost_bases)
+        price_cents = money.rescale(np.where(priced, snapshot.prices[:count], avg_prices),
+                                    money.PRICE_UNITS // money.CENTS)
+        avg_price_cents = money.rescale(avg_prices, money.PRICE_UNITS // money.CENTS)
 
         assets = []
-        total_value = 0
-        stock_cost_basis = 0
-
-        for row in result:
-            ticker = row["pi_symbol"]
-            volume = row["pi_total_quantity"]
-            weighted_buy_price = float(
-                row["pi_weighted_average_price"])  #Switch to stock price April 7th
-
-            # Get current stock price using yfinance
-            stock = yf.Ticker(ticker)
-            current_price = stock.info.get('regularMarketPrice')
-            change = calculate_change(current_price, weighted_buy_price)
+        unpriced_symbols = []
+        for holding, price, weighted_buy_price in zip(holdings, money.dollars(price_cents).tolist(),
+                                                      money.dollars(avg_price_cents).tolist()):
+            ticker = holding.symbol
+
+            if holding.price is None:
+                print(f"No quote available for {ticker}, using weighted buy price")
+                unpriced_symbols.append(ticker)
+                current_price = holding.avg_price
+            else:
+                current_price = holding.price
+            change = calculate_change(current_price, holding.avg_price)
 
             asset = {
                 "symbol": ticker,
-                "name": row.get("pi_name", ticker),  # Use actual company name from DB
-                "sector": row.get("pi_sector", "Unknown"),  # Add sector from DB
-                "industry": row.get("pi_industry", "Unknown"),  # Add industry from DB
-                "price": round(current_price, 2),
+                "name": holding.name or ticker,  # Use actual company name from DB
+                "sector": holding.sector or "Unknown",  # Add sector from DB
+                "industry": holding.industry or "Unknown",  # Add industry from DB
+                "price": price,
                 "change": round(change, 2),
-                "volume": volume,
-                "weighted_buy_price": round(weighted_buy_price, 2)
+                "volume": holding.quantity,
+                "weighted_buy_price": weighted_buy_price,
+                # True when price is the weighted buy price because Yahoo had no quote
+                "unpriced": holding.price is None
             }
 
             assets.append(asset)
-            total_value += current_price * volume
-            stock_cost_basis += weighted_buy_price * volume
 
-        # Get cash balance and add to total value
-        cash_balance = get_cash_balance()
-        total_value += cash_balance
+        # Totals are exact sums in cents
+        stock_value = int(market_values.sum())
+        stock_cost_basis = int(cost_bases.sum())
+        total_value = stock_value + snapshot.cash_cents
         
         # Calculate total initial investment
         # From data.sql, initial deposit was $25,000
         # All stock purchases came from this initial cash
-        total_initial_investment = get_total_deposits()
+        total_initial_investment = snapshot.deposit_cents
         
         # Calculate profit/loss including cash balance
         profit_loss = total_value - total_initial_investment
@@ -299,24 +249,19 @@ def get_portfolio(orderBy, numEntries=None):
                          (calculate_change(a["price"], a["weighted_buy_price"])))
         # best_token.pl = calculate_change(best_token["price"], best_token["buy_price"])
 
-        # build portfolio history from actual inception date (April 7th, 2025)
-        portfolio_inception_date = datetime(2025, 4, 7)  # April 7th, 2025
-        current_date = datetime.now()
-        days_since_inception = (current_date - portfolio_inception_date).days
-        
-        # Generate history from inception to today
-        history = []
-        for i in range(days_since_inception + 1):
-            date = (portfolio_inception_date + timedelta(days=i)).strftime("%Y-%m-%d")
-            # Linear progression from initial investment to current value
-            if days_since_inception > 0:
-                value = total_initial_investment + ((total_value - total_initial_investment) / days_since_inception) * i
-            else:
-                value = total_initial_investment
-            history.append({"date": date, "value": round(value, 2)})
+        # Build portfolio history by replaying the trade and cash ledgers
+        # against closing prices; it is memoized until the next trade
+        try:
+            history = get_nav_history(DEFAULT_ACCOUNT_ID)
+        except Exception as e:
+            print(f"Error building NAV history: {e}")
+            history = []
+
+        # Today's point uses live prices rather than a closing price
+        history.append({"date": datetime.now().strftime("%Y-%m-%d"), "value": money.dollars(total_value)})
         
         # Calculate sector allocation
-        sector_allocation = calculate_sector_allocation(assets, total_value)
+        sector_allocation = calculate_sector_allocation(assets, money.dollars(total_value))
         
         # Calculate monthly returns vs S&P 500
         monthly_returns = calculate_monthly_returns(history)
@@ -326,19 +271,19 @@ def get_portfolio(orderBy, numEntries=None):
         
         # Calculate unrealized gains (only from stock appreciation, not cash deposits)
         # This is the difference between current stock value and stock cost basis
-        current_stock_value = total_value - cash_balance
-        unrealized_gains = current_stock_value - stock_cost_basis
+        unrealized_gains = stock_value - stock_cost_basis
         
         response = {
-            "totalValue": round(total_value, 2),
-            "profitLoss": round(profit_loss, 2),
-            "unrealizedGains": round(unrealized_gains, 2),
+            "totalValue": money.dollars(total_value),
+            "profitLoss": money.dollars(profit_loss),
+            "unrealizedGains": money.dollars(unrealized_gains),
             "realizedGains": realized_gains,
             "totalReturnPercent": total_return_percent,
-            "cashBalance": cash_balance,
+            "cashBalance": snapshot.cash_balance,
             "bestToken": best_token,
             "history": history,
             "assets": assets,
+            "unpricedSymbols": unpriced_symbols,
             "sectorAllocation": sector_allocation,
             "monthlyReturns": monthly_returns
         }
@@ -365,68 +310,253 @@ def get_portfolio(orderBy, numEntries=None):
         }
 
 
-def handle_trade(symbol, amount, trade_type, date=None):
-    """Handle buying or selling a stock by inserting into portfolio_transaction table."""
-    if date is None:
-        date = datetime.now()
-
-    transaction_date = date.strftime("%Y-%m-%d")
+def handle_trade(symbol, amount, trade_type, date=None, lot_method=tax_lots.DEFAULT_LOT_METHOD, lot_ids=None,
+                 ca_id=DEFAULT_ACCOUNT_ID):
+    """Handle buying or selling a stock by inserting into portfolio_transaction table.
+
+    The trade is booked against cash account ca_id and its holdings. For a
+    SELL, lot_method (FIFO, LIFO, HIFO or SPECIFIC with lot_ids) picks which
+    of the account's tax lots are closed.
+
+    The trade runs in four timed stages (see trade_timings): validate,
+    price (one quote lookup), metadata (cached company profile) and persist.
+    Only persist and the stored-close fallback of price touch the database;
+    the fallback hands the request's connection back before the metadata
+    call, so none is held across network calls. Returns the per-stage
+    durations in seconds.
+    """
+    timings = {}
+
+    with trade_timings.stage("validate", timings):
+        if date is None:
+            date = datetime.now()
+        symbol = symbol.strip().upper()
+        quantity = money.to_units(amount, money.SHARE_UNITS)
+        if quantity <= 0 or trade_type not in ('BUY', 'SELL'):
+            raise ValueError("Trades need a positive amount and a trade type of BUY or SELL")
+        if trade_type == 'SELL':
+            lot_method = tax_lots.validate_lot_selection(lot_method, lot_ids)
+        transaction_date = date.strftime("%Y-%m-%d")
 
-    ticker = yf.Ticker(symbol)
-
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    if trade_type == 'SELL':
-        # Check if enough shares are owned before selling
-        cursor.execute(
-            "SELECT pi_total_quantity FROM portfolio_item WHERE pi_symbol = %s",
-            (symbol, ))
-        result = cursor.fetchone()
-        total_owned = result["pi_total_quantity"] or 0
-
-        if amount > total_owned:
+    # Fetch the current price of the stock using real-time data
+    with trade_timings.stage("price", timings):
+        try:
+            # Get current market price
+            quote = get_quote(symbol)
+            current_price = money.to_cents(quote.price) if quote else 0
+            
+            # Fallback to the last stored close if current price is not available
+            if current_price == 0:
+                close = price_history.get_close(symbol, date)
+                # Don't keep the request's connection checked out across the profile lookup
+                db_pool.release_shared_connection()
+                if close is None:
+                    raise IndexError(f"no stored close for {symbol}")
+                current_price = money.to_cents(close)
+        except (IndexError, AttributeError):
             raise ValueError(
-                f"Cannot sell {amount} shares of {symbol}. You only own {total_owned}."
+                f"Stock data for {symbol} not available. Please check the symbol."
             )
 
-    # Fetch the current price of the stock using real-time data
-    try:
-        # Get current market price
-        current_price = round(ticker.info.get('regularMarketPrice', 0), 2)
-        
-        # Fallback to historical data if current price is not available
-        if current_price == 0:
-            current_price = round(
-                ticker.history(
-                    start=transaction_date,
-                    end=(date +
-                         timedelta(days=1)).strftime("%Y-%m-%d"))["Close"].iloc[0],
-                2)
-    except (IndexError, AttributeError):
-        raise ValueError(
-            f"Stock data for {symbol} not available. Please check the symbol."
-        )
+    # Get stock information for the transaction (metadata cache tier)
+    with trade_timings.stage("metadata", timings):
+        profile = get_company_profile(symbol)
+        company_name = profile['longName']
+        sector = profile['sector']
+        industry = profile['industry']
 
-    # Get stock information for the transaction
-    stock_info = ticker.info
-    company_name = stock_info.get('longName', symbol)
-    sector = stock_info.get('sector', 'Unknown')
-    industry = stock_info.get('industry', 'Unknown')
+    with trade_timings.stage("persist", timings):
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # The overdraft trigger compares against a NULL balance for an unknown
+            # account, so check it here as handle_trades does
+            cursor.execute("SELECT ca_id FROM cash_account WHERE ca_id = %s", (ca_id, ))
+            if cursor.fetchone() is None:
+                raise ValueError(f"Unknown account {ca_id}")
+
+            if trade_type == 'SELL':
+                # Check if enough shares are owned before selling; the lock
+                # holds until commit so a concurrent sell can't slip in
+                cursor.execute(
+                    f"SELECT {money.column('pi_total_quantity', money.SHARE_UNITS)} AS quantity "
+                    f"FROM portfolio_item WHERE pi_ca_id = %s AND pi_symbol = %s FOR UPDATE",
+                    (ca_id, symbol))
+                result = cursor.fetchone()
+                total_owned = (result["quantity"] if result else 0) or 0
+
+                if quantity > total_owned:
+                    raise ValueError(
+                        f"Cannot sell {amount} shares of {symbol}. "
+                        f"You only own {total_owned / money.SHARE_UNITS}."
+                    )
+
+            # Insert into portfolio_transaction table to trigger procedures
+            cursor.execute(
+                "INSERT INTO portfolio_transaction (pt_symbol, pt_name, pt_sector, pt_industry, pt_quantity, pt_price, pt_type, pt_date, pt_ca_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                (symbol, company_name, sector, industry, money.to_decimal(quantity, money.SHARE_UNITS),
+                 money.to_decimal(current_price, money.CENTS), trade_type, transaction_date, ca_id)
+            )
 
-    # Insert into portfolio_transaction table to trigger procedures
-    cursor.execute(
-        "INSERT INTO portfolio_transaction (pt_symbol, pt_name, pt_sector, pt_industry, pt_quantity, pt_price, pt_type, pt_date, pt_ca_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
-        (symbol, company_name, sector, industry, amount, current_price, trade_type, transaction_date, 1)
-    )
+            # Open or close tax lots in the same transaction as the trade
+            tax_lots.record_trade(conn, cursor.lastrowid, lot_method, lot_ids)
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        valuation.invalidate()
 
     print(
-        f"{trade_type} {amount} shares of {symbol} at ${current_price} on {transaction_date}"
+        f"{trade_type} {amount} shares of {symbol} at ${money.dollars(current_price):.2f} on {transaction_date} "
+        f"in account {ca_id} ({format_timings(timings)})"
     )
+    return timings
+
+
+def handle_trades(legs, date=None, ca_id=DEFAULT_ACCOUNT_ID):
+    """Execute several trades in cash account ca_id atomically: all legs land or none do.
+
+    legs is a list of dicts with symbol, amount, trade_type and, for SELLs,
+    optional lot_method / lot_ids. Every leg is validated against the cash
+    balance and holdings (in order, so a SELL can fund a later BUY), all
+    symbols are priced with one batched quote request, and the rows are
+    inserted in a single transaction. The portfolio
+    snapshot is recalculated once for the batch instead of once per leg.
+    Returns the executed legs with their prices; raises ValueError naming
+    the first invalid leg.
+    """
+    if not legs:
+        raise ValueError("No trades given")
+
+    timings = {}
+    with batch_trade_timings.stage("validate", timings):
+        if date is None:
+            date = datetime.now()
+        transaction_date = date.strftime("%Y-%m-%d")
+
+        trades = []
+        for i, leg in enumerate(legs):
+            if not isinstance(leg, dict):
+                raise ValueError(f"Trade {i}: must be an object with symbol, amount and trade_type")
+            symbol = str(leg.get('symbol', '')).strip().upper()
+            amount = int(leg.get('amount', 0))
+            trade_type = str(leg.get('trade_type', '')).upper()
+            if not symbol or amount <= 0 or trade_type not in ('BUY', 'SELL'):
+                raise ValueError(f"Trade {i}: required symbol, positive amount and trade_type (BUY/SELL)")
+            lot_method, lot_ids = None, leg.get('lot_ids')
+            if trade_type == 'SELL':
+                try:
+                    lot_method = tax_lots.validate_lot_selection(leg.get('lot_method'), lot_ids)
+                except ValueError as e:
+                    raise ValueError(f"Trade {i}: {e}")
+            trades.append({"symbol": symbol, "amount": amount, "quantity": money.to_units(amount, money.SHARE_UNITS),
+                           "type": trade_type, "lot_method": lot_method, "lot_ids": lot_ids})
+
+    with batch_trade_timings.stage("price", timings):
+        # One quote request for every symbol in the batch; prices are in cents
+        symbols = sorted({trade["symbol"] for trade in trades})
+        quotes = get_quotes(symbols)
+        prices = {}
+        for symbol in symbols:
+            quote = quotes.get(symbol)
+            if quote is not None and quote.price > 0:
+                prices[symbol] = money.to_cents(quote.price)
+                continue
+            close = price_history.get_close(symbol, date)
+            if close is None:
+                raise ValueError(f"Stock data for {symbol} not available. Please check the symbol.")
+            prices[symbol] = money.to_cents(close)
+        # Stored-close fallbacks may have checked out the request's connection
+        db_pool.release_shared_connection()
+
+    with batch_trade_timings.stage("metadata", timings):
+        profiles = {symbol: get_company_profile(symbol) for symbol in symbols}
+
+    with batch_trade_timings.stage("persist", timings):
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # Lock the balance and the affected holdings for the whole batch; cash is
+            # tracked in cents and holdings in share units, as the triggers round them
+            cursor.execute(
+                f"SELECT {money.column('ca_balance', money.CENTS)} AS balance FROM cash_account "
+                f"WHERE ca_id = %s FOR UPDATE",
+                (ca_id, ))
+            result = cursor.fetchone()
+            if result is None:
+                raise ValueError(f"Unknown account {ca_id}")
+            cash = result['balance']
+
+            placeholders = ", ".join(["%s"] * len(symbols))
+            cursor.execute(
+                f"SELECT pi_symbol, {money.column('pi_total_quantity', money.SHARE_UNITS)} AS quantity "
+                f"FROM portfolio_item WHERE pi_ca_id = %s AND pi_symbol IN ({placeholders}) FOR UPDATE",
+                (ca_id, *symbols))
+            owned = {row['pi_symbol']: row['quantity'] for row in cursor.fetchall()}
+
+            rows = []
+            for i, trade in enumerate(trades):
+                symbol, amount, quantity = trade["symbol"], trade["amount"], trade["quantity"]
+                cost = money.value_cents(quantity, prices[symbol], price_scale=money.CENTS)
+                if trade["type"] == 'BUY':
+                    if cost > cash:
+                        raise ValueError(f"Trade {i}: insufficient funds to buy {amount} shares of {symbol} "
+                                         f"(${money.dollars(cost):.2f} needed, ${money.dollars(cash):.2f} available)")
+                    cash -= cost
+                    owned[symbol] = owned.get(symbol, 0) + quantity
+                else:
+                    if quantity > owned.get(symbol, 0):
+                        raise ValueError(f"Trade {i}: cannot sell {amount} shares of {symbol}. "
+                                         f"You only own {owned.get(symbol, 0) / money.SHARE_UNITS}.")
+                    cash += cost
+                    owned[symbol] -= quantity
+
+                profile = profiles[symbol]
+                rows.append((symbol, profile['longName'], profile['sector'], profile['industry'],
+                             money.to_decimal(quantity, money.SHARE_UNITS), money.to_decimal(prices[symbol], money.CENTS),
+                             trade["type"], transaction_date, ca_id))
+
+            # Triggers keep holdings per row; the snapshot waits for the last leg
+            cursor.execute("SET @pm_batch_trade = 1")
+            # Row by row, so each leg's lot selection is keyed by the id its own
+            # INSERT got; multi-row ids need not be consecutive (auto_increment_increment)
+            selections = {}
+            for row, trade in zip(rows, trades):
+                cursor.execute(
+                    "INSERT INTO portfolio_transaction (pt_symbol, pt_name, pt_sector, pt_industry, pt_quantity, pt_price, pt_type, pt_date, pt_ca_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    row)
+                selections[cursor.lastrowid] = (trade["lot_method"], trade["lot_ids"])
+            tax_lots.record_trades(conn, selections)
+            cursor.execute("CALL recalculate_portfolio_snapshot()")
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                cursor.execute("SET @pm_batch_trade = NULL")
+            except Exception as e:
+                # Don't mask the original error on a broken connection
+                print(f"Error resetting @pm_batch_trade: {e}")
+            cursor.close()
+            conn.close()
+
+        valuation.invalidate()
+
+    print(f"Executed batch of {len(trades)} trades on {transaction_date} in account {ca_id} "
+          f"({format_timings(timings)})")
+
+    return [{
+        "symbol": trade["symbol"],
+        "quantity": trade["amount"],
+        "type": trade["type"],
+        "price": money.dollars(prices[trade["symbol"]]),
+    } for trade in trades]
 
 
 def print_portfolio(numEntries=5):
@@ -446,31 +576,37 @@ def print_portfolio(numEntries=5):
     conn.close()
 
 
-def get_cash_balance(ca_id=1):
+def get_cash_balance(ca_id=DEFAULT_ACCOUNT_ID):
     """Get the current cash balance from cash_account table."""
+    return money.dollars(get_cash_balance_cents(ca_id))
+
+
+def get_cash_balance_cents(ca_id=DEFAULT_ACCOUNT_ID):
+    """The account's cash balance in cents."""
     conn = get_connection()
     if conn is None:
         # Return default cash balance when database is not available
-        return 10000.00
+        return money.to_cents(10000.00)
 
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT ca_balance FROM cash_account WHERE ca_id = %s",
+        cursor.execute(f"SELECT {money.column('ca_balance', money.CENTS)} AS balance "
+                       f"FROM cash_account WHERE ca_id = %s",
                        (ca_id, ))
         result = cursor.fetchone()
 
         cursor.close()
         conn.close()
 
-        return float(result['ca_balance']) if result else 10000.00
+        return result['balance'] if result else money.to_cents(10000.00)
     except Exception as e:
         print(f"Error getting cash balance: {e}")
         if conn:
             conn.close()
-        return 10000.00
+        return money.to_cents(10000.00)
 
 
-def add_funds(amount, ca_id=1):
+def add_funds(amount, ca_id=DEFAULT_ACCOUNT_ID):
     """Add funds to the cash account and record the transaction."""
     conn = get_connection()
     if conn is None:
@@ -481,20 +617,24 @@ def add_funds(amount, ca_id=1):
     try:
         cursor = conn.cursor(dictionary=True)
 
-        # Get current balance
-        cursor.execute("SELECT ca_balance FROM cash_account WHERE ca_id = %s",
+        # Get current balance (cents)
+        cursor.execute(f"SELECT {money.column('ca_balance', money.CENTS)} AS balance "
+                       f"FROM cash_account WHERE ca_id = %s",
                        (ca_id, ))
         result = cursor.fetchone()
-        current_balance = float(result['ca_balance']) if result else 0.0
+        if result is None:
+            raise ValueError(f"Unknown account {ca_id}")
+        current_balance = result['balance']
 
         # Calculate new balance
-        new_balance = current_balance + amount
+        amount_cents = money.to_cents(amount)
+        new_balance = money.dollars(current_balance + amount_cents)
 
         # Record the transaction
         today = datetime.now().date()
         cursor.execute(
             "INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note) VALUES (%s, %s, %s, %s, %s)",
-            (ca_id, 'DEPOSIT', amount, today, f'Funds added via app: ${amount}'))
+            (ca_id, 'DEPOSIT', money.to_decimal(amount_cents, money.CENTS), today, f'Funds added via app: ${amount}'))
 
         # Get the transaction ID
         transaction_id = cursor.lastrowid
@@ -502,6 +642,7 @@ def add_funds(amount, ca_id=1):
         conn.commit()
         cursor.close()
         conn.close()
+        valuation.invalidate()
 
         print(f"Added ${amount} to account {ca_id}. New balance: ${new_balance}")
         
@@ -510,6 +651,9 @@ def add_funds(amount, ca_id=1):
             "transaction_id": transaction_id,
             "amount_added": amount
         }
+    except ValueError:
+        conn.close()
+        raise
     except Exception as e:
         print(f"Error adding funds: {e}")
         if conn:
@@ -518,7 +662,7 @@ def add_funds(amount, ca_id=1):
 
     # Get current balance
 
-        updated_current_balance = get_cash_balance(1)
+        updated_current_balance = get_cash_balance(ca_id)
 
         return {
             "new_balance": updated_current_balance,
@@ -527,23 +671,29 @@ def add_funds(amount, ca_id=1):
         }
 
 
-def get_total_deposits(ca_id=1):
+def get_total_deposits(ca_id=DEFAULT_ACCOUNT_ID):
     """Calculate total deposits from cash_transaction table."""
+    return money.dollars(get_total_deposit_cents(ca_id))
+
+
+def get_total_deposit_cents(ca_id=DEFAULT_ACCOUNT_ID):
+    """Sum of the account's deposits in cents."""
     conn = get_connection()
     if conn is None:
         # Return initial deposit when database is not available
-        return 25000.0
+        return money.to_cents(25000.0)
 
     try:
         cursor = conn.cursor(dictionary=True)
         
-        # Sum all DEPOSIT transactions
+        # Sum the money paid in; sale proceeds are DEPOSIT rows too, written by the trade trigger
         cursor.execute(
-            "SELECT SUM(ct_amount) as total_deposits FROM cash_transaction WHERE ct_type = 'DEPOSIT' AND ct_ca_id = %s",
+            f"SELECT {money.column('SUM(ct_amount)', money.CENTS)} as total_deposits "
+            f"FROM cash_transaction WHERE ct_type = 'DEPOSIT' AND ct_source = 'MANUAL' AND ct_ca_id = %s",
             (ca_id,)
         )
         result = cursor.fetchone()
-        total_deposits = float(result['total_deposits']) if result and result['total_deposits'] else 25000.0
+        total_deposits = result['total_deposits'] if result and result['total_deposits'] else money.to_cents(25000.0)
         
         cursor.close()
         conn.close()
@@ -553,4 +703,31 @@ def get_total_deposits(ca_id=1):
         print(f"Error getting total deposits: {e}")
         if conn:
             conn.close()
-        return 25000.0
\ No newline at end of file
+        return money.to_cents(25000.0)
+
+def check_portfolio_items(repair=False):
+    """Compare incrementally maintained holdings against a full rebuild from the ledger.
+
+    Returns the mismatched (account, symbol) pairs; with repair=True the holdings are rebuilt
+    with recalculate_portfolio_items() when any mismatch is found.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.callproc('check_portfolio_items')
+        mismatches = []
+        for result in cursor.stored_results():
+            # DECIMAL columns come back as Decimal, which JSON would turn into strings
+            mismatches.extend({key: float(value) if isinstance(value, Decimal) else value
+                               for key, value in row.items()} for row in result.fetchall())
+
+        repaired = False
+        if mismatches and repair:
+            cursor.callproc('recalculate_portfolio_items')
+            conn.commit()
+            repaired = True
+
+        cursor.close()
+        return {"consistent": not mismatches, "mismatches": mismatches, "repaired": repaired}
+    finally:
+        conn.close()
@@ -10,7 +10,7 @@ INSERT INTO cash_account (ca_name, ca_balance) VALUES
 -- 2️⃣ INSERT CASH TRANSACTIONS
 -- ============================
 INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note) VALUES
-(1, 'DEPOSIT', 25000, '2025-06-01', 'Initial deposit');
+(1, 'DEPOSIT', 25000, '2025-04-01', 'Initial deposit');
 -- ============================
 -- 3️⃣ INSERT PORTFOLIO TRANSACTIONS (BUY/SELL)
 -- ============================
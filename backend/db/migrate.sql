@@ -0,0 +1,132 @@
+-- Upgrade an existing portfolio_manager database in place, keeping its data.
+-- master.sql (schema.sql) drops and recreates the database; run this instead on a
+-- database created by an older schema.sql (FLOAT money, one holding per symbol):
+--
+--     cd backend/db && mysql -u root -p < migrate.sql
+--
+-- Run it once; MySQL cannot make the ALTERs below conditional.
+USE portfolio_manager;
+
+-- ============================
+-- FLOAT -> DECIMAL money (FLOATs round to the nearest cent / ten-thousandth)
+-- ============================
+
+ALTER TABLE cash_account
+    MODIFY ca_balance DECIMAL(15,2) NOT NULL;
+
+ALTER TABLE cash_transaction
+    MODIFY ct_amount DECIMAL(15,2) NOT NULL,
+    ADD COLUMN ct_source ENUM('MANUAL', 'TRADE') NOT NULL DEFAULT 'MANUAL';
+
+-- Cash legs written by the old trade trigger, so sale proceeds don't count as deposits
+UPDATE cash_transaction
+SET ct_source = 'TRADE'
+WHERE ct_note LIKE 'Purchase of % shares of %' OR ct_note LIKE 'Sale of % shares of %';
+
+ALTER TABLE portfolio_transaction
+    MODIFY pt_quantity DECIMAL(18,4) NOT NULL,
+    MODIFY pt_price DECIMAL(15,2) NOT NULL;
+
+ALTER TABLE portfolio_snapshot
+    MODIFY ps_total_cash DECIMAL(15,2) NOT NULL,
+    MODIFY ps_total_equity DECIMAL(15,2) NOT NULL,
+    MODIFY ps_total_value DECIMAL(15,2) NOT NULL;
+
+-- ============================
+-- Holdings per account: (pi_ca_id, pi_symbol) key, rebuilt from the ledger below
+-- ============================
+
+ALTER TABLE portfolio_item
+    ADD COLUMN pi_ca_id INT NOT NULL DEFAULT 1 FIRST,
+    MODIFY pi_total_quantity DECIMAL(18,4) NOT NULL,
+    MODIFY pi_weighted_average_price DECIMAL(15,4) NOT NULL,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (pi_ca_id, pi_symbol),
+    ADD FOREIGN KEY (pi_ca_id) REFERENCES cash_account(ca_id),
+    ADD INDEX idx_pi_symbol (pi_symbol);
+
+-- Keyset pagination of /api/transactions
+ALTER TABLE portfolio_transaction
+    ADD INDEX idx_pt_account_date_id (pt_ca_id, pt_date, pt_id),
+    ADD INDEX idx_pt_account_symbol_date_id (pt_ca_id, pt_symbol, pt_date, pt_id),
+    ADD INDEX idx_pt_account_type_date_id (pt_ca_id, pt_type, pt_date, pt_id),
+    ADD INDEX idx_pt_date_id (pt_date, pt_id),
+    ADD INDEX idx_pt_symbol_date_id (pt_symbol, pt_date, pt_id),
+    ADD INDEX idx_pt_type_date_id (pt_type, pt_date, pt_id);
+
+-- ============================
+-- New tables (same definitions as schema.sql)
+-- ============================
+
+CREATE TABLE IF NOT EXISTS portfolio_position_total (
+    ppt_ca_id INT NOT NULL DEFAULT 1,
+    ppt_symbol VARCHAR(10) NOT NULL,
+    ppt_buy_quantity DECIMAL(18,4) NOT NULL DEFAULT 0,
+    ppt_buy_cost DECIMAL(21,6) NOT NULL DEFAULT 0,
+    ppt_sell_quantity DECIMAL(18,4) NOT NULL DEFAULT 0,
+    PRIMARY KEY (ppt_ca_id, ppt_symbol)
+);
+
+CREATE TABLE IF NOT EXISTS tax_lot (
+    tl_id INT AUTO_INCREMENT PRIMARY KEY,
+    tl_pt_id INT NOT NULL,
+    tl_ca_id INT NOT NULL DEFAULT 1,
+    tl_symbol VARCHAR(10) NOT NULL,
+    tl_date DATE NOT NULL,
+    tl_quantity DECIMAL(18,4) NOT NULL,
+    tl_remaining_quantity DECIMAL(18,4) NOT NULL,
+    tl_price DECIMAL(15,2) NOT NULL,
+    INDEX idx_tax_lot_open (tl_ca_id, tl_symbol, tl_remaining_quantity),
+    FOREIGN KEY (tl_pt_id) REFERENCES portfolio_transaction(pt_id)
+);
+
+CREATE TABLE IF NOT EXISTS realized_gain (
+    rg_id INT AUTO_INCREMENT PRIMARY KEY,
+    rg_pt_id INT NOT NULL,
+    rg_tl_id INT NOT NULL,
+    rg_symbol VARCHAR(10) NOT NULL,
+    rg_date DATE NOT NULL,
+    rg_quantity DECIMAL(18,4) NOT NULL,
+    rg_cost_price DECIMAL(15,2) NOT NULL,
+    rg_sale_price DECIMAL(15,2) NOT NULL,
+    rg_gain DECIMAL(15,2) NOT NULL,
+    FOREIGN KEY (rg_pt_id) REFERENCES portfolio_transaction(pt_id),
+    FOREIGN KEY (rg_tl_id) REFERENCES tax_lot(tl_id)
+);
+
+-- Empty: tax_lots.py replays the whole ledger into lots on first use
+CREATE TABLE IF NOT EXISTS tax_lot_sync (
+    tls_id TINYINT PRIMARY KEY,
+    tls_last_pt_id INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS price_history (
+    ph_symbol VARCHAR(10) NOT NULL,
+    ph_date DATE NOT NULL,
+    ph_open DOUBLE NOT NULL,
+    ph_high DOUBLE NOT NULL,
+    ph_low DOUBLE NOT NULL,
+    ph_close DOUBLE NOT NULL,
+    ph_volume BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (ph_symbol, ph_date)
+);
+
+CREATE TABLE IF NOT EXISTS price_history_sync (
+    phs_symbol VARCHAR(10) PRIMARY KEY,
+    phs_start DATE NOT NULL,
+    phs_end DATE NOT NULL
+);
+
+-- ============================
+-- Procedures and triggers, then rebuild the holdings per account
+-- ============================
+
+DROP TRIGGER IF EXISTS trg_cash_transaction_insert;
+DROP TRIGGER IF EXISTS trg_portfolio_transaction_before_insert;
+DROP TRIGGER IF EXISTS trg_portfolio_transaction_insert;
+
+source ./procedures.sql
+source ./triggers.sql
+
+CALL recalculate_portfolio_items();
+CALL recalculate_portfolio_snapshot();
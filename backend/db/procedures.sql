@@ -3,14 +3,14 @@ DELIMITER $$
 DROP PROCEDURE IF EXISTS recalculate_portfolio_snapshot $$
 CREATE PROCEDURE recalculate_portfolio_snapshot()
 BEGIN
-    DECLARE total_cash FLOAT DEFAULT 0;
-    DECLARE total_equity FLOAT DEFAULT 0;
+    DECLARE total_cash DECIMAL(15,2) DEFAULT 0;
+    DECLARE total_equity DECIMAL(15,2) DEFAULT 0;
 
     -- Get total cash
     SELECT IFNULL(SUM(ca_balance),0) INTO total_cash FROM cash_account;
 
     -- Get total equity (quantity * weighted avg price)
-    SELECT IFNULL(SUM(pi_total_quantity * pi_weighted_average_price),0) INTO total_equity FROM portfolio_item;
+    SELECT IFNULL(ROUND(SUM(pi_total_quantity * pi_weighted_average_price), 2),0) INTO total_equity FROM portfolio_item;
 
     -- Insert or update snapshot
     INSERT INTO portfolio_snapshot (ps_date, ps_total_cash, ps_total_equity, ps_total_value)
@@ -25,28 +25,158 @@ DELIMITER ;
 
 DELIMITER $$
 
+-- Full rebuild of holdings from the whole ledger. Trades no longer call this;
+-- it is kept for the nightly event and as an on-demand repair.
 DROP PROCEDURE IF EXISTS recalculate_portfolio_items $$
 CREATE PROCEDURE recalculate_portfolio_items()
 BEGIN
+    DELETE FROM portfolio_position_total;
+
+    INSERT INTO portfolio_position_total (
+        ppt_ca_id, ppt_symbol, ppt_buy_quantity, ppt_buy_cost, ppt_sell_quantity
+    )
+    SELECT
+        pt_ca_id,
+        pt_symbol,
+        SUM(CASE WHEN pt_type='BUY' THEN pt_quantity ELSE 0 END),
+        SUM(CASE WHEN pt_type='BUY' THEN pt_quantity * pt_price ELSE 0 END),
+        SUM(CASE WHEN pt_type='SELL' THEN pt_quantity ELSE 0 END)
+    FROM portfolio_transaction
+    GROUP BY pt_ca_id, pt_symbol;
+
     DELETE FROM portfolio_item;
 
+    -- One holding per account and symbol, even if a company's name, sector or
+    -- industry changed between trades; those come from the latest trade, as
+    -- apply_portfolio_transaction() leaves them
     INSERT INTO portfolio_item (
-        pi_symbol, pi_name, pi_sector, pi_industry,
+        pi_ca_id, pi_symbol, pi_name, pi_sector, pi_industry,
         pi_total_quantity, pi_weighted_average_price
     )
-    SELECT 
-        pt_symbol,
-        pt_name,
-        pt_sector,
-        pt_industry,
-        SUM(CASE WHEN pt_type='BUY' THEN pt_quantity ELSE -pt_quantity END) AS total_qty,
-        (
-            SUM(CASE WHEN pt_type='BUY' THEN pt_quantity * pt_price ELSE 0 END) /
-            NULLIF(SUM(CASE WHEN pt_type='BUY' THEN pt_quantity ELSE 0 END), 0)
-        ) AS weighted_avg_price
-    FROM portfolio_transaction
-    GROUP BY pt_symbol, pt_name, pt_sector, pt_industry
-    HAVING total_qty > 0;
+    SELECT
+        ppt.ppt_ca_id,
+        ppt.ppt_symbol,
+        pt.pt_name,
+        pt.pt_sector,
+        pt.pt_industry,
+        ppt.ppt_buy_quantity - ppt.ppt_sell_quantity,
+        ROUND(ppt.ppt_buy_cost / NULLIF(ppt.ppt_buy_quantity, 0), 4)
+    FROM portfolio_position_total ppt
+    JOIN (
+        SELECT pt_ca_id, pt_symbol, MAX(pt_id) AS last_pt_id
+        FROM portfolio_transaction
+        GROUP BY pt_ca_id, pt_symbol
+    ) latest ON latest.pt_ca_id = ppt.ppt_ca_id AND latest.pt_symbol = ppt.ppt_symbol
+    JOIN portfolio_transaction pt ON pt.pt_id = latest.last_pt_id
+    WHERE ppt.ppt_buy_quantity - ppt.ppt_sell_quantity > 0;
 END $$
 
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
+
+DELIMITER $$
+
+-- Apply one trade to the running totals and the account's holding for its symbol
+-- only. Quantity and weighted average price match what recalculate_portfolio_items()
+-- would produce, without touching any other holding or rescanning the ledger.
+DROP PROCEDURE IF EXISTS apply_portfolio_transaction $$
+CREATE PROCEDURE apply_portfolio_transaction(
+    IN p_ca_id INT,
+    IN p_symbol VARCHAR(10),
+    IN p_name VARCHAR(50),
+    IN p_sector VARCHAR(50),
+    IN p_industry VARCHAR(50),
+    IN p_type VARCHAR(4),
+    IN p_quantity DECIMAL(18,4),
+    IN p_price DECIMAL(15,2)
+)
+BEGIN
+    DECLARE v_buy_quantity DECIMAL(18,4) DEFAULT 0;
+    DECLARE v_buy_cost DECIMAL(21,6) DEFAULT 0;
+    DECLARE v_sell_quantity DECIMAL(18,4) DEFAULT 0;
+
+    INSERT INTO portfolio_position_total (
+        ppt_ca_id, ppt_symbol, ppt_buy_quantity, ppt_buy_cost, ppt_sell_quantity
+    )
+    VALUES (
+        p_ca_id,
+        p_symbol,
+        IF(p_type = 'BUY', p_quantity, 0),
+        IF(p_type = 'BUY', p_quantity * p_price, 0),
+        IF(p_type = 'SELL', p_quantity, 0)
+    )
+    ON DUPLICATE KEY UPDATE
+        ppt_buy_quantity = ppt_buy_quantity + VALUES(ppt_buy_quantity),
+        ppt_buy_cost = ppt_buy_cost + VALUES(ppt_buy_cost),
+        ppt_sell_quantity = ppt_sell_quantity + VALUES(ppt_sell_quantity);
+
+    SELECT ppt_buy_quantity, ppt_buy_cost, ppt_sell_quantity
+    INTO v_buy_quantity, v_buy_cost, v_sell_quantity
+    FROM portfolio_position_total
+    WHERE ppt_ca_id = p_ca_id AND ppt_symbol = p_symbol;
+
+    IF v_buy_quantity - v_sell_quantity > 0 THEN
+        INSERT INTO portfolio_item (
+            pi_ca_id, pi_symbol, pi_name, pi_sector, pi_industry,
+            pi_total_quantity, pi_weighted_average_price
+        )
+        VALUES (
+            p_ca_id, p_symbol, p_name, p_sector, p_industry,
+            v_buy_quantity - v_sell_quantity,
+            ROUND(v_buy_cost / NULLIF(v_buy_quantity, 0), 4)
+        )
+        ON DUPLICATE KEY UPDATE
+            pi_name = VALUES(pi_name),
+            pi_sector = VALUES(pi_sector),
+            pi_industry = VALUES(pi_industry),
+            pi_total_quantity = VALUES(pi_total_quantity),
+            pi_weighted_average_price = VALUES(pi_weighted_average_price);
+    ELSE
+        DELETE FROM portfolio_item WHERE pi_ca_id = p_ca_id AND pi_symbol = p_symbol;
+    END IF;
+END $$
+
+DELIMITER ;
+
+DELIMITER $$
+
+-- Consistency check: list every account and symbol whose incrementally maintained
+-- holding differs from a full re-aggregation of the ledger. An empty result means
+-- the holdings are consistent; CALL recalculate_portfolio_items() repairs them.
+-- Quantities and averages are DECIMAL, so they are compared exactly.
+DROP PROCEDURE IF EXISTS check_portfolio_items $$
+CREATE PROCEDURE check_portfolio_items()
+BEGIN
+    WITH rebuilt AS (
+        SELECT
+            pt_ca_id AS account_id,
+            pt_symbol AS symbol,
+            SUM(CASE WHEN pt_type='BUY' THEN pt_quantity ELSE -pt_quantity END) AS total_qty,
+            ROUND(
+                SUM(CASE WHEN pt_type='BUY' THEN pt_quantity * pt_price ELSE 0 END) /
+                NULLIF(SUM(CASE WHEN pt_type='BUY' THEN pt_quantity ELSE 0 END), 0),
+                4
+            ) AS weighted_avg_price
+        FROM portfolio_transaction
+        GROUP BY pt_ca_id, pt_symbol
+        HAVING total_qty > 0
+    )
+    SELECT
+        pi.pi_ca_id AS account_id,
+        pi.pi_symbol AS symbol,
+        pi.pi_total_quantity AS incremental_quantity,
+        r.total_qty AS rebuilt_quantity,
+        pi.pi_weighted_average_price AS incremental_average_price,
+        r.weighted_avg_price AS rebuilt_average_price
+    FROM portfolio_item pi
+    LEFT JOIN rebuilt r ON r.account_id = pi.pi_ca_id AND r.symbol = pi.pi_symbol
+    WHERE r.symbol IS NULL
+       OR pi.pi_total_quantity <> r.total_qty
+       OR pi.pi_weighted_average_price <> r.weighted_avg_price
+    UNION ALL
+    SELECT r.account_id, r.symbol, NULL, r.total_qty, NULL, r.weighted_avg_price
+    FROM rebuilt r
+    LEFT JOIN portfolio_item pi ON pi.pi_ca_id = r.account_id AND pi.pi_symbol = r.symbol
+    WHERE pi.pi_symbol IS NULL;
+END $$
+
+DELIMITER ;
@@ -1,4 +1,4 @@
--- Create the database
+-- Create the database (drops any existing one and all its data; see migrate.sql to upgrade)
 DROP DATABASE IF EXISTS portfolio_manager;
 CREATE DATABASE IF NOT EXISTS portfolio_manager;
 USE portfolio_manager;
@@ -7,11 +7,14 @@ USE portfolio_manager;
 -- TABLE DEFINITIONS
 -- ============================
 
+-- Money is stored as DECIMAL (cents, or 4 places for share quantities and average
+-- prices) so balances and totals are exact; money.py holds the matching scales.
+
 -- Table: Cash Accounts
 CREATE TABLE IF NOT EXISTS cash_account (
     ca_id INT AUTO_INCREMENT PRIMARY KEY,
     ca_name VARCHAR(50) NOT NULL,
-    ca_balance FLOAT NOT NULL
+    ca_balance DECIMAL(15,2) NOT NULL
 );
 
 -- Table: Cash Transactions (for deposits/withdrawals)
@@ -19,20 +22,27 @@ CREATE TABLE IF NOT EXISTS cash_transaction (
     ct_id INT AUTO_INCREMENT PRIMARY KEY,
     ct_ca_id INT NOT NULL DEFAULT 1, -- FK to cash_account
     ct_type ENUM('DEPOSIT', 'WITHDRAWAL') NOT NULL,
-    ct_amount FLOAT NOT NULL,
+    ct_amount DECIMAL(15,2) NOT NULL,
     ct_date DATE NOT NULL,
     ct_note VARCHAR(100),
+    -- TRADE rows are the cash legs the portfolio_transaction trigger writes; only MANUAL deposits count as invested
+    ct_source ENUM('MANUAL', 'TRADE') NOT NULL DEFAULT 'MANUAL',
     FOREIGN KEY (ct_ca_id) REFERENCES cash_account(ca_id)
 );
 
--- Table: Portfolio Items (auto-calculated holdings)
+-- Table: Portfolio Items (auto-calculated holdings, one row per account and symbol)
 CREATE TABLE IF NOT EXISTS portfolio_item (
-    pi_symbol VARCHAR(10) PRIMARY KEY,
+    pi_ca_id INT NOT NULL DEFAULT 1, -- FK to cash_account
+    pi_symbol VARCHAR(10) NOT NULL,
     pi_name VARCHAR(50) NOT NULL,
     pi_sector VARCHAR(50),
     pi_industry VARCHAR(50),
-    pi_total_quantity FLOAT NOT NULL,
-    pi_weighted_average_price FLOAT NOT NULL
+    pi_total_quantity DECIMAL(18,4) NOT NULL,
+    pi_weighted_average_price DECIMAL(15,4) NOT NULL,
+    PRIMARY KEY (pi_ca_id, pi_symbol),
+    FOREIGN KEY (pi_ca_id) REFERENCES cash_account(ca_id),
+    -- Book-wide lookups by symbol (prefetcher, NAV quote vector)
+    INDEX idx_pi_symbol (pi_symbol)
 );
 
 -- Table: Portfolio Transactions (user trades)
@@ -42,21 +52,74 @@ CREATE TABLE IF NOT EXISTS portfolio_transaction (
     pt_name VARCHAR(50) NOT NULL,
     pt_sector VARCHAR(50),
     pt_industry VARCHAR(50),
-    pt_quantity FLOAT NOT NULL,
-    pt_price FLOAT NOT NULL,
+    pt_quantity DECIMAL(18,4) NOT NULL,
+    pt_price DECIMAL(15,2) NOT NULL,
     pt_type ENUM('BUY', 'SELL') NOT NULL,
     pt_date DATE NOT NULL,
     pt_ca_id INT NOT NULL DEFAULT 1,
-    FOREIGN KEY (pt_ca_id) REFERENCES cash_account(ca_id)
+    FOREIGN KEY (pt_ca_id) REFERENCES cash_account(ca_id),
+    -- Keyset pagination of /api/transactions, newest first, optionally by symbol or type;
+    -- the pt_ca_id ones serve the usual single-account pages, the others ?account=all
+    INDEX idx_pt_account_date_id (pt_ca_id, pt_date, pt_id),
+    INDEX idx_pt_account_symbol_date_id (pt_ca_id, pt_symbol, pt_date, pt_id),
+    INDEX idx_pt_account_type_date_id (pt_ca_id, pt_type, pt_date, pt_id),
+    INDEX idx_pt_date_id (pt_date, pt_id),
+    INDEX idx_pt_symbol_date_id (pt_symbol, pt_date, pt_id),
+    INDEX idx_pt_type_date_id (pt_type, pt_date, pt_id)
+);
+
+-- Table: Running BUY/SELL totals per account and symbol (lets triggers update holdings in O(1))
+CREATE TABLE IF NOT EXISTS portfolio_position_total (
+    ppt_ca_id INT NOT NULL DEFAULT 1,
+    ppt_symbol VARCHAR(10) NOT NULL,
+    ppt_buy_quantity DECIMAL(18,4) NOT NULL DEFAULT 0,
+    ppt_buy_cost DECIMAL(21,6) NOT NULL DEFAULT 0, -- exact sum of quantity x price
+    ppt_sell_quantity DECIMAL(18,4) NOT NULL DEFAULT 0,
+    PRIMARY KEY (ppt_ca_id, ppt_symbol)
+);
+
+-- Table: Tax Lots (one per BUY; remaining quantity shrinks as sells close it)
+CREATE TABLE IF NOT EXISTS tax_lot (
+    tl_id INT AUTO_INCREMENT PRIMARY KEY,
+    tl_pt_id INT NOT NULL, -- BUY transaction that opened the lot
+    tl_ca_id INT NOT NULL DEFAULT 1, -- account that holds the lot
+    tl_symbol VARCHAR(10) NOT NULL,
+    tl_date DATE NOT NULL,
+    tl_quantity DECIMAL(18,4) NOT NULL,
+    tl_remaining_quantity DECIMAL(18,4) NOT NULL,
+    tl_price DECIMAL(15,2) NOT NULL,
+    INDEX idx_tax_lot_open (tl_ca_id, tl_symbol, tl_remaining_quantity),
+    FOREIGN KEY (tl_pt_id) REFERENCES portfolio_transaction(pt_id)
+);
+
+-- Table: Realized Gains (one row per SELL x lot match)
+CREATE TABLE IF NOT EXISTS realized_gain (
+    rg_id INT AUTO_INCREMENT PRIMARY KEY,
+    rg_pt_id INT NOT NULL, -- SELL transaction
+    rg_tl_id INT NOT NULL,
+    rg_symbol VARCHAR(10) NOT NULL,
+    rg_date DATE NOT NULL,
+    rg_quantity DECIMAL(18,4) NOT NULL,
+    rg_cost_price DECIMAL(15,2) NOT NULL,
+    rg_sale_price DECIMAL(15,2) NOT NULL,
+    rg_gain DECIMAL(15,2) NOT NULL,
+    FOREIGN KEY (rg_pt_id) REFERENCES portfolio_transaction(pt_id),
+    FOREIGN KEY (rg_tl_id) REFERENCES tax_lot(tl_id)
+);
+
+-- Table: Tax Lot Sync (last portfolio_transaction applied to the lots)
+CREATE TABLE IF NOT EXISTS tax_lot_sync (
+    tls_id TINYINT PRIMARY KEY,
+    tls_last_pt_id INT NOT NULL DEFAULT 0
 );
 
 -- Table: Daily Portfolio Snapshots
 CREATE TABLE IF NOT EXISTS portfolio_snapshot (
     ps_id INT AUTO_INCREMENT PRIMARY KEY,
     ps_date DATE NOT NULL UNIQUE,
-    ps_total_cash FLOAT NOT NULL,
-    ps_total_equity FLOAT NOT NULL,
-    ps_total_value FLOAT NOT NULL
+    ps_total_cash DECIMAL(15,2) NOT NULL,
+    ps_total_equity DECIMAL(15,2) NOT NULL,
+    ps_total_value DECIMAL(15,2) NOT NULL
 );
 
 -- Table: Watchlist (user maintained)
@@ -65,4 +128,23 @@ CREATE TABLE IF NOT EXISTS watchlist_item (
     wi_symbol VARCHAR(10) NOT NULL UNIQUE,
     wi_sector VARCHAR(50),
     wi_added_date DATE NOT NULL
-);
\ No newline at end of file
+);
+
+-- Table: Daily Price History (local OHLCV store, closed trading days only)
+CREATE TABLE IF NOT EXISTS price_history (
+    ph_symbol VARCHAR(10) NOT NULL,
+    ph_date DATE NOT NULL,
+    ph_open DOUBLE NOT NULL,
+    ph_high DOUBLE NOT NULL,
+    ph_low DOUBLE NOT NULL,
+    ph_close DOUBLE NOT NULL,
+    ph_volume BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (ph_symbol, ph_date)
+);
+
+-- Table: Price History Sync Ranges (date range [phs_start, phs_end) already downloaded per symbol)
+CREATE TABLE IF NOT EXISTS price_history_sync (
+    phs_symbol VARCHAR(10) PRIMARY KEY,
+    phs_start DATE NOT NULL,
+    phs_end DATE NOT NULL
+);
@@ -27,17 +27,18 @@ FOR EACH ROW
 BEGIN
     -- Overdraft Protection for BUY
     IF NEW.pt_type = 'BUY' THEN
-        IF (SELECT ca_balance FROM cash_account WHERE ca_id = NEW.pt_ca_id) < (NEW.pt_quantity * NEW.pt_price) THEN
+        IF (SELECT ca_balance FROM cash_account WHERE ca_id = NEW.pt_ca_id) < ROUND(NEW.pt_quantity * NEW.pt_price, 2) THEN
             SIGNAL SQLSTATE '45000'
                 SET MESSAGE_TEXT = 'Insufficient funds: Cannot complete BUY transaction.';
         END IF;
     END IF;
 
-    -- Over-Sell Protection for SELL
+    -- Over-Sell Protection for SELL (primary-key lookup on the account's maintained
+    -- holding instead of summing the symbol's whole ledger)
     IF NEW.pt_type = 'SELL' THEN
-        IF (SELECT COALESCE(SUM(pt_quantity * IF(pt_type='BUY',1,-1)),0) 
-            FROM portfolio_transaction 
-            WHERE pt_symbol = NEW.pt_symbol) < NEW.pt_quantity THEN
+        IF COALESCE((SELECT pi_total_quantity
+                     FROM portfolio_item
+                     WHERE pi_ca_id = NEW.pt_ca_id AND pi_symbol = NEW.pt_symbol), 0) < NEW.pt_quantity THEN
             SIGNAL SQLSTATE '45000'
                 SET MESSAGE_TEXT = 'Insufficient shares: Cannot complete SELL transaction.';
         END IF;
@@ -51,19 +52,23 @@ FOR EACH ROW
 BEGIN
     IF NEW.pt_type = 'BUY' THEN
         -- Create a withdrawal in cash_transaction for the purchase
-        INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note)
-        VALUES (NEW.pt_ca_id, 'WITHDRAWAL', (NEW.pt_quantity * NEW.pt_price), NEW.pt_date,
-                CONCAT('Purchase of ', NEW.pt_quantity, ' shares of ', NEW.pt_symbol));
+        INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note, ct_source)
+        VALUES (NEW.pt_ca_id, 'WITHDRAWAL', ROUND(NEW.pt_quantity * NEW.pt_price, 2), NEW.pt_date,
+                CONCAT('Purchase of ', NEW.pt_quantity, ' shares of ', NEW.pt_symbol), 'TRADE');
     ELSEIF NEW.pt_type = 'SELL' THEN
         -- Create a deposit in cash_transaction for the sale
-        INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note)
-        VALUES (NEW.pt_ca_id, 'DEPOSIT', (NEW.pt_quantity * NEW.pt_price), NEW.pt_date,
-                CONCAT('Sale of ', NEW.pt_quantity, ' shares of ', NEW.pt_symbol));
+        INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note, ct_source)
+        VALUES (NEW.pt_ca_id, 'DEPOSIT', ROUND(NEW.pt_quantity * NEW.pt_price, 2), NEW.pt_date,
+                CONCAT('Sale of ', NEW.pt_quantity, ' shares of ', NEW.pt_symbol), 'TRADE');
     END IF;
 
-    -- Auto-recalculate holdings & snapshot after each trade
-    CALL recalculate_portfolio_items();
-    CALL recalculate_portfolio_snapshot();
+    -- Update the account's holding for this symbol only, then the snapshot. Batch
+    -- trades set @pm_batch_trade and recalculate the snapshot once after the last leg.
+    CALL apply_portfolio_transaction(NEW.pt_ca_id, NEW.pt_symbol, NEW.pt_name, NEW.pt_sector, NEW.pt_industry,
+                                     NEW.pt_type, NEW.pt_quantity, NEW.pt_price);
+    IF @pm_batch_trade IS NULL THEN
+        CALL recalculate_portfolio_snapshot();
+    END IF;
 END $$
 
 DELIMITER ;
\ No newline at end of file
@@ -0,0 +1,302 @@
+import os
+import queue
+import threading
+import time
+
+import mysql.connector
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD"),
+    "database": os.getenv("DB_NAME", "portfolio_manager"),
+}
+
+# Size the pool to at least the number of threads per worker process
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# Seconds a caller waits for a free connection before giving up
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Idle connections older than this are pinged before being handed out
+HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection becomes free within the pool timeout."""
+
+
+class TimedCursor:
+    """Cursor proxy that reports the count and duration of every statement to metrics."""
+
+    __slots__ = ("_cursor", )
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+        return False
+
+    def _timed(self, statement, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.record_query(statement, time.perf_counter() - started)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(operation, self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(operation, self._cursor.executemany, operation, *args, **kwargs)
+
+    def callproc(self, procname, *args, **kwargs):
+        return self._timed("CALL", self._cursor.callproc, procname, *args, **kwargs)
+
+
+class PooledConnection:
+    """Wrap a raw MySQL connection so that close() returns it to the pool.
+
+    Borrowed wrappers (owned=False) are handed out inside a unit of work;
+    their close() is a no-op because the unit of work releases the
+    connection when it ends.
+    """
+
+    def __init__(self, pool, raw, owned=True):
+        self._pool = pool
+        self._raw = raw
+        self._owned = owned
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection already returned to the pool")
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection already returned to the pool")
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def borrow(self):
+        """Return a non-owning wrapper around the same connection."""
+        return PooledConnection(self._pool, self._raw, owned=False)
+
+    def close(self):
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        if self._owned:
+            self._pool.release(raw)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQL connections with health checks."""
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, config=None, connect=None):
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.config = config or DB_CONFIG
+        # Factory for new raw connections; the offline benchmarks pass an embedded database here
+        self.connect = connect or (lambda: mysql.connector.connect(**self.config))
+
+        # Idle connections are stored as (raw_connection, released_at) pairs
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._health_checks = 0
+        self._health_check_failures = 0
+
+    def _is_healthy(self, raw, released_at):
+        """Ping connections that sat idle longer than the health check interval."""
+        if time.monotonic() - released_at < self.health_check_interval:
+            return True
+        with self._lock:
+            self._health_checks += 1
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception as e:
+            print(f"Discarding unhealthy pooled connection: {e}")
+            with self._lock:
+                self._health_check_failures += 1
+            try:
+                raw.close()
+            except Exception:
+                pass
+            return False
+
+    def acquire(self):
+        """Check out a connection, waiting up to the pool timeout if all are busy."""
+        start = time.monotonic()
+        waited = False
+        raw = None
+
+        while raw is None:
+            try:
+                raw, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        raw = self.connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    break
+
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                try:
+                    if remaining <= 0:
+                        raise queue.Empty
+                    raw, released_at = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolExhaustedError(
+                        f"No database connection available after {self.timeout}s "
+                        f"(pool size {self.size})"
+                    )
+
+            if not self._is_healthy(raw, released_at):
+                with self._lock:
+                    self._created -= 1
+                raw = None
+
+        wait = time.monotonic() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        """Return a connection to the pool, discarding any uncommitted work."""
+        with self._lock:
+            self._in_use -= 1
+        try:
+            # Ending the transaction also drops the read snapshot, so the next
+            # request never sees data that is older than its own start time.
+            if raw.in_transaction:
+                raw.rollback()
+            self._idle.put((raw, time.monotonic()))
+        except Exception as e:
+            print(f"Dropping pooled connection on release: {e}")
+            with self._lock:
+                self._created -= 1
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """Return pool sizing and wait-time statistics."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "timeout": self.timeout,
+                "healthCheckInterval": self.health_check_interval,
+                "created": self._created,
+                "inUse": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "avgWaitMs": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0,
+                "maxWaitMs": round(self._wait_max * 1000, 3),
+                "healthChecks": self._health_checks,
+                "healthCheckFailures": self._health_check_failures,
+            }
+
+
+pool = ConnectionPool()
+
+# Per-thread unit of work state; each Flask request runs on its own thread
+_scope = threading.local()
+
+
+def begin_unit_of_work():
+    """Start sharing a single connection across every get_connection() call.
+
+    The connection is only checked out the first time it is needed, so
+    requests that never touch the database never hold one.
+    """
+    _scope.active = True
+    _scope.conn = None
+
+
+def end_unit_of_work():
+    """Release the connection shared by the current unit of work, if any."""
+    conn = getattr(_scope, "conn", None)
+    _scope.active = False
+    _scope.conn = None
+    if conn is not None:
+        conn.close()
+
+
+def release_shared_connection():
+    """Hand the unit of work's connection back to the pool before slow non-DB work.
+
+    Only call it between transactions, with no cursor or borrowed wrapper
+    still in use; the next get_connection() of the unit of work checks out
+    a connection again.
+    """
+    conn = getattr(_scope, "conn", None)
+    _scope.conn = None
+    if conn is not None:
+        conn.close()
+
+
+class unit_of_work:
+    """Context manager form of begin/end_unit_of_work for non-request code."""
+
+    def __enter__(self):
+        self._nested = getattr(_scope, "active", False)
+        if not self._nested:
+            begin_unit_of_work()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._nested:
+            end_unit_of_work()
+        return False
+
+
+def get_connection():
+    """Return a pooled connection, shared with the rest of the unit of work if one is open."""
+    if not getattr(_scope, "active", False):
+        return pool.acquire()
+
+    if _scope.conn is None:
+        _scope.conn = pool.acquire()
+    return _scope.conn.borrow()
@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+
+from flask import Response
+
+import db_pool
+
+# Streaming export formats and their content types
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Rows read from the server per round trip
+FETCH_SIZE = 1000
+# Rows serialized per chunk written to the client (the first chunk goes out right away)
+FLUSH_ROWS = 500
+
+
+def stream_query(sql, params, format_row):
+    """Yield formatted rows from an unbuffered server-side cursor.
+
+    The generator checks out its own pooled connection, because the
+    response body is produced after the request's unit of work has ended
+    and an unbuffered cursor ties up its connection until it is drained.
+    Only FETCH_SIZE rows are in memory at any time.
+    """
+    conn = db_pool.pool.acquire()
+    try:
+        # Unbuffered (the mysql-connector default): rows stay on the server until fetched
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield format_row(row)
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def fetch_page(sql, params):
+    """Read one small page (e.g. a keyset page) with its own pooled connection.
+
+    The connection goes back to the pool before the rows are returned, so
+    callers can make network calls per page without holding a cursor open.
+    """
+    conn = db_pool.pool.acquire()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
+
+
+def _ndjson_chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(row, default=str))
+        chunk.append("\n")
+        if len(chunk) >= FLUSH_ROWS * 2 or len(chunk) == 2:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def _csv_chunks(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+
+    # The header goes out before the first row is even read
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def stream_response(rows, fields, fmt, filename):
+    """Wrap a row generator in a streaming NDJSON or CSV response."""
+    if fmt == "csv":
+        body = _csv_chunks(rows, fields)
+    else:
+        body = _ndjson_chunks(rows)
+
+    response = Response(body, mimetype=STREAM_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    # Ask reverse proxies (nginx) not to buffer the body
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,20 @@
+"""gunicorn settings: threaded (gthread) workers sized for open SSE streams.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each open /api/stream/portfolio response keeps one worker thread parked on
+its queue, so GUNICORN_THREADS bounds the streams plus in-flight requests
+per worker. Threads rather than gevent greenlets, because yfinance's
+curl_cffi transport and the mysql-connector C extension block a gevent hub:
+one Yahoo or DB call would freeze every stream on the worker, and the quote
+fan-out pool could no longer time out a slow call.
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "gthread"
+# Concurrent requests (open streams included) per worker; an idle stream is a parked thread
+threads = int(os.getenv("GUNICORN_THREADS", "128"))
+# SSE responses stay open indefinitely; keep-alive comments flow every LIVE_HEARTBEAT_INTERVAL
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
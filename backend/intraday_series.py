@@ -0,0 +1,79 @@
+import numpy as np
+
+# Downsampling methods accepted by /api/market_performance?downsample=
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+# Smallest points= a client may ask for (first, last and one point in between)
+MIN_POINTS = 3
+
+
+def lttb_indices(values, points):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the previously kept point and
+    the average of the next bucket, which preserves peaks and troughs. The
+    x axis is the bar position, since intraday bars are evenly spaced.
+    """
+    n = len(values)
+    if points >= n or points < MIN_POINTS:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    positions = np.arange(n, dtype=float)
+    kept = np.empty(points, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = positions[end:next_end].mean()
+        next_y = values[end:next_end].mean()
+
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs((positions[previous] - next_x) * (values[start:end] - values[previous])
+                      - (positions[previous] - positions[start:end]) * (next_y - values[previous]))
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+
+    return kept
+
+
+def minmax_indices(values, points):
+    """Indices of the minimum and maximum of each of points // 2 equal buckets, plus the endpoints."""
+    n = len(values)
+    if points >= n or points < MIN_POINTS:
+        return np.arange(n)
+
+    size = -(-(n - 2) // max(1, (points - 2) // 2))
+    buckets = -(-(n - 2) // size)
+    # Pad the interior to a (buckets x size) grid; every row keeps at least one real bar
+    grid = np.full(buckets * size, np.nan)
+    grid[:n - 2] = values[1:n - 1]
+    grid = grid.reshape(buckets, size)
+    offsets = np.arange(buckets) * size + 1
+
+    kept = np.concatenate(([0], offsets + np.nanargmin(grid, axis=1),
+                           offsets + np.nanargmax(grid, axis=1), [n - 1]))
+    return np.unique(kept)
+
+
+def series_points(bars, points=None, method="lttb"):
+    """Convert intraday bars to [{"time": "HH:MM", "value": close}] for charting.
+
+    Times and rounded closes are computed over whole columns; with points
+    set, the series is first downsampled to about that many points.
+    """
+    closes = bars["Close"].dropna()
+    values = closes.to_numpy(dtype=float)
+
+    if points:
+        select = lttb_indices if method == "lttb" else minmax_indices
+        index = select(values, points)
+        closes = closes.iloc[index]
+        values = values[index]
+
+    times = closes.index.strftime('%H:%M').tolist()
+    rounded = np.round(values, 2).tolist()
+    return [{"time": time, "value": value} for time, value in zip(times, rounded)]
@@ -0,0 +1,253 @@
+import json
+import os
+import queue
+import threading
+from datetime import date
+
+import crud
+import market_cache
+import valuation
+from market_symbols import MARKET_INDICES, SECTOR_ETFS, ECONOMIC_INDICATORS
+
+# Seconds between checks of the portfolio version
+UPDATE_INTERVAL = float(os.getenv("LIVE_UPDATE_INTERVAL", "1"))
+# Seconds of silence after which a subscriber gets a keep-alive comment
+HEARTBEAT_INTERVAL = float(os.getenv("LIVE_HEARTBEAT_INTERVAL", "15"))
+# Messages buffered per subscriber before it is resynced with a full snapshot
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("LIVE_SUBSCRIBER_QUEUE_SIZE", "32"))
+
+# Portfolio lists sent as objects keyed by this field, so deltas carry only changed entries
+KEYED_LISTS = {
+    "assets": "symbol",
+    "history": "date",
+    "sectorAllocation": "name",
+    "monthlyReturns": "month",
+}
+
+
+def _market_symbols():
+    return ([symbol for _, symbol in MARKET_INDICES.values()]
+            + list(SECTOR_ETFS.values()) + list(ECONOMIC_INDICATORS.values()))
+
+
+def _keyed(portfolio):
+    """The portfolio with its lists turned into {id: entry} dicts that keep the list order."""
+    state = dict(portfolio)
+    for field, key in KEYED_LISTS.items():
+        if isinstance(state.get(field), list):
+            state[field] = {str(entry[key]): entry for entry in state[field]}
+    return state
+
+
+def _unkeyed(state):
+    """Inverse of _keyed(): the shape /api/portfolio returns."""
+    portfolio = dict(state)
+    for field in KEYED_LISTS:
+        if isinstance(portfolio.get(field), dict):
+            portfolio[field] = list(portfolio[field].values())
+    return portfolio
+
+
+def diff(old, new):
+    """Fields of new that differ from old; removed keys map to None.
+
+    Nested dicts are diffed recursively; clients merge them into their copy,
+    appending new entries of keyed lists. A keyed list whose order changed
+    otherwise is sent whole, as a list, which clients use as a replacement.
+    """
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            kept_order = [k for k in previous if k in value] + [k for k in value if k not in previous]
+            if key in KEYED_LISTS and list(value) != kept_order:
+                delta[key] = list(value.values())
+                continue
+            nested = diff(previous, value)
+            if nested:
+                delta[key] = nested
+        elif value != previous or key not in old:
+            delta[key] = value
+    for key in old:
+        if key not in new:
+            delta[key] = None
+    return delta
+
+
+class _Subscriber:
+    __slots__ = ("messages", )
+
+    def __init__(self):
+        self.messages = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+
+def _current_version():
+    return (valuation.version(), date.today())
+
+
+class LivePublisher:
+    """One background thread that turns portfolio and quote changes into SSE messages.
+
+    The thread recomputes the state only when the portfolio version changes,
+    diffs it once against the previous state, and puts the same encoded
+    delta on every subscriber's queue. Subscribers never compute anything;
+    their response generators just block on their own queue, i.e. one idle
+    thread per client under the gthread workers of gunicorn.conf.py.
+
+    The state is always computed outside the lock, so a slow quote fetch
+    never stalls unsubscribe() or status(); only swapping it in is locked.
+    """
+
+    def __init__(self, interval=UPDATE_INTERVAL):
+        self.interval = interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        self._state = None
+        self._version = None
+        self.sequence = 0
+        self.published = 0
+        self.resyncs = 0
+        self.last_error = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="live-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+
+    def _compute_state(self):
+        portfolio = _keyed(crud.get_portfolio("pi_id"))
+        symbols = _market_symbols() + list(portfolio.get("assets", {}))
+        quotes = {}
+        for symbol in symbols:
+            # Only what the prefetcher and requests already fetched; the publisher never calls Yahoo
+            quote = market_cache.quotes.peek(symbol)
+            if quote is not None:
+                quotes[symbol] = quote.to_dict()
+        return {"portfolio": portfolio, "quotes": quotes}
+
+    def _encode(self, event, payload):
+        self.sequence += 1
+        return f"id: {self.sequence}\nevent: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+    def _snapshot_message(self):
+        state = self._state
+        return self._encode("snapshot", {
+            "portfolio": _unkeyed(state["portfolio"]),
+            "quotes": state["quotes"],
+        })
+
+    def _is_current(self, version):
+        return self._state is not None and self._version == version
+
+    def _refresh(self, version):
+        """Compute the state for version (read before computing) and swap it in.
+
+        A trade or quote change committed while computing moves the version
+        on, so the next check recomputes instead of pinning the older state.
+        """
+        state = self._compute_state()
+        with self._lock:
+            # Both parts of the version only grow; keep a newer state a concurrent refresh stored
+            if self._version is not None and self._version > version:
+                return
+            previous = self._state
+            self._state = state
+            self._version = version
+            if previous is None:
+                return
+            delta = diff(previous, state)
+            if not delta or not self._subscribers:
+                return
+            message = self._encode("delta", delta)
+            for subscriber in list(self._subscribers):
+                self._deliver(subscriber, message)
+            self.published += 1
+
+    def publish_once(self):
+        """Recompute and fan out a delta if the portfolio version moved since the last check."""
+        version = _current_version()
+        with self._lock:
+            if not self._subscribers or self._is_current(version):
+                return
+        self._refresh(version)
+
+    def _deliver(self, subscriber, message):
+        try:
+            subscriber.messages.put_nowait(message)
+        except queue.Full:
+            # A slow client skips the backlog and starts over from a full snapshot
+            self.resyncs += 1
+            while True:
+                try:
+                    subscriber.messages.get_nowait()
+                except queue.Empty:
+                    break
+            subscriber.messages.put_nowait(self._snapshot_message())
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.publish_once()
+                self.last_error = None
+            except Exception as e:
+                print(f"Live update publish failed: {e}")
+                self.last_error = str(e)
+            self._stop.wait(self.interval)
+
+    def subscribe(self):
+        """Register a subscriber and return its queue, primed with a full snapshot."""
+        self.start()
+        subscriber = _Subscriber()
+        # The state goes stale while nobody is subscribed
+        version = _current_version()
+        with self._lock:
+            current = self._is_current(version)
+        if not current:
+            self._refresh(version)
+        with self._lock:
+            subscriber.messages.put_nowait(self._snapshot_message())
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self):
+        """SSE body for one client: a snapshot, then deltas, with keep-alive comments."""
+        subscriber = self.subscribe()
+        try:
+            yield f"retry: {int(self.interval * 1000) * 3}\n\n"
+            while True:
+                try:
+                    yield subscriber.messages.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            # Runs when the client disconnects and the server closes the generator
+            self.unsubscribe(subscriber)
+
+    def status(self):
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "intervalSeconds": self.interval,
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "resyncs": self.resyncs,
+                "lastEventId": self.sequence,
+                "lastError": self.last_error,
+            }
+
+
+publisher = LivePublisher()
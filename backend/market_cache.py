@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def _changed(old, new):
+    if old is new:
+        return False
+    try:
+        return bool(old != new)
+    except (TypeError, ValueError):
+        # e.g. DataFrames, whose comparison has no single truth value
+        return True
+
+
+class TTLCache:
+    """Thread-safe in-process cache with a per-entry TTL and LRU eviction.
+
+    A ttl of None means entries never expire and only leave the cache when
+    it is full and they are the least recently used.
+    """
+
+    def __init__(self, name, ttl, max_size):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # key -> (value, expires_at); ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        # Bumped whenever a stored value changes, so callers can version derived data
+        self.generation = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key, default=None):
+        """Return an unexpired value without counting a hit or miss or touching LRU order."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING or (entry[1] is not None and entry[1] <= time.monotonic()):
+            return default
+        return entry[0]
+
+    def get_many(self, keys):
+        """Return ({key: value} for cached keys, [keys that missed])."""
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        return found, missing
+
+    def set(self, key, value, ttl=_MISSING):
+        """Store a value; ttl overrides the cache default for this entry."""
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            previous = self._entries.get(key, _MISSING)
+            if previous is _MISSING or _changed(previous[0], value):
+                self.generation += 1
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader, ttl=_MISSING):
+        """Return the cached value, calling loader() and caching it on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "ttl": self.ttl,
+                "maxSize": self.max_size,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "generation": self.generation,
+            }
+
+
+# Real-time quotes go stale within seconds
+quotes = TTLCache(
+    "quotes",
+    ttl=float(os.getenv("MARKET_CACHE_QUOTE_TTL", "15")),
+    max_size=int(os.getenv("MARKET_CACHE_QUOTE_SIZE", "5000")),
+)
+
+# Company name, sector and industry rarely change
+metadata = TTLCache(
+    "metadata",
+    ttl=float(os.getenv("MARKET_CACHE_METADATA_TTL", str(3 * 24 * 3600))),
+    max_size=int(os.getenv("MARKET_CACHE_METADATA_SIZE", "5000")),
+)
+
+# Bars for closed trading days never change, so they never expire
+history = TTLCache(
+    "history",
+    ttl=None,
+    max_size=int(os.getenv("MARKET_CACHE_HISTORY_SIZE", "500")),
+)
+
+# Serialized endpoint bodies, keyed by request and the version of the data behind them
+responses = TTLCache(
+    "responses",
+    ttl=float(os.getenv("MARKET_CACHE_RESPONSE_TTL", os.getenv("MARKET_CACHE_QUOTE_TTL", "15"))),
+    max_size=int(os.getenv("MARKET_CACHE_RESPONSE_SIZE", "64")),
+)
+
+TIERS = (quotes, metadata, history, responses)
+
+
+def stats():
+    """Hit/miss, eviction and expiration counters for every cache tier."""
+    return {tier.name: tier.stats() for tier in TIERS}
@@ -0,0 +1,36 @@
+"""Fixed symbol lists served by the market endpoints and kept warm by the prefetcher."""
+
+# Display key -> (full name, symbol)
+MARKET_INDICES = {
+    "S&P 500": ("S&P 500", "^GSPC"),
+    "Dow Jones": ("Dow Jones Industrial Average", "^DJI"),
+    "NASDAQ": ("NASDAQ Composite", "^IXIC"),
+    "Russell 2000": ("Russell 2000", "^RUT")
+}
+
+# Major sector ETFs
+SECTOR_ETFS = {
+    "Technology": "XLK",      # Technology Select Sector SPDR
+    "Healthcare": "XLV",      # Health Care Select Sector SPDR
+    "Financial": "XLF",       # Financial Select Sector SPDR
+    "Energy": "XLE",          # Energy Select Sector SPDR
+    "Consumer Discretionary": "XLY",  # Consumer Discretionary Select Sector SPDR
+    "Consumer Staples": "XLP", # Consumer Staples Select Sector SPDR
+    "Industrials": "XLI",     # Industrial Select Sector SPDR
+    "Materials": "XLB",       # Materials Select Sector SPDR
+    "Real Estate": "XLRE",    # Real Estate Select Sector SPDR
+    "Utilities": "XLU",       # Utilities Select Sector SPDR
+    "Communication Services": "XLC"  # Communication Services Select Sector SPDR
+}
+
+ECONOMIC_INDICATORS = {
+    "10-Year Treasury": "^TNX",
+    "30-Year Treasury": "^TYX",
+    "Dollar Index": "DXY",
+    "Gold": "GC=F",
+    "Oil (WTI)": "CL=F",
+    "Natural Gas": "NG=F"
+}
+
+# Alternative Dollar Index symbols, tried in order when DXY has no data
+DOLLAR_INDEX_ALTERNATIVES = ["^DXY", "DX-Y.NYB", "UUP"]
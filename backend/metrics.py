@@ -0,0 +1,259 @@
+"""Request, database and Yahoo Finance metrics in the Prometheus text format.
+
+Recording costs a dict lookup and a few additions under one lock, so it is
+safe on every request, query and upstream call. Counters other modules
+already keep (cache, pool, single-flight) are only read when /metrics is scraped.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond cache hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labels, label_values)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for label_values, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"), ), counts):
+                cumulative += bucket_count
+                labels = _label_text(self.labels, label_values, (("le", _number(float(bound))), ))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _label_text(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_number(round(total, 6))}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        # Callables returning (name, kind, help, [(labels dict, value)]) read at scrape time
+        self._collectors = []
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"Metrics collector {collect.__name__} failed: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    label_text = _label_text(labels.keys(), labels.values())
+                    lines.append(f"{name}{label_text} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "portfolio_http_request_duration_seconds",
+    "Time spent in a Flask view, by route template, method and status.",
+    ("route", "method", "status"))
+
+db_queries = registry.counter(
+    "portfolio_db_queries_total",
+    "SQL statements executed, by route ('none' outside a request).",
+    ("route", ))
+db_query_duration = registry.histogram(
+    "portfolio_db_query_duration_seconds",
+    "Duration of single SQL statements, by statement type.",
+    ("statement", ))
+db_queries_per_request = registry.histogram(
+    "portfolio_db_queries_per_request",
+    "SQL statements executed while serving one request.",
+    ("route", ), buckets=COUNT_BUCKETS)
+db_time_per_request = registry.histogram(
+    "portfolio_db_time_per_request_seconds",
+    "Total SQL time while serving one request.",
+    ("route", ))
+
+yahoo_requests = registry.counter(
+    "portfolio_yahoo_requests_total",
+    "Calls to Yahoo Finance, by call type and symbol class.",
+    ("call", "symbol_class"))
+yahoo_errors = registry.counter(
+    "portfolio_yahoo_errors_total",
+    "Yahoo Finance calls that raised, and symbols a batch returned no data for, by call type and symbol class.",
+    ("call", "symbol_class"))
+yahoo_duration = registry.histogram(
+    "portfolio_yahoo_request_duration_seconds",
+    "Latency of Yahoo Finance calls, by call type and symbol class.",
+    ("call", "symbol_class"))
+
+
+def symbol_class(symbol):
+    """Coarse class of a Yahoo symbol: index, future, fx, etf or equity."""
+    # Imported here so metrics stays importable from every module without cycles
+    from market_symbols import SECTOR_ETFS, DOLLAR_INDEX_ALTERNATIVES
+
+    symbol = symbol.upper()
+    if symbol.startswith("^") or symbol in ("DXY", "DX-Y.NYB"):
+        return "index"
+    if symbol.endswith("=F"):
+        return "future"
+    if symbol.endswith("=X"):
+        return "fx"
+    if symbol in SECTOR_ETFS.values() or symbol in DOLLAR_INDEX_ALTERNATIVES:
+        return "etf"
+    return "equity"
+
+
+@contextmanager
+def yahoo_call(call, symbols):
+    """Count and time one upstream call; a batch spanning several classes is labelled 'mixed'."""
+    if isinstance(symbols, str):
+        symbols = [symbols]
+    classes = {symbol_class(symbol) for symbol in symbols}
+    label = classes.pop() if len(classes) == 1 else "mixed"
+
+    yahoo_requests.inc(call, label)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        yahoo_errors.inc(call, label)
+        raise
+    finally:
+        yahoo_duration.observe(time.perf_counter() - started, call, label)
+
+
+def yahoo_symbol_errors(call, symbols):
+    """Count symbols a call returned nothing for, by their own class.
+
+    yf.download doesn't raise for failed tickers; it logs them and leaves
+    their columns empty, so yahoo_call() alone never sees those errors.
+    """
+    for symbol in symbols:
+        yahoo_errors.inc(call, symbol_class(symbol))
+
+
+# Per-thread DB accounting for the request being served
+_request = threading.local()
+
+
+def begin_request(route):
+    _request.route = route
+    _request.queries = 0
+    _request.db_time = 0.0
+
+
+def end_request(route, method, status, duration):
+    http_request_duration.observe(duration, route, method, str(status))
+    db_queries_per_request.observe(getattr(_request, "queries", 0), route)
+    db_time_per_request.observe(getattr(_request, "db_time", 0.0), route)
+    _request.route = None
+
+
+def record_query(sql, duration):
+    route = getattr(_request, "route", None) or "none"
+    statement = sql.lstrip().split(None, 1)[0].upper() if sql and sql.strip() else "UNKNOWN"
+    db_queries.inc(route)
+    db_query_duration.observe(duration, statement)
+    if route != "none":
+        _request.queries += 1
+        _request.db_time += duration
+
+
+def render():
+    return registry.render()
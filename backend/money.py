@@ -0,0 +1,68 @@
+"""Fixed-point money and share quantities.
+
+Amounts are held as whole numbers of a minor unit that matches the DECIMAL
+columns in db/schema.sql: cents for cash, trade prices and P&L, and
+ten-thousandths for share quantities and per-share averages and quotes.
+Python ints and int64 NumPy arrays of these units add up exactly, and
+floats only appear where a value leaves the app as JSON.
+
+int64 holds about 9.2e18 units, so a single quantity x price product stays
+exact up to roughly $92 billion per position.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+# DECIMAL(15,2): balances, cash amounts, trade prices, gains
+CENTS = 100
+# DECIMAL(15,4): weighted average prices and live quotes
+PRICE_UNITS = 10_000
+# DECIMAL(18,4): share quantities
+SHARE_UNITS = 10_000
+
+
+def to_units(value, scale):
+    """value (int, float, str or Decimal) as a whole number of 1/scale units.
+
+    Rounds half away from zero (Decimal's ROUND_HALF_UP), so -0.125 is -13 cents.
+    """
+    return int((Decimal(str(value)) * scale).to_integral_value(ROUND_HALF_UP))
+
+
+def to_cents(value):
+    return to_units(value, CENTS)
+
+
+def to_decimal(units, scale):
+    """Exact Decimal for a value held in 1/scale units, for DECIMAL query parameters."""
+    return Decimal(units) / scale
+
+
+def dollars(cents):
+    """Cents (int or int64 array) as dollars for JSON responses."""
+    return cents / CENTS
+
+
+def rescale(units, divisor):
+    """Integer units (int or int64 array) divided by divisor, rounded half up (toward +inf)."""
+    return (units + divisor // 2) // divisor
+
+
+def value_cents(shares, price, price_scale=PRICE_UNITS):
+    """Cents worth of shares (share units) at price (1/price_scale units), rounded half up.
+
+    Works element-wise on int64 arrays as well as on Python ints.
+    """
+    return rescale(shares * price, SHARE_UNITS * price_scale // CENTS)
+
+
+def units_array(values, scale):
+    """Float values (e.g. quotes) as an int64 array of 1/scale units, rounded half up; NaN becomes 0."""
+    values = np.nan_to_num(np.asarray(values, dtype=float))
+    return np.floor(values * scale + 0.5).astype(np.int64)
+
+
+def column(expression, scale):
+    """SQL reading a DECIMAL expression as a BIGINT count of 1/scale units,
+    so rows arrive as Python ints instead of Decimals or floats."""
+    return f"CAST(ROUND(({expression}) * {scale}) AS SIGNED)"
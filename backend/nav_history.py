@@ -0,0 +1,147 @@
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import money
+import price_history
+from db_pool import get_connection
+
+# Last computed history, reused until the ledger changes or the day rolls over
+_memo = {"key": None, "history": None}
+_memo_lock = threading.Lock()
+
+
+def ledger_version(cursor):
+    """Cheap fingerprint of the trade and cash ledgers; changes with every insert."""
+    cursor.execute("""
+        SELECT
+            (SELECT IFNULL(MAX(pt_id), 0) FROM portfolio_transaction) AS max_pt,
+            (SELECT COUNT(*) FROM portfolio_transaction) AS pt_count,
+            (SELECT IFNULL(MAX(ct_id), 0) FROM cash_transaction) AS max_ct,
+            (SELECT COUNT(*) FROM cash_transaction) AS ct_count
+    """)
+    row = cursor.fetchone()
+    return (row["max_pt"], row["pt_count"], row["max_ct"], row["ct_count"])
+
+
+def _load_ledgers(cursor, account):
+    """The account's signed trade quantities (share units) and cash amounts (cents)."""
+    cursor.execute(f"""
+        SELECT pt_symbol AS symbol, pt_date AS date,
+               {money.column("CASE WHEN pt_type = 'BUY' THEN pt_quantity ELSE -pt_quantity END", money.SHARE_UNITS)}
+                   AS quantity
+        FROM portfolio_transaction
+        WHERE pt_ca_id = %s
+    """, (account, ))
+    trades = pd.DataFrame(cursor.fetchall(), columns=["symbol", "date", "quantity"])
+
+    cursor.execute(f"""
+        SELECT ct_date AS date,
+               {money.column("CASE WHEN ct_type = 'DEPOSIT' THEN ct_amount ELSE -ct_amount END", money.CENTS)}
+                   AS amount
+        FROM cash_transaction
+        WHERE ct_ca_id = %s
+    """, (account, ))
+    cash = pd.DataFrame(cursor.fetchall(), columns=["date", "amount"])
+    return trades, cash
+
+
+def _price_matrix(symbols, dates):
+    """Closing prices as a (dates x symbols) array, carried forward over non-trading days."""
+    index = pd.DatetimeIndex(dates)
+    prices = np.zeros((len(dates), len(symbols)))
+
+    for j, symbol in enumerate(symbols):
+        try:
+            closes = price_history.get_history(symbol, dates[0], dates[-1] + timedelta(days=1))["Close"]
+        except Exception as e:
+            print(f"No price history for {symbol}: {e}")
+            continue
+        if closes.empty:
+            continue
+        # Before the first stored bar, value the position at the first known close
+        prices[:, j] = closes.reindex(index, method="ffill").bfill().to_numpy()
+
+    return prices
+
+
+def compute_nav_history(trades, cash, end):
+    """Replay the ledgers into daily net asset values from the first ledger date to end (inclusive).
+
+    Positions and cash are built with one scatter-add per ledger into
+    (dates x symbols) and (dates,) arrays, then cumulatively summed, so the
+    work is a handful of NumPy operations regardless of the date range.
+    Both stay int64 (share units and cents, as _load_ledgers returns them)
+    until they meet the closing prices, so long ledgers don't drift.
+    """
+    ledger_dates = pd.concat([trades["date"], cash["date"]])
+    if ledger_dates.empty:
+        return []
+
+    start = pd.Timestamp(ledger_dates.min()).date()
+    if start > end:
+        return []
+
+    dates = pd.date_range(start, end, freq="D").date
+    day_index = np.array(dates, dtype="datetime64[D]")
+
+    symbols = sorted(trades["symbol"].unique())
+    symbol_index = {symbol: j for j, symbol in enumerate(symbols)}
+
+    position_deltas = np.zeros((len(dates), len(symbols)), dtype=np.int64)
+    if not trades.empty:
+        rows = np.searchsorted(day_index, trades["date"].to_numpy(dtype="datetime64[D]"))
+        cols = trades["symbol"].map(symbol_index).to_numpy()
+        keep = rows < len(dates)
+        np.add.at(position_deltas, (rows[keep], cols[keep]),
+                  trades["quantity"].to_numpy(dtype=np.int64)[keep])
+
+    cash_deltas = np.zeros(len(dates), dtype=np.int64)
+    if not cash.empty:
+        rows = np.searchsorted(day_index, cash["date"].to_numpy(dtype="datetime64[D]"))
+        keep = rows < len(dates)
+        np.add.at(cash_deltas, rows[keep], cash["amount"].to_numpy(dtype=np.int64)[keep])
+
+    positions = np.cumsum(position_deltas, axis=0)
+    cash_balance = np.cumsum(cash_deltas)
+    prices = _price_matrix(symbols, dates)
+    equity = (positions * prices).sum(axis=1) / money.SHARE_UNITS
+    nav = np.round(equity + money.dollars(cash_balance), 2)
+
+    return [
+        {"date": day.strftime("%Y-%m-%d"), "value": float(value)}
+        for day, value in zip(dates, nav)
+    ]
+
+
+def get_nav_history(account):
+    """Daily NAV of a cash account and its holdings for every closed day up to yesterday,
+    memoized until the next trade or deposit.
+
+    Returns a new list each call so callers can append today's live value.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        version = ledger_version(cursor)
+        key = (version, account, date.today())
+
+        with _memo_lock:
+            if _memo["key"] == key:
+                cursor.close()
+                return list(_memo["history"])
+
+        trades, cash = _load_ledgers(cursor, account)
+        cursor.close()
+    finally:
+        conn.close()
+
+    history = compute_nav_history(trades, cash, date.today() - timedelta(days=1))
+
+    with _memo_lock:
+        _memo["key"] = key
+        _memo["history"] = history
+
+    return list(history)
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import market_cache
+import shared_quotes
+import single_flight
+from db_pool import get_connection
+from market_symbols import MARKET_INDICES, SECTOR_ETFS, ECONOMIC_INDICATORS, DOLLAR_INDEX_ALTERNATIVES
+from quote_service import refresh_quotes
+
+# Seconds between refreshes; keep it below the quote cache TTL so that
+# request handlers always find a fresh quote in memory
+PREFETCH_INTERVAL = float(os.getenv("MARKET_PREFETCH_INTERVAL", "10"))
+PREFETCH_ENABLED = os.getenv("MARKET_PREFETCH_ENABLED", "1") != "0"
+
+
+def _static_symbols():
+    """Symbols that are always served by the market endpoints, keyed by source."""
+    symbols = {}
+    for _, symbol in MARKET_INDICES.values():
+        symbols.setdefault(symbol, set()).add("index")
+    for symbol in SECTOR_ETFS.values():
+        symbols.setdefault(symbol, set()).add("sector")
+    for symbol in list(ECONOMIC_INDICATORS.values()) + DOLLAR_INDEX_ALTERNATIVES:
+        symbols.setdefault(symbol, set()).add("indicator")
+    return symbols
+
+
+def _database_symbols():
+    """Symbols currently held in any account's portfolio_item or listed in watchlist_item."""
+    symbols = {}
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT pi_symbol FROM portfolio_item")
+        for (symbol,) in cursor.fetchall():
+            symbols.setdefault(symbol.upper(), set()).add("holding")
+        cursor.execute("SELECT wi_symbol FROM watchlist_item")
+        for (symbol,) in cursor.fetchall():
+            symbols.setdefault(symbol.upper(), set()).add("watchlist")
+        cursor.close()
+    finally:
+        conn.close()
+    return symbols
+
+
+class QuotePrefetcher:
+    """Background thread that keeps the quote cache warm for known symbols."""
+
+    def __init__(self, interval=PREFETCH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # symbol -> {"sources": set, "last_refresh": epoch seconds or None}
+        self._symbols = {}
+        self.runs = 0
+        self.last_run_at = None
+        self.last_run_duration = 0.0
+        self.last_error = None
+        # "standalone" without the shared cache; otherwise "refresher" or "follower"
+        self.role = "standalone" if shared_quotes.cache is None else "follower"
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="quote-prefetcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+
+    def _collect_symbols(self):
+        symbols = _static_symbols()
+        try:
+            for symbol, sources in _database_symbols().items():
+                symbols.setdefault(symbol, set()).update(sources)
+        except Exception as e:
+            # Keep refreshing the market symbols even when MySQL is down
+            print(f"Prefetcher could not read holdings/watchlist: {e}")
+            self.last_error = str(e)
+        return symbols
+
+    def refresh_once(self):
+        """Refresh every tracked symbol with one batched quote request."""
+        started = time.monotonic()
+        self.last_error = None
+        symbols = self._collect_symbols()
+        # Requests that miss the cache mid-refresh wait for this fetch instead of repeating it
+        quotes = single_flight.quotes.do_many(list(symbols), refresh_quotes)
+        now = time.time()
+
+        with self._lock:
+            previous = self._symbols
+            self._symbols = {}
+            for symbol, sources in symbols.items():
+                last_refresh = now if symbol in quotes else previous.get(symbol, {}).get("last_refresh")
+                self._symbols[symbol] = {"sources": sources, "last_refresh": last_refresh}
+            self.runs += 1
+            self.last_run_at = now
+            self.last_run_duration = time.monotonic() - started
+
+    def _should_refresh(self):
+        """Only one process per host refreshes into the shared cache; the rest read from it."""
+        if shared_quotes.cache is None:
+            return True
+        # Retried every interval, so a follower takes over when the refresher exits
+        self.role = "refresher" if shared_quotes.cache.try_become_refresher() else "follower"
+        return self.role == "refresher"
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._should_refresh():
+                    self.refresh_once()
+            except Exception as e:
+                print(f"Quote prefetch failed: {e}")
+                self.last_error = str(e)
+            self._stop.wait(self.interval)
+
+    def status(self):
+        """Refresh cadence and per-symbol last-refresh age."""
+        now = time.time()
+        with self._lock:
+            symbols = {
+                symbol: {
+                    "sources": sorted(entry["sources"]),
+                    "lastRefresh": datetime.fromtimestamp(entry["last_refresh"]).isoformat()
+                    if entry["last_refresh"] else None,
+                    "ageSeconds": round(now - entry["last_refresh"], 3) if entry["last_refresh"] else None,
+                }
+                for symbol, entry in sorted(self._symbols.items())
+            }
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "role": self.role,
+                "intervalSeconds": self.interval,
+                "quoteTtlSeconds": market_cache.quotes.ttl,
+                "runs": self.runs,
+                "lastRun": datetime.fromtimestamp(self.last_run_at).isoformat() if self.last_run_at else None,
+                "lastRunDurationMs": round(self.last_run_duration * 1000, 3),
+                "lastError": self.last_error,
+                "symbols": symbols,
+            }
+
+
+prefetcher = QuotePrefetcher()
@@ -0,0 +1,181 @@
+import threading
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import yfinance as yf
+
+import market_cache
+import metrics
+import single_flight
+from db_pool import get_connection
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Serialize refreshes per symbol so concurrent requests don't download the
+# same missing range twice
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _symbol_lock(symbol):
+    with _locks_guard:
+        return _locks.setdefault(symbol, threading.Lock())
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _download(symbol, start, end):
+    """Download daily bars for [start, end) and return them as rows for the store."""
+    with metrics.yahoo_call("history", symbol):
+        bars = yf.Ticker(symbol).history(
+            start=start.strftime("%Y-%m-%d"),
+            end=end.strftime("%Y-%m-%d"),
+            interval="1d",
+            auto_adjust=False,
+        )
+
+    rows = []
+    for bar_date, o, h, l, c, v in zip(bars.index, bars["Open"], bars["High"],
+                                       bars["Low"], bars["Close"], bars["Volume"]):
+        if pd.isna(c):
+            continue
+        rows.append((symbol, bar_date.date(), float(o), float(h), float(l), float(c),
+                     int(v) if pd.notna(v) else 0))
+    return rows
+
+
+def refresh(symbol, start):
+    """Make sure the store covers [start, today) for symbol.
+
+    Only the ranges that were never synced are downloaded: a missing head when
+    an earlier start date is requested, and the missing tail since the last
+    sync. Today's bar is still moving, so it is never stored. The synced range
+    ends the day after the last stored bar and never grows over a download
+    that came back empty.
+    """
+    symbol = symbol.upper()
+    start = _to_date(start)
+    today = date.today()
+
+    with _symbol_lock(symbol):
+        conn = get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                "SELECT phs_start, phs_end FROM price_history_sync WHERE phs_symbol = %s",
+                (symbol, ))
+            synced = cursor.fetchone()
+
+            if synced is None:
+                missing = [(start, today)]
+                new_start = new_end = None
+            else:
+                missing = []
+                if start < synced["phs_start"]:
+                    missing.append((start, synced["phs_start"]))
+                if synced["phs_end"] < today:
+                    missing.append((synced["phs_end"], today))
+                new_start, new_end = synced["phs_start"], synced["phs_end"]
+
+            missing = [(a, b) for a, b in missing if a < b]
+            rows = []
+            for range_start, range_end in missing:
+                downloaded = _download(symbol, range_start, range_end)
+                if not downloaded:
+                    # An empty frame (a failed download, or no closed bar yet) syncs nothing
+                    continue
+                rows.extend(downloaded)
+                new_start = range_start if new_start is None else min(new_start, range_start)
+                # Only up to the last stored bar, so a bar Yahoo publishes late is fetched next time
+                after_last_bar = max(row[1] for row in downloaded) + timedelta(days=1)
+                new_end = after_last_bar if new_end is None else max(new_end, after_last_bar)
+
+            if not rows:
+                cursor.close()
+                return
+
+            cursor.executemany(
+                """
+                INSERT INTO price_history
+                    (ph_symbol, ph_date, ph_open, ph_high, ph_low, ph_close, ph_volume)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    ph_open = VALUES(ph_open), ph_high = VALUES(ph_high),
+                    ph_low = VALUES(ph_low), ph_close = VALUES(ph_close),
+                    ph_volume = VALUES(ph_volume)
+                """,
+                rows)
+
+            cursor.execute(
+                """
+                INSERT INTO price_history_sync (phs_symbol, phs_start, phs_end)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE phs_start = VALUES(phs_start), phs_end = VALUES(phs_end)
+                """,
+                (symbol, new_start, new_end))
+
+            conn.commit()
+            cursor.close()
+            print(f"Stored {len(rows)} new daily bars for {symbol}")
+        finally:
+            conn.close()
+
+
+def _load(symbol, start, end):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT ph_date, ph_open, ph_high, ph_low, ph_close, ph_volume
+            FROM price_history
+            WHERE ph_symbol = %s AND ph_date >= %s AND ph_date < %s
+            ORDER BY ph_date
+            """,
+            (symbol, start, end))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    frame = pd.DataFrame(rows, columns=["Date"] + COLUMNS)
+    frame["Date"] = pd.to_datetime(frame["Date"])
+    return frame.set_index("Date").astype(float)
+
+
+def get_history(symbol, start, end=None):
+    """Return closed daily OHLCV bars for [start, end) from the local store.
+
+    end defaults to today, so the result only contains closed trading days.
+    Results are kept in the history cache tier, which never expires because
+    closed bars never change.
+    """
+    symbol = symbol.upper()
+    start = _to_date(start)
+    end = min(_to_date(end) or date.today(), date.today())
+
+    key = (symbol, start, end)
+
+    def load():
+        refresh(symbol, start)
+        return _load(symbol, start, end)
+
+    # Concurrent misses for the same range share one refresh and load
+    return market_cache.history.get_or_load(key, lambda: single_flight.history.do(key, load))
+
+
+def get_close(symbol, on_date, lookback_days=10):
+    """Return the last stored close on or before on_date, or None if there is none."""
+    on_date = _to_date(on_date)
+    bars = get_history(symbol, on_date - timedelta(days=lookback_days), on_date + timedelta(days=1))
+    if bars.empty:
+        return None
+    return float(bars["Close"].iloc[-1])
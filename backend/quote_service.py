@@ -0,0 +1,272 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+import yfinance as yf
+
+import market_cache
+import metrics
+import shared_quotes
+import single_flight
+
+# Number of symbols requested per yf.download call
+BATCH_SIZE = int(os.getenv("QUOTE_BATCH_SIZE", "100"))
+# Seconds a single upstream call may take before yfinance gives up on it
+CALL_TIMEOUT = float(os.getenv("QUOTE_CALL_TIMEOUT", "10"))
+
+# Deadline-bounded fan-out used by the market overview endpoints
+FANOUT_WORKERS = int(os.getenv("QUOTE_FANOUT_WORKERS", "16"))
+FANOUT_CALL_TIMEOUT = float(os.getenv("QUOTE_FANOUT_CALL_TIMEOUT", "3"))
+FANOUT_DEADLINE = float(os.getenv("QUOTE_FANOUT_DEADLINE", "4"))
+
+_fanout_pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="quote-fanout")
+
+
+class Quote:
+    """Last price and previous close for one symbol."""
+
+    __slots__ = ("symbol", "price", "previous_close", "volume", "day_high", "day_low")
+
+    def __init__(self, symbol, price, previous_close, volume=0, day_high=0.0, day_low=0.0):
+        self.symbol = symbol
+        self.price = price
+        self.previous_close = previous_close
+        self.volume = volume
+        self.day_high = day_high
+        self.day_low = day_low
+
+    @property
+    def change(self):
+        return self.price - self.previous_close
+
+    @property
+    def change_percent(self):
+        if self.previous_close <= 0:
+            return 0
+        return self.change / self.previous_close * 100
+
+    def __eq__(self, other):
+        if not isinstance(other, Quote):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def to_dict(self):
+        return {
+            "symbol": self.symbol,
+            "price": self.price,
+            "previousClose": self.previous_close,
+            "change": self.change,
+            "changePercent": self.change_percent,
+            "volume": self.volume,
+            "dayHigh": self.day_high,
+            "dayLow": self.day_low,
+        }
+
+
+def _normalize(symbols):
+    """Upper-case and de-duplicate symbols while keeping their order."""
+    seen = {}
+    for symbol in symbols:
+        if symbol:
+            seen.setdefault(symbol.strip().upper(), None)
+    return list(seen)
+
+
+def _quote_from_frame(symbol, frame):
+    """Build a Quote from the daily bars yf.download returned for one symbol."""
+    closes = frame["Close"].dropna()
+    if closes.empty:
+        return None
+
+    last = closes.index[-1]
+    price = float(closes.iloc[-1])
+    previous_close = float(closes.iloc[-2]) if len(closes) >= 2 else price
+    volume = frame["Volume"].get(last, 0)
+
+    return Quote(
+        symbol=symbol,
+        price=price,
+        previous_close=previous_close,
+        volume=int(volume) if pd.notna(volume) else 0,
+        day_high=float(frame["High"].get(last, price)),
+        day_low=float(frame["Low"].get(last, price)),
+    )
+
+
+def _fetch_batch(symbols, timeout=CALL_TIMEOUT):
+    """Fetch quotes for one batch of symbols with a single download call."""
+    with metrics.yahoo_call("download", symbols):
+        data = yf.download(
+            symbols,
+            period="5d",
+            interval="1d",
+            group_by="ticker",
+            auto_adjust=False,
+            progress=False,
+            threads=True,
+            timeout=timeout,
+        )
+
+    quotes = {}
+    if data is None or data.empty:
+        metrics.yahoo_symbol_errors("download", symbols)
+        return quotes
+
+    for symbol in symbols:
+        try:
+            if isinstance(data.columns, pd.MultiIndex):
+                frame = data[symbol]
+            else:
+                frame = data
+            quote = _quote_from_frame(symbol, frame)
+        except KeyError:
+            quote = None
+        except Exception as e:
+            print(f"Error parsing quote for {symbol}: {e}")
+            quote = None
+
+        if quote is not None:
+            quotes[symbol] = quote
+
+    metrics.yahoo_symbol_errors("download", [symbol for symbol in symbols if symbol not in quotes])
+    return quotes
+
+
+def _cached_quotes(symbols):
+    """Return ({symbol: Quote}, [missing]) from this process's quote tier, then the shared cache."""
+    quotes, missing = market_cache.quotes.get_many(symbols)
+    if not missing or shared_quotes.cache is None:
+        return quotes, missing
+
+    ttl = market_cache.quotes.ttl
+    for symbol, (price, previous_close, volume, day_high, day_low, age) in \
+            shared_quotes.cache.get_quotes(missing, ttl).items():
+        quote = Quote(symbol, price, previous_close, volume, day_high, day_low)
+        # Expire the local copy with the shared one, so the next refresh is picked up on time
+        market_cache.quotes.set(symbol, quote, ttl=ttl - age)
+        quotes[symbol] = quote
+    return quotes, [symbol for symbol in missing if symbol not in quotes]
+
+
+def _publish(quotes):
+    """Cache fetched quotes in this process and, when enabled, for every other worker."""
+    for symbol, quote in quotes.items():
+        market_cache.quotes.set(symbol, quote)
+    if shared_quotes.cache is not None and quotes:
+        shared_quotes.cache.put_quotes({
+            symbol: (quote.price, quote.previous_close, quote.volume, quote.day_high, quote.day_low)
+            for symbol, quote in quotes.items()
+        })
+
+
+def get_quotes(symbols):
+    """Return {symbol: Quote} for every symbol Yahoo could price.
+
+    Quotes still fresh in the quote cache are served from memory; the rest
+    are fetched BATCH_SIZE at a time, so the number of upstream calls depends
+    on the number of batches rather than the number of symbols. Concurrent
+    callers share in-flight fetches for the same symbols. With the shared
+    quote cache enabled, quotes another worker already fetched count as
+    cached. Symbols that could not be priced are left out of the result.
+    """
+    quotes, missing = _cached_quotes(_normalize(symbols))
+    # Symbols another request is already fetching are waited on, not re-requested
+    quotes.update(single_flight.quotes.do_many(missing, refresh_quotes))
+    return quotes
+
+
+def refresh_quotes(symbols):
+    """Fetch fresh quotes from Yahoo, bypassing and then repopulating the cache."""
+    symbols = _normalize(symbols)
+    quotes = {}
+
+    for i in range(0, len(symbols), BATCH_SIZE):
+        batch = symbols[i:i + BATCH_SIZE]
+        try:
+            fetched = _fetch_batch(batch)
+        except Exception as e:
+            print(f"Error fetching quotes for {batch}: {e}")
+            continue
+
+        _publish(fetched)
+        quotes.update(fetched)
+
+    return quotes
+
+
+def _fetch_and_cache(symbols, timeout):
+    fetched = _fetch_batch(symbols, timeout=timeout)
+    _publish(fetched)
+    return fetched
+
+
+def get_quotes_by_deadline(symbols, deadline=FANOUT_DEADLINE, call_timeout=FANOUT_CALL_TIMEOUT):
+    """Return ({symbol: Quote}, late_symbols), waiting at most deadline seconds.
+
+    Each uncached symbol gets its own upstream call on a bounded thread pool,
+    so the wait is the slowest single call (itself capped at call_timeout)
+    rather than the whole list, and never longer than the deadline. Symbols
+    whose call failed or is still running at the deadline are returned in
+    late_symbols; calls that finish afterwards still fill the quote cache
+    for the next request.
+    """
+    quotes, missing = _cached_quotes(_normalize(symbols))
+    if not missing:
+        return quotes, []
+
+    futures = {
+        _fanout_pool.submit(single_flight.quotes.do_many, [symbol],
+                            lambda batch: _fetch_and_cache(batch, call_timeout)): symbol
+        for symbol in missing
+    }
+    done, _ = wait(futures, timeout=deadline)
+
+    late = []
+    for future, symbol in futures.items():
+        if future not in done:
+            late.append(symbol)
+            continue
+        try:
+            quotes.update(future.result())
+        except Exception as e:
+            print(f"Error fetching quote for {symbol}: {e}")
+            late.append(symbol)
+
+    return quotes, late
+
+
+def get_quote(symbol):
+    """Return the Quote for a single symbol, or None if it is unavailable."""
+    return get_quotes([symbol]).get(symbol.strip().upper())
+
+
+def get_company_profile(symbol):
+    """Return the slow-changing company fields (name, sector, industry, market cap).
+
+    Profiles are cached in the metadata tier for days, so trades and stock
+    lookups only pay for the full ticker.info fetch once per symbol (once per
+    host with the shared quote cache enabled).
+    """
+    symbol = symbol.strip().upper()
+    shared = shared_quotes.cache
+
+    def load():
+        if shared is not None:
+            profile = shared.get_profile(symbol, market_cache.metadata.ttl)
+            if profile is not None:
+                return profile
+        with metrics.yahoo_call("info", symbol):
+            info = yf.Ticker(symbol).info
+        profile = {
+            "longName": info.get('longName', symbol),
+            "sector": info.get('sector', 'Unknown'),
+            "industry": info.get('industry', 'Unknown'),
+            "marketCap": info.get('marketCap', 0),
+        }
+        if shared is not None:
+            shared.put_profile(symbol, profile)
+        return profile
+
+    return market_cache.metadata.get_or_load(symbol, load)
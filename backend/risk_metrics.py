@@ -0,0 +1,183 @@
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import price_history
+
+BENCHMARK_SYMBOL = "^GSPC"
+TRADING_DAYS = 252
+
+# Calendar days of daily closes the metrics are computed over
+LOOKBACK_DAYS = int(os.getenv("RISK_LOOKBACK_DAYS", "365"))
+# Trading days per window for the rolling variants (about three months)
+ROLLING_WINDOW = int(os.getenv("RISK_ROLLING_WINDOW", "63"))
+# Annual risk-free rate used by the Sharpe ratio
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.02"))
+
+# Last computed metrics, reused until the holdings change or a new trading day closes
+_memo = {"key": None, "metrics": None}
+_memo_lock = threading.Lock()
+
+
+def _last_trading_date(today=None):
+    """Most recent weekday strictly before today, i.e. the last closed session."""
+    today = today or date.today()
+    return np.busday_offset(np.datetime64(today - timedelta(days=1), "D"), 0, roll="backward").astype(date)
+
+
+def _returns(holdings, end):
+    """Daily returns of the current holdings and of the benchmark as two aligned arrays, plus their dates.
+
+    The portfolio series values today's quantities at each day's close, so it
+    measures the risk of what is held now rather than of past deposits and trades.
+    """
+    start = end - timedelta(days=LOOKBACK_DAYS)
+    benchmark = price_history.get_history(BENCHMARK_SYMBOL, start, end + timedelta(days=1))["Close"]
+    if len(benchmark) < 3:
+        return None, None, None
+
+    days = benchmark.index
+    prices = np.empty((len(days), len(holdings)))
+    for j, holding in enumerate(holdings):
+        closes = price_history.get_history(holding.symbol, start, end + timedelta(days=1))["Close"]
+        if closes.empty:
+            # Without any history the position can't move, so it only dilutes
+            prices[:, j] = holding.avg_price
+            continue
+        prices[:, j] = closes.reindex(days, method="ffill").bfill().to_numpy()
+
+    quantities = np.array([holding.quantity for holding in holdings], dtype=float)
+    values = np.column_stack((prices @ quantities, benchmark.to_numpy(dtype=float)))
+
+    returns = values[1:] / values[:-1] - 1
+    return returns[:, 0], returns[:, 1], days[1:]
+
+
+def compute_risk_metrics(portfolio, benchmark, window=ROLLING_WINDOW, risk_free_rate=RISK_FREE_RATE):
+    """Beta, Sharpe, max drawdown, volatility and correlation for two aligned daily return arrays.
+
+    Everything comes from one pass over a (days x 2) matrix, and the rolling
+    variants from the same statistics over a sliding-window view of it.
+    """
+    returns = np.column_stack((portfolio, benchmark))
+    daily_risk_free = risk_free_rate / TRADING_DAYS
+
+    mean = returns.mean(axis=0)
+    covariance = np.cov(returns, rowvar=False)
+    std = np.sqrt(np.diag(covariance))
+
+    wealth = np.cumprod(1 + returns[:, 0])
+    drawdown = wealth / np.maximum.accumulate(np.concatenate(([1.0], wealth)))[1:] - 1
+
+    metrics = {
+        "beta": covariance[0, 1] / covariance[1, 1] if covariance[1, 1] > 0 else None,
+        "sharpe": (mean[0] - daily_risk_free) / std[0] * np.sqrt(TRADING_DAYS) if std[0] > 0 else None,
+        "maxDrawdown": min(drawdown.min(), 0.0),
+        "volatility": std[0] * np.sqrt(TRADING_DAYS),
+        "correlation": covariance[0, 1] / (std[0] * std[1]) if std[0] > 0 and std[1] > 0 else None,
+        "rolling": None,
+    }
+
+    if len(returns) >= window:
+        # (windows x window x 2) view, no copies
+        windows = np.lib.stride_tricks.sliding_window_view(returns, window, axis=0).transpose(0, 2, 1)
+        deviations = windows - windows.mean(axis=1, keepdims=True)
+        variance = (deviations ** 2).sum(axis=1) / (window - 1)
+        cross = (deviations[:, :, 0] * deviations[:, :, 1]).sum(axis=1) / (window - 1)
+        rolling_std = np.sqrt(variance)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            metrics["rolling"] = {
+                "volatility": rolling_std[:, 0] * np.sqrt(TRADING_DAYS),
+                "sharpe": (windows[:, :, 0].mean(axis=1) - daily_risk_free) / rolling_std[:, 0] * np.sqrt(TRADING_DAYS),
+                "beta": cross / variance[:, 1],
+                "correlation": cross / (rolling_std[:, 0] * rolling_std[:, 1]),
+            }
+
+    return metrics
+
+
+def _round(value, digits=4):
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), digits)
+
+
+def get_risk_metrics(holdings):
+    """Risk metrics for the given holdings, computed at most once per holdings and trading day.
+
+    holdings are valuation.Holding tuples; the result is JSON-ready, with the
+    rolling variants as a list of {"date", "volatility", "sharpe", "beta",
+    "correlation"} dicts, one per window end.
+    """
+    trading_date = _last_trading_date()
+    key = (tuple((holding.symbol, holding.quantity) for holding in holdings), trading_date)
+
+    with _memo_lock:
+        if _memo["key"] == key:
+            return _memo["metrics"]
+
+    portfolio, benchmark, days = _returns(holdings, trading_date) if holdings else (None, None, None)
+    if portfolio is None:
+        result = {"asOf": trading_date.isoformat(), "beta": None, "sharpe": None, "maxDrawdown": None,
+                  "volatility": None, "correlation": None, "rollingWindow": ROLLING_WINDOW, "rolling": []}
+    else:
+        metrics = compute_risk_metrics(portfolio, benchmark)
+        rolling = []
+        if metrics["rolling"] is not None:
+            window_ends = pd.DatetimeIndex(days[ROLLING_WINDOW - 1:]).strftime("%Y-%m-%d")
+            series = metrics["rolling"]
+            rolling = [
+                {"date": day, "volatility": _round(vol), "sharpe": _round(sharpe),
+                 "beta": _round(beta), "correlation": _round(corr)}
+                for day, vol, sharpe, beta, corr in zip(window_ends, series["volatility"], series["sharpe"],
+                                                        series["beta"], series["correlation"])
+            ]
+        result = {
+            "asOf": trading_date.isoformat(),
+            "beta": _round(metrics["beta"]),
+            "sharpe": _round(metrics["sharpe"]),
+            "maxDrawdown": _round(metrics["maxDrawdown"]),
+            "volatility": _round(metrics["volatility"]),
+            "correlation": _round(metrics["correlation"]),
+            "rollingWindow": ROLLING_WINDOW,
+            "rolling": rolling,
+        }
+
+    with _memo_lock:
+        _memo["key"] = key
+        _memo["metrics"] = result
+
+    return result
+
+
+def format_risk_metrics(metrics):
+    """The [{"metric", "value"}] rows the full-portfolio export has always carried."""
+    def number(value):
+        return "N/A" if value is None else f"{value:.2f}"
+
+    def percent(value):
+        return "N/A" if value is None else f"{value * 100:.1f}%"
+
+    rows = [
+        {"metric": "Portfolio Beta", "value": number(metrics["beta"])},
+        {"metric": "Sharpe Ratio", "value": number(metrics["sharpe"])},
+        {"metric": "Max Drawdown", "value": percent(metrics["maxDrawdown"])},
+        {"metric": "Volatility", "value": percent(metrics["volatility"])},
+        {"metric": "Correlation with S&P 500", "value": number(metrics["correlation"])},
+    ]
+
+    if metrics["rolling"]:
+        latest = metrics["rolling"][-1]
+        window = metrics["rollingWindow"]
+        rows.extend([
+            {"metric": f"Rolling {window}-Day Beta", "value": number(latest["beta"])},
+            {"metric": f"Rolling {window}-Day Sharpe Ratio", "value": number(latest["sharpe"])},
+            {"metric": f"Rolling {window}-Day Volatility", "value": percent(latest["volatility"])},
+            {"metric": f"Rolling {window}-Day Correlation with S&P 500", "value": number(latest["correlation"])},
+        ])
+
+    return rows
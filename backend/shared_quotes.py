@@ -0,0 +1,309 @@
+"""Quote and company-profile cache shared by every worker process on a host.
+
+The cache is a memory-mapped file holding a fixed-size open-addressing table
+with one slot per symbol. Each slot is guarded by a sequence counter
+(a seqlock): a writer makes it odd, writes the fields and makes it even
+again, and a reader copies the slot and keeps the copy only if the counter
+was even and unchanged around it. Readers therefore never take a lock and
+never wait for a writer; writers serialize on an flock'd side file.
+
+One process at a time holds the refresher lock (another flock'd side file,
+released by the OS when that process exits) and runs the quote prefetcher;
+the other workers read what it publishes and only go upstream for symbols
+nobody has published yet, which they then publish themselves.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every worker keeps its own cache
+    fcntl = None
+
+SHARED_CACHE_ENABLED = os.getenv("SHARED_QUOTE_CACHE_ENABLED", "0") == "1"
+SHARED_CACHE_PATH = os.getenv(
+    "SHARED_QUOTE_CACHE_PATH",
+    "/dev/shm/portfolio-manager-quotes" if os.path.isdir("/dev/shm") else "/tmp/portfolio-manager-quotes",
+)
+# Slots are never freed, so size the table well above the number of symbols served
+SHARED_CACHE_SLOTS = int(os.getenv("SHARED_QUOTE_CACHE_SLOTS", "16384"))
+# Attempts at a consistent copy of a slot before treating it as a miss
+READ_RETRIES = 8
+
+MAGIC = b"PMQUOTE1"
+# magic, capacity, slot size, refresher pid, refresher heartbeat (epoch seconds)
+HEADER = struct.Struct("<8sIIqd")
+HEADER_SIZE = 64
+
+# Slot layout: sequence counter, symbol, quote fields, profile fields
+SEQUENCE = struct.Struct("<Q")
+SYMBOL = struct.Struct("<16s")
+# price, previous close, volume, day high, day low, fetched at
+QUOTE = struct.Struct("<ddqddd")
+# longName, sector, industry, marketCap, fetched at
+PROFILE = struct.Struct("<96s48s64sqd")
+SYMBOL_OFFSET = SEQUENCE.size
+QUOTE_OFFSET = SYMBOL_OFFSET + SYMBOL.size
+PROFILE_OFFSET = QUOTE_OFFSET + QUOTE.size
+SLOT_SIZE = 320
+
+EMPTY_SYMBOL = bytes(SYMBOL.size)
+
+
+def _text(value, width):
+    """UTF-8 bytes of value cut to width without splitting a character."""
+    return str(value or "").encode("utf-8")[:width].decode("utf-8", "ignore").encode("utf-8")
+
+
+def _decode(raw):
+    return raw.rstrip(b"\0").decode("utf-8", "ignore")
+
+
+class SharedQuoteCache:
+    """Seqlock-guarded quote/profile table in a file mapped by every worker."""
+
+    def __init__(self, path, capacity=SHARED_CACHE_SLOTS):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # flock is per open file, so each process (including forked children) opens its own
+        self._lock_fd = None
+        self._lock_pid = None
+        self._refresher_fd = None
+        self._refresher_pid = None
+        # symbol -> slot index; slots keep their symbol for the life of the file
+        self._slots = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.read_retries = 0
+        self.writes = 0
+        self.full = 0
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self._writing():
+                self.capacity = self._initialize(fd, capacity)
+            self._map = mmap.mmap(fd, HEADER_SIZE + self.capacity * SLOT_SIZE)
+        finally:
+            os.close(fd)
+
+    def _initialize(self, fd, capacity):
+        """Adopt a valid existing table (whatever its capacity) or create a new one."""
+        size = os.fstat(fd).st_size
+        if size >= HEADER_SIZE:
+            magic, existing, slot_size, _, _ = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+            if magic == MAGIC and slot_size == SLOT_SIZE and size == HEADER_SIZE + existing * SLOT_SIZE:
+                return existing
+        os.ftruncate(fd, 0)
+        os.ftruncate(fd, HEADER_SIZE + capacity * SLOT_SIZE)
+        os.pwrite(fd, HEADER.pack(MAGIC, capacity, SLOT_SIZE, 0, 0.0), 0)
+        return capacity
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive writer lock across threads and processes."""
+        with self._thread_lock:
+            if self._lock_pid != os.getpid():
+                self._lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+                self._lock_pid = os.getpid()
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _base(self, index):
+        return HEADER_SIZE + index * SLOT_SIZE
+
+    def _slot(self, symbol, claim=False):
+        """Slot index holding symbol; with claim=True (writers only) take a free slot for it."""
+        index = self._slots.get(symbol)
+        if index is not None:
+            return index
+        key = symbol.encode("utf-8")
+        if not key or len(key) > SYMBOL.size:
+            return None
+        stored_key = key.ljust(SYMBOL.size, b"\0")
+
+        start = zlib.crc32(key) % self.capacity
+        for probe in range(self.capacity):
+            index = (start + probe) % self.capacity
+            offset = self._base(index) + SYMBOL_OFFSET
+            stored = self._map[offset:offset + SYMBOL.size]
+            if stored == stored_key:
+                self._slots[symbol] = index
+                return index
+            if stored == EMPTY_SYMBOL:
+                if not claim:
+                    return None
+                # Its fetched-at fields are still zero, so readers see no data until the first write
+                self._map[offset:offset + SYMBOL.size] = stored_key
+                self._slots[symbol] = index
+                return index
+        return None
+
+    def _read(self, index):
+        """Consistent copy of a slot's bytes, or None if writers kept changing it."""
+        base = self._base(index)
+        for _ in range(READ_RETRIES):
+            before = SEQUENCE.unpack_from(self._map, base)[0]
+            if not before & 1:
+                body = self._map[base:base + SLOT_SIZE]
+                if SEQUENCE.unpack_from(self._map, base)[0] == before:
+                    return body
+            with self._stats_lock:
+                self.read_retries += 1
+            time.sleep(0)
+        return None
+
+    def _write(self, index, offset, layout, values):
+        base = self._base(index)
+        sequence = SEQUENCE.unpack_from(self._map, base)[0]
+        # An odd counter means a writer died mid-write; keep it odd until this write is done
+        sequence = sequence if sequence & 1 else sequence + 1
+        SEQUENCE.pack_into(self._map, base, sequence)
+        layout.pack_into(self._map, base + offset, *values)
+        SEQUENCE.pack_into(self._map, base, sequence + 1)
+
+    def _count(self, hits=0, misses=0, stale=0):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+            self.stale += stale
+
+    def get_quotes(self, symbols, max_age):
+        """{symbol: (price, previous_close, volume, day_high, day_low, age)} for entries younger than max_age."""
+        now = time.time()
+        found = {}
+        misses = stale = 0
+        for symbol in symbols:
+            index = self._slot(symbol)
+            body = self._read(index) if index is not None else None
+            fields = QUOTE.unpack_from(body, QUOTE_OFFSET) if body is not None else None
+            if fields is None or not fields[5]:
+                misses += 1
+            elif now - fields[5] >= max_age:
+                stale += 1
+            else:
+                found[symbol] = fields[:5] + (now - fields[5],)
+        self._count(len(found), misses, stale)
+        return found
+
+    def put_quotes(self, quotes):
+        """Publish {symbol: (price, previous_close, volume, day_high, day_low)} to every worker."""
+        now = time.time()
+        try:
+            with self._writing():
+                for symbol, fields in quotes.items():
+                    index = self._slot(symbol, claim=True)
+                    if index is None:
+                        self.full += 1
+                        continue
+                    self._write(index, QUOTE_OFFSET, QUOTE, tuple(fields) + (now,))
+                    self.writes += 1
+        except OSError as e:
+            print(f"Error publishing quotes to the shared cache: {e}")
+
+    def get_profile(self, symbol, max_age):
+        """The cached company profile dict, or None if absent or older than max_age."""
+        index = self._slot(symbol)
+        body = self._read(index) if index is not None else None
+        fields = PROFILE.unpack_from(body, PROFILE_OFFSET) if body is not None else None
+        if fields is None or not fields[4]:
+            self._count(misses=1)
+            return None
+        if time.time() - fields[4] >= max_age:
+            self._count(stale=1)
+            return None
+        self._count(hits=1)
+        return {
+            "longName": _decode(fields[0]),
+            "sector": _decode(fields[1]),
+            "industry": _decode(fields[2]),
+            "marketCap": fields[3],
+        }
+
+    def put_profile(self, symbol, profile):
+        try:
+            with self._writing():
+                index = self._slot(symbol, claim=True)
+                if index is None:
+                    self.full += 1
+                    return
+                self._write(index, PROFILE_OFFSET, PROFILE, (
+                    _text(profile.get("longName"), 96),
+                    _text(profile.get("sector"), 48),
+                    _text(profile.get("industry"), 64),
+                    int(profile.get("marketCap") or 0),
+                    time.time(),
+                ))
+                self.writes += 1
+        except OSError as e:
+            print(f"Error publishing profile of {symbol} to the shared cache: {e}")
+
+    def try_become_refresher(self):
+        """True if this process is (or has just become) the one refreshing quotes upstream."""
+        if self._refresher_pid != os.getpid():
+            fd = os.open(self.path + ".refresher", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            self._refresher_fd = fd
+            self._refresher_pid = os.getpid()
+        HEADER.pack_into(self._map, 0, MAGIC, self.capacity, SLOT_SIZE, os.getpid(), time.time())
+        return True
+
+    def is_refresher(self):
+        return self._refresher_pid == os.getpid()
+
+    def stats(self):
+        _, capacity, _, refresher_pid, heartbeat = HEADER.unpack_from(self._map, 0)
+        used = sum(
+            1 for index in range(capacity)
+            if self._map[self._base(index) + SYMBOL_OFFSET:self._base(index) + QUOTE_OFFSET] != EMPTY_SYMBOL
+        )
+        with self._stats_lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "enabled": True,
+                "path": self.path,
+                "capacity": capacity,
+                "used": used,
+                "pid": os.getpid(),
+                "isRefresher": self.is_refresher(),
+                "refresherPid": refresher_pid or None,
+                "refresherHeartbeatAgeSeconds": round(time.time() - heartbeat, 3) if heartbeat else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0,
+                "readRetries": self.read_retries,
+                "writes": self.writes,
+                "full": self.full,
+            }
+
+
+def _open():
+    if not SHARED_CACHE_ENABLED:
+        return None
+    if fcntl is None:
+        print("Shared quote cache needs fcntl; falling back to per-process caches")
+        return None
+    try:
+        return SharedQuoteCache(SHARED_CACHE_PATH, SHARED_CACHE_SLOTS)
+    except (OSError, ValueError) as e:
+        print(f"Could not open shared quote cache at {SHARED_CACHE_PATH}: {e}")
+        return None
+
+
+# None when disabled; every caller then behaves as a single process would
+cache = _open()
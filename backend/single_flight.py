@@ -0,0 +1,127 @@
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the work; callers arriving while it is
+    still in flight wait for it and share its result (or its exception).
+    Nothing is kept once the call finishes, so this only removes duplicate
+    concurrent work; the caches decide how long results are reused.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Return fn(), running it only if no call for key is already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def do_many(self, keys, fn):
+        """Batch variant of do(): fn(keys) -> {key: value} for the keys nobody is loading yet.
+
+        Keys already in flight (from do() or another batch) are waited on
+        instead of being requested again. Keys that fn (or the other caller)
+        could not load are left out of the result; an exception from this
+        caller's own fn is raised after its keys are released.
+        """
+        calls = {}
+        waiting = {}
+        with self._lock:
+            for key in keys:
+                if key in calls or key in waiting:
+                    continue
+                call = self._calls.get(key)
+                if call is None:
+                    calls[key] = self._calls[key] = _Call()
+                else:
+                    waiting[key] = call
+            self.executions += len(calls)
+            self.coalesced += len(waiting)
+
+        own = list(calls)
+        results = {}
+        if own:
+            try:
+                results.update(fn(own))
+            except BaseException as e:
+                for call in calls.values():
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in own:
+                        self._calls.pop(key, None)
+                for key, call in calls.items():
+                    call.result = results.get(key)
+                    call.done.set()
+
+        for key, call in waiting.items():
+            call.done.wait()
+            if call.error is None and call.result is not None:
+                results[key] = call.result
+
+        return results
+
+    def stats(self):
+        with self._lock:
+            requests = self.executions + self.coalesced
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "inFlight": len(self._calls),
+                "coalescingRatio": round(self.coalesced / requests, 4) if requests else 0,
+            }
+
+
+# Upstream quote requests, keyed by symbol
+quotes = SingleFlight("quotes")
+# Stored daily bar loads, keyed by (symbol, start, end)
+history = SingleFlight("history")
+# Whole GET endpoint responses, keyed by path and query string
+endpoints = SingleFlight("endpoints")
+
+GROUPS = (quotes, history, endpoints)
+
+
+def stats():
+    """Executions vs coalesced callers for every single-flight group."""
+    return {group.name: group.stats() for group in GROUPS}
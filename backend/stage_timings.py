@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Recent samples kept per stage for the percentiles
+SAMPLE_SIZE = 500
+
+
+class StageTimings:
+    """Latency of each named stage of a multi-step operation, such as a trade."""
+
+    def __init__(self, name, stages):
+        self.name = name
+        self.stages = tuple(stages)
+        self._samples = {stage: deque(maxlen=SAMPLE_SIZE) for stage in self.stages}
+        self._counts = dict.fromkeys(self.stages, 0)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, stage, timings=None):
+        """Time the enclosed block as one run of stage; also store it in timings (a dict) if given."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._samples[stage].append(elapsed)
+                self._counts[stage] += 1
+            if timings is not None:
+                timings[stage] = elapsed
+
+    def stats(self):
+        """Count and recent mean / p50 / p95 / max per stage, in milliseconds."""
+        with self._lock:
+            snapshot = {stage: (self._counts[stage], sorted(self._samples[stage])) for stage in self.stages}
+
+        result = {}
+        for stage, (count, samples) in snapshot.items():
+            if not samples:
+                result[stage] = {"count": count}
+                continue
+            result[stage] = {
+                "count": count,
+                "meanMs": round(sum(samples) / len(samples) * 1000, 3),
+                "p50Ms": round(samples[len(samples) // 2] * 1000, 3),
+                "p95Ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+                "maxMs": round(samples[-1] * 1000, 3),
+            }
+        return result
+
+
+def format_timings(timings):
+    """One-line summary of a single run, e.g. for a log line."""
+    return ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in timings.items())
@@ -0,0 +1,288 @@
+from collections import defaultdict, deque
+
+import money
+
+# Lot selection methods for SELL trades and the order open lots are consumed in
+LOT_METHODS = {
+    "FIFO": "tl_date ASC, tl_id ASC",
+    "LIFO": "tl_date DESC, tl_id DESC",
+    "HIFO": "tl_price DESC, tl_id ASC",
+    "SPECIFIC": None,
+}
+DEFAULT_LOT_METHOD = "FIFO"
+
+# Lots are matched in integer share units and gains booked in cents (money.py),
+# so partially closed lots never leave float dust behind
+LOT_COLUMNS = (f"tl_id, {money.column('tl_price', money.CENTS)} AS price, "
+               f"{money.column('tl_remaining_quantity', money.SHARE_UNITS)} AS remaining")
+
+
+def validate_lot_selection(method, lot_ids=None):
+    """Normalize and check a lot method; SPECIFIC requires explicit lot ids.
+
+    lot_ids, when given, must be a list of distinct integer tax lot ids.
+    """
+    method = method or DEFAULT_LOT_METHOD
+    if not isinstance(method, str) or method.upper() not in LOT_METHODS:
+        raise ValueError(f"Unknown lot method {method}. Use one of: {', '.join(LOT_METHODS)}")
+    method = method.upper()
+    if lot_ids is not None and (not isinstance(lot_ids, list) or not all(
+            isinstance(lot_id, int) and not isinstance(lot_id, bool) for lot_id in lot_ids)):
+        raise ValueError("lot_ids must be a list of integer lot ids")
+    if lot_ids is not None and len(set(lot_ids)) != len(lot_ids):
+        # A repeated id would consume the same lot twice
+        raise ValueError("lot_ids must not repeat a lot")
+    if method == "SPECIFIC" and not lot_ids:
+        raise ValueError("lot_ids are required for SPECIFIC lot selection")
+    return method
+
+
+def _open_lots(cursor, account, symbol, method, lot_ids):
+    """Load the account's open lots of the symbol in consumption order as a deque of dicts
+    with tl_id, price (cents) and remaining (share units)."""
+    if method == "SPECIFIC":
+        placeholders = ", ".join(["%s"] * len(lot_ids))
+        cursor.execute(
+            f"SELECT {LOT_COLUMNS} FROM tax_lot "
+            f"WHERE tl_ca_id = %s AND tl_symbol = %s AND tl_remaining_quantity > 0 AND tl_id IN ({placeholders}) "
+            f"FOR UPDATE",
+            (account, symbol, *lot_ids))
+        by_id = {row["tl_id"]: row for row in cursor.fetchall()}
+        unknown = [lot_id for lot_id in lot_ids if lot_id not in by_id]
+        if unknown:
+            raise ValueError(f"Lots {unknown} are not open lots of {symbol}")
+        # Consume in the order the caller listed them
+        return deque(by_id[lot_id] for lot_id in lot_ids)
+
+    cursor.execute(
+        f"SELECT {LOT_COLUMNS} FROM tax_lot "
+        f"WHERE tl_ca_id = %s AND tl_symbol = %s AND tl_remaining_quantity > 0 "
+        f"ORDER BY {LOT_METHODS[method]} FOR UPDATE",
+        (account, symbol))
+    return deque(cursor.fetchall())
+
+
+def _lot_row(lot):
+    """tax_lot insert parameters for a [tl_id, pt_id, account, symbol, date, quantity, remaining, price] lot."""
+    return (*lot[:5], money.to_decimal(lot[5], money.SHARE_UNITS), money.to_decimal(lot[6], money.SHARE_UNITS),
+            money.to_decimal(lot[7], money.CENTS))
+
+
+def _gain_row(pt_id, lot_id, symbol, date, quantity, cost_price, sale_price):
+    """realized_gain insert parameters for quantity share units closed at sale_price cents."""
+    gain = money.value_cents(quantity, sale_price - cost_price, price_scale=money.CENTS)
+    return (pt_id, lot_id, symbol, date, money.to_decimal(quantity, money.SHARE_UNITS),
+            money.to_decimal(cost_price, money.CENTS), money.to_decimal(sale_price, money.CENTS),
+            money.to_decimal(gain, money.CENTS))
+
+
+def _apply_trade(cursor, trade, method=DEFAULT_LOT_METHOD, lot_ids=None):
+    """Open a lot for a BUY, or close the account's lots and book realized gains for a SELL."""
+    if trade["type"] == "BUY":
+        cursor.execute(
+            "INSERT INTO tax_lot (tl_pt_id, tl_ca_id, tl_symbol, tl_date, tl_quantity, tl_remaining_quantity, tl_price) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (trade["id"], trade["account"], trade["symbol"], trade["date"],
+             money.to_decimal(trade["quantity"], money.SHARE_UNITS),
+             money.to_decimal(trade["quantity"], money.SHARE_UNITS), money.to_decimal(trade["price"], money.CENTS)))
+        return
+
+    lots = _open_lots(cursor, trade["account"], trade["symbol"], method, lot_ids)
+    remaining = trade["quantity"]
+    updates = []
+    gains = []
+
+    while remaining > 0 and lots:
+        lot = lots.popleft()
+        matched = min(remaining, lot["remaining"])
+        remaining -= matched
+        updates.append((money.to_decimal(lot["remaining"] - matched, money.SHARE_UNITS), lot["tl_id"]))
+        gains.append(_gain_row(trade["id"], lot["tl_id"], trade["symbol"], trade["date"], matched,
+                               lot["price"], trade["price"]))
+
+    if remaining > 0:
+        if method == "SPECIFIC":
+            raise ValueError(f"Selected lots of {trade['symbol']} cover "
+                             f"{(trade['quantity'] - remaining) / money.SHARE_UNITS} shares, "
+                             f"not {trade['quantity'] / money.SHARE_UNITS}")
+        print(f"SELL {trade['id']} of {trade['symbol']} exceeds open lots by {remaining / money.SHARE_UNITS}")
+
+    if updates:
+        cursor.executemany("UPDATE tax_lot SET tl_remaining_quantity = %s WHERE tl_id = %s", updates)
+        cursor.executemany(
+            "INSERT INTO realized_gain (rg_pt_id, rg_tl_id, rg_symbol, rg_date, rg_quantity, rg_cost_price, rg_sale_price, rg_gain) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            gains)
+
+
+def _lock_watermark(cursor):
+    """Lock and return the id of the last ledger row already applied to the lots."""
+    cursor.execute("INSERT IGNORE INTO tax_lot_sync (tls_id, tls_last_pt_id) VALUES (1, 0)")
+    cursor.execute("SELECT tls_last_pt_id FROM tax_lot_sync WHERE tls_id = 1 FOR UPDATE")
+    return cursor.fetchone()["tls_last_pt_id"]
+
+
+def _set_watermark(cursor, pt_id):
+    cursor.execute("UPDATE tax_lot_sync SET tls_last_pt_id = %s WHERE tls_id = 1", (pt_id, ))
+
+
+def _pending_trades(cursor, after_id, up_to_id=None):
+    """Ledger rows after after_id, with quantity in share units and price in cents."""
+    sql = (f"SELECT pt_id AS id, pt_ca_id AS account, pt_symbol AS symbol, pt_type AS type, "
+           f"{money.column('pt_quantity', money.SHARE_UNITS)} AS quantity, "
+           f"{money.column('pt_price', money.CENTS)} AS price, pt_date AS date "
+           f"FROM portfolio_transaction WHERE pt_id > %s")
+    params = [after_id]
+    if up_to_id is not None:
+        sql += " AND pt_id <= %s"
+        params.append(up_to_id)
+    cursor.execute(sql + " ORDER BY pt_id", params)
+    return cursor.fetchall()
+
+
+def rebuild(cursor, trades):
+    """Replay a whole ledger into lots and realized gains in one FIFO pass.
+
+    Each account and symbol keeps a deque of open lots, so every trade is
+    handled in amortized O(1) instead of rescanning earlier buys for each sell.
+    """
+    next_lot_id = 1
+    open_lots = defaultdict(deque)
+    lots = {}
+    gains = []
+
+    for trade in trades:
+        symbol = trade["symbol"]
+        if trade["type"] == "BUY":
+            lot = [next_lot_id, trade["id"], trade["account"], symbol, trade["date"], trade["quantity"],
+                   trade["quantity"], trade["price"]]
+            lots[next_lot_id] = lot
+            open_lots[trade["account"], symbol].append(lot)
+            next_lot_id += 1
+            continue
+
+        remaining = trade["quantity"]
+        queue = open_lots[trade["account"], symbol]
+        while remaining > 0 and queue:
+            lot = queue[0]
+            matched = min(remaining, lot[6])
+            lot[6] -= matched
+            remaining -= matched
+            gains.append(_gain_row(trade["id"], lot[0], symbol, trade["date"], matched, lot[7], trade["price"]))
+            if lot[6] == 0:
+                queue.popleft()
+
+    cursor.execute("DELETE FROM realized_gain")
+    cursor.execute("DELETE FROM tax_lot")
+    if lots:
+        cursor.executemany(
+            "INSERT INTO tax_lot (tl_id, tl_pt_id, tl_ca_id, tl_symbol, tl_date, tl_quantity, tl_remaining_quantity, tl_price) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            [_lot_row(lot) for lot in lots.values()])
+    if gains:
+        cursor.executemany(
+            "INSERT INTO realized_gain (rg_pt_id, rg_tl_id, rg_symbol, rg_date, rg_quantity, rg_cost_price, rg_sale_price, rg_gain) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            gains)
+
+
+def sync(conn, up_to_id=None):
+    """Apply every ledger row not yet reflected in the lots, using FIFO.
+
+    On an empty lot table the whole ledger is replayed with rebuild();
+    afterwards only new rows are applied. Trades inserted outside
+    handle_trade (seed data, SQL scripts) are picked up here.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # Fast path without locks: nothing landed since the last sync
+        cursor.execute("""
+            SELECT (SELECT IFNULL(MAX(pt_id), 0) FROM portfolio_transaction) AS max_pt,
+                   (SELECT tls_last_pt_id FROM tax_lot_sync WHERE tls_id = 1) AS last_pt
+        """)
+        row = cursor.fetchone()
+        if row["last_pt"] is not None and row["last_pt"] >= row["max_pt"]:
+            return
+
+        last_id = _lock_watermark(cursor)
+        trades = _pending_trades(cursor, last_id, up_to_id)
+        if trades:
+            if last_id == 0:
+                rebuild(cursor, trades)
+            else:
+                for trade in trades:
+                    _apply_trade(cursor, trade)
+            _set_watermark(cursor, trades[-1]["id"])
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def record_trade(conn, pt_id, method=DEFAULT_LOT_METHOD, lot_ids=None):
+    """Apply a just-inserted trade to the lots inside the caller's transaction.
+
+    Earlier unsynced rows are applied first with FIFO so lots stay in ledger
+    order. The caller commits, so the trade and its lots land atomically.
+    """
+    record_trades(conn, {pt_id: (method, lot_ids)})
+
+
+def record_trades(conn, selections):
+    """Batch form of record_trade(): selections maps each new pt_id to (method, lot_ids)."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        last_id = _lock_watermark(cursor)
+        trades = _pending_trades(cursor, last_id, max(selections))
+        if last_id == 0:
+            # Replay everything before the first new trade in one pass
+            earlier = [trade for trade in trades if trade["id"] < min(selections)]
+            if earlier:
+                rebuild(cursor, earlier)
+                trades = trades[len(earlier):]
+        for trade in trades:
+            if trade["id"] in selections and trade["type"] == "SELL":
+                method, lot_ids = selections[trade["id"]]
+                _apply_trade(cursor, trade, validate_lot_selection(method, lot_ids), lot_ids)
+            else:
+                _apply_trade(cursor, trade)
+        if trades:
+            _set_watermark(cursor, trades[-1]["id"])
+    finally:
+        cursor.close()
+
+
+def total_realized_gains(conn, account=None):
+    """Realized P&L in cents across all closed lots (of one account if given); a single aggregate lookup."""
+    sync(conn)
+    cursor = conn.cursor(dictionary=True)
+    select = f"SELECT IFNULL({money.column('SUM(rg_gain)', money.CENTS)}, 0) AS total FROM realized_gain"
+    if account is None:
+        cursor.execute(select)
+    else:
+        cursor.execute(
+            f"{select} "
+            f"JOIN tax_lot ON tl_id = rg_tl_id WHERE tl_ca_id = %s",
+            (account, ))
+    total = cursor.fetchone()["total"]
+    cursor.close()
+    return total
+
+
+def open_lots(conn, symbol=None, account=None):
+    """Open lots (optionally for one symbol and/or account), oldest first."""
+    sync(conn)
+    cursor = conn.cursor(dictionary=True)
+    sql = ("SELECT tl_id AS id, tl_ca_id AS accountId, tl_symbol AS symbol, tl_date AS date, "
+           "tl_quantity AS quantity, tl_remaining_quantity AS remainingQuantity, tl_price AS price "
+           "FROM tax_lot WHERE tl_remaining_quantity > 0")
+    params = []
+    if symbol:
+        sql += " AND tl_symbol = %s"
+        params.append(symbol.upper())
+    if account is not None:
+        sql += " AND tl_ca_id = %s"
+        params.append(account)
+    cursor.execute(sql + " ORDER BY tl_ca_id, tl_symbol, tl_date, tl_id", params)
+    lots = cursor.fetchall()
+    cursor.close()
+    return lots
@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+import numpy as np
+
+import money
+
+
+def test_to_units_rounds_half_away_from_zero():
+    assert money.to_cents("0.125") == 13
+    assert money.to_cents("0.124") == 12
+    assert money.to_cents("-0.125") == -13
+    # Parsed through str(), so the binary float 1.005 still rounds like the decimal
+    assert money.to_cents(1.005) == 101
+    assert money.to_units("1.23455", money.SHARE_UNITS) == 12346
+
+
+def test_to_decimal_round_trips():
+    assert money.to_decimal(12345, money.CENTS) == Decimal("123.45")
+    assert money.to_units(money.to_decimal(-987654321, money.SHARE_UNITS), money.SHARE_UNITS) == -987654321
+
+
+def test_rescale_rounds_half_up():
+    assert money.rescale(150, 100) == 2
+    assert money.rescale(149, 100) == 1
+    assert money.rescale(-150, 100) == -1
+    assert money.rescale(-151, 100) == -2
+
+
+def test_value_cents_rounds_each_position_once():
+    # 1.5 shares at $10.01 is $15.015
+    assert money.value_cents(15000, 1001, price_scale=money.CENTS) == 1502
+    # 3 shares at an average of $10.0050 is $30.015
+    assert money.value_cents(30000, 100050) == 3002
+
+
+def test_cent_sums_are_exact():
+    assert sum(money.to_cents(0.1) for _ in range(10)) == money.to_cents(1)
+    assert sum(0.1 for _ in range(10)) != 1.0
+
+
+def test_negative_gain_matches_decimal_math():
+    quantity = money.to_units("177", money.SHARE_UNITS)
+    cost = money.to_cents("2621.11")
+    sale = money.to_cents("2484.73")
+    gain = money.value_cents(quantity, sale, price_scale=money.CENTS) - \
+        money.value_cents(quantity, cost, price_scale=money.CENTS)
+    assert gain == money.to_cents(Decimal("177") * (Decimal("2484.73") - Decimal("2621.11")))
+    assert money.dollars(gain) == -24139.26
+
+
+def test_int64_arrays_match_the_int_path():
+    quantities = np.array([15000, 30000, 1, 50_000_000], dtype=np.int64)
+    prices = np.array([100100, 100050, 5000, 1_000_000_000], dtype=np.int64)
+
+    values = money.value_cents(quantities, prices)
+
+    assert values.dtype == np.int64
+    assert values.tolist() == [money.value_cents(int(q), int(p)) for q, p in zip(quantities, prices)]
+    # 5,000 shares at $100,000 is $500M; the int64 and Python int paths agree to the cent
+    assert values[-1] == 50_000_000_000
+    assert int(values.sum()) == sum(values.tolist())
+
+
+def test_units_array_rounds_and_zeroes_nan():
+    units = money.units_array([1.23456, np.nan, 0.00004, 99.99995], money.PRICE_UNITS)
+    assert units.dtype == np.int64
+    assert units.tolist() == [12346, 0, 0, 1000000]
+
+
+def test_column_reads_a_scaled_integer():
+    assert money.column("ca_balance", money.CENTS) == "CAST(ROUND((ca_balance) * 100) AS SIGNED)"
@@ -0,0 +1,112 @@
+import os
+import sys
+
+import pytest
+
+import money
+import tax_lots
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+from sqlite_store import SqliteDatabase  # noqa: E402
+
+SALE_PRICE = 110
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """A funded account holding lots #1 (10 @ $100), #2 (10 @ $120) and #3 (10 @ $90), oldest first."""
+    connection = SqliteDatabase(str(tmp_path / "lots.sqlite")).connect()
+    cursor = connection.cursor()
+    cursor.execute("INSERT INTO cash_account (ca_id, ca_name, ca_balance) VALUES (1, 'Test', 0)")
+    cursor.execute("INSERT INTO cash_transaction (ct_ca_id, ct_type, ct_amount, ct_date, ct_note) "
+                   "VALUES (1, 'DEPOSIT', 100000, '2024-01-01', 'Opening deposit')")
+    cursor.close()
+    connection.commit()
+    for day, price in ((2, 100), (3, 120), (4, 90)):
+        trade(connection, "BUY", 10, price, f"2024-01-0{day}")
+    yield connection
+    connection.close()
+
+
+def trade(conn, trade_type, quantity, price, day="2024-02-01", method=tax_lots.DEFAULT_LOT_METHOD, lot_ids=None):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO portfolio_transaction (pt_symbol, pt_name, pt_sector, pt_industry, pt_quantity, pt_price, pt_type, pt_date, pt_ca_id) "
+            "VALUES ('ACME', 'Acme Corp', 'Industrials', 'Tools', %s, %s, %s, %s, 1)",
+            (quantity, price, trade_type, day))
+        tax_lots.record_trade(conn, cursor.lastrowid, method, lot_ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def remaining(conn):
+    return {lot["id"]: float(lot["remainingQuantity"]) for lot in tax_lots.open_lots(conn, "ACME")}
+
+
+@pytest.mark.parametrize("method, lot_ids, expected_remaining, expected_gain", [
+    # Oldest first: 10 from #1 at +$10, 5 from #2 at -$10
+    ("FIFO", None, {2: 5.0, 3: 10.0}, 50),
+    # Newest first: 10 from #3 at +$20, 5 from #2 at -$10
+    ("LIFO", None, {1: 10.0, 2: 5.0}, 150),
+    # Dearest first: 10 from #2 at -$10, 5 from #1 at +$10
+    ("HIFO", None, {1: 5.0, 3: 10.0}, -50),
+    # In the order listed: 10 from #3 at +$20, 5 from #1 at +$10
+    ("SPECIFIC", [3, 1], {1: 5.0, 2: 10.0}, 250),
+])
+def test_sell_closes_lots_in_method_order(conn, method, lot_ids, expected_remaining, expected_gain):
+    trade(conn, "SELL", 15, SALE_PRICE, method=method, lot_ids=lot_ids)
+
+    assert remaining(conn) == expected_remaining
+    assert tax_lots.total_realized_gains(conn) == money.to_cents(expected_gain)
+
+
+def test_duplicate_lot_ids_are_rejected():
+    with pytest.raises(ValueError, match="repeat"):
+        tax_lots.validate_lot_selection("SPECIFIC", [1, 1])
+
+
+def test_duplicate_lot_ids_book_nothing(conn):
+    with pytest.raises(ValueError):
+        trade(conn, "SELL", 15, SALE_PRICE, method="SPECIFIC", lot_ids=[1, 1])
+
+    assert remaining(conn) == {1: 10.0, 2: 10.0, 3: 10.0}
+    assert tax_lots.total_realized_gains(conn) == 0
+
+
+def test_specific_lots_must_cover_the_sale(conn):
+    with pytest.raises(ValueError, match="cover 10.0 shares, not 15.0"):
+        trade(conn, "SELL", 15, SALE_PRICE, method="SPECIFIC", lot_ids=[3])
+
+    assert remaining(conn) == {1: 10.0, 2: 10.0, 3: 10.0}
+
+
+def test_closed_lots_cannot_be_selected(conn):
+    trade(conn, "SELL", 10, SALE_PRICE, method="SPECIFIC", lot_ids=[1])
+
+    with pytest.raises(ValueError, match="not open lots"):
+        trade(conn, "SELL", 5, SALE_PRICE, method="SPECIFIC", lot_ids=[1])
+
+
+@pytest.mark.parametrize("lot_ids", ["12", ["1"], [True], (1, 2)])
+def test_lot_ids_must_be_a_list_of_ints(lot_ids):
+    with pytest.raises(ValueError):
+        tax_lots.validate_lot_selection("SPECIFIC", lot_ids)
+
+
+def test_rebuild_replays_the_ledger_fifo(conn):
+    trade(conn, "SELL", 15, SALE_PRICE, method="HIFO")
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("DELETE FROM tax_lot_sync")
+    cursor.close()
+    conn.commit()
+
+    # An empty watermark replays every trade, and rebuild() always uses FIFO
+    tax_lots.sync(conn)
+
+    assert remaining(conn) == {2: 5.0, 3: 10.0}
+    assert tax_lots.total_realized_gains(conn) == money.to_cents(50)
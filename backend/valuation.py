@@ -0,0 +1,367 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+import crud
+import market_cache
+import money
+from nav_history import ledger_version
+from quote_service import get_quotes
+
+# Seconds a snapshot is reused before holdings and quotes are read again
+SNAPSHOT_TTL = float(os.getenv("VALUATION_SNAPSHOT_TTL", "5"))
+# Seconds between reads of the ledger fingerprint, which catch trades made by other workers
+LEDGER_CHECK_INTERVAL = float(os.getenv("VALUATION_LEDGER_CHECK_INTERVAL", "1"))
+
+
+class Holding(NamedTuple):
+    """One position at the snapshot's quote; price is None when Yahoo had no quote.
+
+    The floats are for display and risk math; totals come from the
+    snapshot's integer columns.
+    """
+    symbol: str
+    name: str
+    sector: Optional[str]
+    industry: Optional[str]
+    quantity: float
+    avg_price: float
+    price: Optional[float]
+
+
+class PortfolioSnapshot(NamedTuple):
+    """Immutable valuation of the default account's portfolio at one point in time.
+
+    Besides the holdings it keeps one int64 column per figure, in money.py
+    units and in holding order, so every total is an exact integer sum.
+    """
+    holdings: tuple
+    quantities: np.ndarray  # share units
+    avg_prices: np.ndarray  # price units
+    prices: np.ndarray  # price units, 0 where unpriced
+    market_values: np.ndarray  # cents at the quote, 0 where unpriced
+    cost_bases: np.ndarray  # cents at the weighted average price
+    cash_cents: int
+    deposit_cents: int
+    as_of: datetime
+    created_at: float
+    quote_generation: int
+
+    @property
+    def priced(self):
+        """Boolean mask of the holdings that have a quote."""
+        return self.prices > 0
+
+    @property
+    def cash_balance(self):
+        return money.dollars(self.cash_cents)
+
+    @property
+    def total_deposits(self):
+        return money.dollars(self.deposit_cents)
+
+    @property
+    def stock_value(self):
+        return money.dollars(int(self.market_values.sum()))
+
+    def age(self):
+        return time.monotonic() - self.created_at
+
+    def is_fresh(self, max_age):
+        """Young enough, and no cached quote has changed since it was priced."""
+        return self.age() < max_age and self.quote_generation == market_cache.quotes.generation
+
+
+_snapshot = None
+_generation = 0
+_lock = threading.Lock()
+
+_ledger = {"version": None, "checked_at": None}
+_ledger_lock = threading.Lock()
+
+
+def compute_snapshot():
+    """Read holdings, cash and deposits once and price every holding with one quote batch."""
+    conn = crud.get_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT pi_symbol, pi_name, pi_sector, pi_industry,
+                   {money.column("pi_total_quantity", money.SHARE_UNITS)} AS quantity,
+                   {money.column("pi_weighted_average_price", money.PRICE_UNITS)} AS avg_price
+            FROM portfolio_item
+            WHERE pi_ca_id = %s
+            ORDER BY pi_symbol
+        """, (crud.DEFAULT_ACCOUNT_ID, ))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    quotes = get_quotes([row["pi_symbol"] for row in rows])
+    row_quotes = [quotes.get(row["pi_symbol"]) for row in rows]
+
+    quantities = np.array([row["quantity"] for row in rows], dtype=np.int64)
+    avg_prices = np.array([row["avg_price"] for row in rows], dtype=np.int64)
+    prices = money.units_array([quote.price if quote else np.nan for quote in row_quotes], money.PRICE_UNITS)
+
+    holdings = tuple(
+        Holding(
+            symbol=row["pi_symbol"],
+            name=row["pi_name"],
+            sector=row["pi_sector"],
+            industry=row["pi_industry"],
+            quantity=row["quantity"] / money.SHARE_UNITS,
+            avg_price=row["avg_price"] / money.PRICE_UNITS,
+            price=quote.price if quote else None,
+        )
+        for row, quote in zip(rows, row_quotes)
+    )
+
+    return PortfolioSnapshot(
+        holdings=holdings,
+        quantities=quantities,
+        avg_prices=avg_prices,
+        prices=prices,
+        market_values=money.value_cents(quantities, prices),
+        cost_bases=money.value_cents(quantities, avg_prices),
+        cash_cents=crud.get_cash_balance_cents(),
+        deposit_cents=crud.get_total_deposit_cents(),
+        as_of=datetime.now(),
+        created_at=time.monotonic(),
+        quote_generation=market_cache.quotes.generation,
+    )
+
+
+def get_snapshot(max_age=SNAPSHOT_TTL):
+    """Return the shared snapshot, recomputing it once it is older than max_age seconds
+    or a cached quote has changed since it was priced.
+
+    Concurrent callers that find it stale wait for a single recomputation
+    instead of each re-reading the database and re-pricing the holdings.
+    """
+    global _snapshot
+
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_fresh(max_age):
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is not None and snapshot.is_fresh(max_age):
+            return snapshot
+
+        generation = _generation
+        snapshot = compute_snapshot()
+        # Don't publish a snapshot that a concurrent trade already made stale
+        if generation == _generation:
+            _snapshot = snapshot
+        return snapshot
+
+
+def _check_ledger():
+    """invalidate() when the ledger fingerprint moved, e.g. after a trade on another worker.
+
+    The fingerprint is read at most every LEDGER_CHECK_INTERVAL seconds; a
+    caller that finds a check in progress doesn't wait for it.
+    """
+    checked_at = _ledger["checked_at"]
+    if checked_at is not None and time.monotonic() - checked_at < LEDGER_CHECK_INTERVAL:
+        return
+    if not _ledger_lock.acquire(blocking=False):
+        return
+    try:
+        conn = crud.get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            fingerprint = ledger_version(cursor)
+            cursor.close()
+        finally:
+            conn.close()
+        _ledger["checked_at"] = time.monotonic()
+        if fingerprint != _ledger["version"]:
+            _ledger["version"] = fingerprint
+            invalidate()
+    finally:
+        _ledger_lock.release()
+
+
+def version():
+    """Portfolio version: (trades and deposits seen, quote cache generation).
+
+    The first part only grows, bumped by invalidate() for trades made here
+    and by _check_ledger() for any other change to the trade and cash
+    ledgers; the second changes whenever a refreshed quote differs from the
+    cached one.
+    """
+    _check_ledger()
+    return (_generation, market_cache.quotes.generation)
+
+
+def invalidate():
+    """Drop the shared snapshot and bump the portfolio version; call after anything that changes holdings or cash."""
+    global _snapshot, _generation
+    _generation += 1
+    _snapshot = None
+
+
+class PositionMatrix(NamedTuple):
+    """Every account's holdings as a sparse accounts x symbols matrix in coordinate form.
+
+    Holding k is quantities[k] share units of symbols[cols[k]] bought at
+    avg_prices[k] price units on average, held by account_ids[rows[k]].
+    Cash and deposits are in cents. Accounts without holdings still have a
+    row, so their cash is valued too.
+    """
+    account_ids: np.ndarray
+    account_names: list
+    cash: np.ndarray
+    deposits: np.ndarray
+    symbols: list
+    rows: np.ndarray
+    cols: np.ndarray
+    quantities: np.ndarray
+    avg_prices: np.ndarray
+
+
+def load_positions():
+    """Read every account, its deposits and every holding with three queries."""
+    conn = crud.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT ca_id, ca_name, {money.column("ca_balance", money.CENTS)}
+            FROM cash_account
+            ORDER BY ca_id
+        """)
+        accounts = cursor.fetchall()
+        cursor.execute(f"""
+            SELECT ct_ca_id, {money.column("SUM(ct_amount)", money.CENTS)}
+            FROM cash_transaction
+            WHERE ct_type = 'DEPOSIT' AND ct_source = 'MANUAL'
+            GROUP BY ct_ca_id
+        """)
+        deposits = dict(cursor.fetchall())
+        cursor.execute(f"""
+            SELECT pi_ca_id, pi_symbol,
+                   {money.column("pi_total_quantity", money.SHARE_UNITS)},
+                   {money.column("pi_weighted_average_price", money.PRICE_UNITS)}
+            FROM portfolio_item
+        """)
+        holdings = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    account_ids = np.array([row[0] for row in accounts], dtype=np.int64)
+    held_accounts = np.array([row[0] for row in holdings], dtype=np.int64)
+    symbols, cols = np.unique(np.array([row[1] for row in holdings], dtype=object), return_inverse=True)
+    return PositionMatrix(
+        account_ids=account_ids,
+        account_names=[row[1] for row in accounts],
+        cash=np.array([row[2] for row in accounts], dtype=np.int64),
+        deposits=np.array([deposits.get(row[0]) or 0 for row in accounts], dtype=np.int64),
+        symbols=symbols.tolist(),
+        # account_ids is sorted, so a binary search maps each holding to its row
+        rows=np.searchsorted(account_ids, held_accounts),
+        cols=cols.astype(np.int64),
+        quantities=np.array([row[2] for row in holdings], dtype=np.int64),
+        avg_prices=np.array([row[3] for row in holdings], dtype=np.int64),
+    )
+
+
+def _sum_by_account(rows, values, n_accounts):
+    """Per-account int64 sums of per-holding values (an exact scatter-add)."""
+    totals = np.zeros(n_accounts, dtype=np.int64)
+    np.add.at(totals, rows, values)
+    return totals
+
+
+def value_positions(positions, prices):
+    """Value every account at once against one quote vector (dollars, NaN where unpriced).
+
+    The quotes are converted to price units once; each holding's price is
+    gathered from that vector and per-account sums are an int64 scatter-add
+    over the matrix rows, i.e. the sparse matrix-vector product
+    positions @ prices in exact cents. Unpriced holdings fall back to their
+    weighted buy price, as on the dashboard. Returns per-account arrays, in
+    cents except returnPercent and positions.
+    """
+    n_accounts = len(positions.account_ids)
+    priced = ~np.isnan(prices)
+    price_units = money.units_array(prices, money.PRICE_UNITS)
+    holding_prices = np.where(priced[positions.cols], price_units[positions.cols], positions.avg_prices)
+
+    equity = _sum_by_account(positions.rows, money.value_cents(positions.quantities, holding_prices), n_accounts)
+    cost_basis = _sum_by_account(positions.rows, money.value_cents(positions.quantities, positions.avg_prices),
+                                 n_accounts)
+    nav = positions.cash + equity
+    profit_loss = nav - positions.deposits
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return_percent = np.where(positions.deposits > 0, profit_loss / positions.deposits * 100, 0.0)
+
+    return {
+        "cash": positions.cash,
+        "equity": equity,
+        "costBasis": cost_basis,
+        "unrealizedGains": equity - cost_basis,
+        "nav": nav,
+        "deposits": positions.deposits,
+        "profitLoss": profit_loss,
+        "returnPercent": return_percent,
+        "positions": np.bincount(positions.rows, minlength=n_accounts),
+    }
+
+
+def _json_column(name, column):
+    """Per-account column as a JSON-ready list: dollars for money, as-is for counts."""
+    if name == "returnPercent":
+        return np.round(column, 2).tolist()
+    if name == "positions":
+        return column.tolist()
+    return money.dollars(column).tolist()
+
+
+def get_book_nav(include_accounts=True):
+    """NAV of every account and of the whole book, priced with one batched quote lookup."""
+    started = time.perf_counter()
+    positions = load_positions()
+    loaded = time.perf_counter()
+
+    quotes = get_quotes(positions.symbols)
+    prices = np.array([quotes[symbol].price if symbol in quotes else np.nan for symbol in positions.symbols])
+    priced = time.perf_counter()
+
+    values = value_positions(positions, prices)
+    valued = time.perf_counter()
+
+    totals = {name: int(column.sum()) for name, column in values.items()
+              if name not in ("returnPercent", "positions")}
+    return_percent = round(totals["profitLoss"] / totals["deposits"] * 100, 2) if totals["deposits"] > 0 else 0
+    totals = {name: money.dollars(cents) for name, cents in totals.items()}
+    totals["returnPercent"] = return_percent
+    result = {
+        "asOf": datetime.now().isoformat(),
+        "accountCount": len(positions.account_ids),
+        "symbolCount": len(positions.symbols),
+        "positionCount": len(positions.rows),
+        "unpricedSymbols": [symbol for symbol, price in zip(positions.symbols, prices) if np.isnan(price)],
+        "totals": totals,
+        "timingsMs": {
+            "load": round((loaded - started) * 1000, 3),
+            "price": round((priced - loaded) * 1000, 3),
+            "value": round((valued - priced) * 1000, 3),
+        },
+    }
+
+    if include_accounts:
+        columns = {name: _json_column(name, column) for name, column in values.items()}
+        result["accounts"] = [
+            {"accountId": account_id, "name": name, **{key: column[i] for key, column in columns.items()}}
+            for i, (account_id, name) in enumerate(zip(positions.account_ids.tolist(), positions.account_names))
+        ]
+    return result
@@ -1,5 +1,5 @@
 import { useState, useEffect } from "react";
-import { useQuery } from "@tanstack/react-query";
+import { useInfiniteQuery, useQuery } from "@tanstack/react-query";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
@@ -11,6 +11,9 @@ import { TrendingUp, TrendingDown, Search, Filter, Calendar, DollarSign, BarChar
 import { format } from "date-fns";
 import { BuySellModal } from "@/components/portfolio/buy-sell-modal";
 
+// Rows per /api/transactions request; more are fetched on demand
+const TRANSACTIONS_PAGE_SIZE = 100;
+
 interface StockData {
   symbol: string;
   companyName: string;
@@ -20,6 +23,15 @@ interface StockData {
   volume: number;
   marketCap: number;
 }
+interface TransactionSummary {
+  totalTransactions: number;
+  buyTransactions: number;
+  sellTransactions: number;
+  totalBuyValue: number;
+  totalSellValue: number;
+  tradingDays: number;
+  mostTradedSymbol: string | null;
+}
 interface Transaction {
   id: number;
   symbol: string;
@@ -48,10 +60,35 @@ export function Trading() {
   const [showBuyModal, setShowBuyModal] = useState(false);
   const [stockDataFinal, setStockDataFinal] = useState<StockData | null>(null);
 
-  const { data: transactions = [], isLoading } = useQuery({
-    queryKey: ['/api/transactions'],
+  // The backend returns one page at a time; "Load more" follows X-Next-Cursor.
+  // Totals over the whole history come from the summary endpoint instead.
+  const {
+    data: transactionPages,
+    isLoading,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
+    queryKey: ['/api/transactions', 'pages'],
+    queryFn: async ({ pageParam }) => {
+      const params = new URLSearchParams({ limit: String(TRANSACTIONS_PAGE_SIZE) });
+      if (pageParam) params.set('cursor', pageParam);
+      const response = await fetch(`/api/transactions?${params}`);
+      const page = await response.json();
+      return {
+        transactions: (Array.isArray(page) ? page : []) as Transaction[],
+        nextCursor: response.headers.get('X-Next-Cursor'),
+      };
+    },
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
+  });
+  const transactions = transactionPages?.pages.flatMap((page) => page.transactions) ?? [];
+
+  const { data: summary } = useQuery<TransactionSummary>({
+    queryKey: ['/api/transactions', 'summary'],
     queryFn: async () => {
-      const response = await fetch('/api/transactions');
+      const response = await fetch('/api/transactions/summary');
       return response.json();
     }
   });
@@ -129,37 +166,24 @@ export function Trading() {
     return matchesSearch && matchesType && matchesDate;
   });
 
-  // Calculate better metrics
-  const totalBuyValue = transactions
-    .filter((t: Transaction) => t.type === 'buy')
-    .reduce((sum: number, t: Transaction) => sum + t.totalAmount, 0);
-
-  const totalSellValue = transactions
-    .filter((t: Transaction) => t.type === 'sell')
-    .reduce((sum: number, t: Transaction) => sum + t.totalAmount, 0);
-
-  const totalTransactions = transactions.length;
-  const buyTransactions = transactions.filter((t: Transaction) => t.type === 'buy').length;
-  const sellTransactions = transactions.filter((t: Transaction) => t.type === 'sell').length;
+  // Whole-history metrics, computed by the backend
+  const totalBuyValue = summary?.totalBuyValue ?? 0;
+  const totalSellValue = summary?.totalSellValue ?? 0;
+  const totalTransactions = summary?.totalTransactions ?? 0;
+  const buyTransactions = summary?.buyTransactions ?? 0;
+  const sellTransactions = summary?.sellTransactions ?? 0;
 
   // Calculate realized gains (simplified - actual calculation would need buy/sell matching)
   const realizedGains = portfolio?.realizedGains || 0;
 
-  // Calculate most traded stock
-  const stockTradeCounts = transactions.reduce((acc: { [key: string]: number }, t: Transaction) => {
-    acc[t.symbol] = (acc[t.symbol] || 0) + 1;
-    return acc;
-  }, {});
-  const mostTradedStock = Object.entries(stockTradeCounts)
-    .sort(([,a], [,b]) => (b as number) - (a as number))[0]?.[0] || 'N/A';
+  const mostTradedStock = summary?.mostTradedSymbol || 'N/A';
 
   // Calculate average trade size
   const averageTradeSize = totalTransactions > 0 
     ? (totalBuyValue + totalSellValue) / totalTransactions 
     : 0;
 
-  // Calculate active trading days
-  const uniqueTradingDays = new Set(transactions.map((t: Transaction) => t.date)).size;
+  const uniqueTradingDays = summary?.tradingDays ?? 0;
 
   // Pagination logic
   const totalPages = Math.ceil(filteredTransactions.length / transactionsPerPage);
@@ -606,6 +630,20 @@ export function Trading() {
                 )}
               </div>
             )}
+
+            {hasNextPage && (
+              <div className="flex justify-center pt-6">
+                <Button
+                  variant="outline"
+                  onClick={() => fetchNextPage()}
+                  disabled={isFetchingNextPage}
+                >
+                  {isFetchingNextPage
+                    ? "Loading..."
+                    : `Load more (${transactions.length} of ${totalTransactions} loaded)`}
+                </Button>
+              </div>
+            )}
           </CardContent>
         </Card>
         </div>
@@ -1,5 +1,6 @@
-import type { Express } from "express";
+import type { Express, Response as ExpressResponse } from "express";
 import { createServer, type Server } from "http";
+import { Readable } from "stream";
 import { storage } from "./storage";
 import { stockService } from "./services/stock-service";
 import { aiService } from "./services/ai-service";
@@ -14,6 +15,16 @@ import { z } from "zod";
 
 const DEFAULT_USER_ID = "default-user"; // For demo purposes
 
+// Flask marks market responses that missed its quote deadline for some symbols
+function forwardPartialHeaders(response: globalThis.Response, res: ExpressResponse) {
+  for (const header of ["X-Partial-Response", "X-Missing-Symbols"]) {
+    const value = response.headers.get(header);
+    if (value) {
+      res.setHeader(header, value);
+    }
+  }
+}
+
 export async function registerRoutes(app: Express): Promise<Server> {
   
   // Get portfolio summary - integrates with   MySQL Flask backend
@@ -21,7 +32,18 @@ export async function registerRoutes(app: Express): Promise<Server> {
     try {
       // First try to fetch from   Flask backend  
       try {
-        const response = await fetch('http://localhost:8000/api/portfolio');
+        // Pass the client's ETag through so unchanged polls cost Flask nothing
+        const ifNoneMatch = req.headers['if-none-match'];
+        const response = await fetch('http://localhost:8000/api/portfolio', {
+          headers: ifNoneMatch ? { 'If-None-Match': ifNoneMatch } : {},
+        });
+        const etag = response.headers.get('etag');
+        if (etag) {
+          res.setHeader('ETag', etag);
+        }
+        if (response.status === 304) {
+          return res.status(304).end();
+        }
         if (response.ok) {
           const portfolioData = await response.json();
           return res.json(portfolioData);
@@ -91,6 +113,28 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  // Live portfolio and quote deltas (Server-Sent Events), piped through from Flask
+  app.get("/api/stream/portfolio", async (req, res) => {
+    const controller = new AbortController();
+    req.on("close", () => controller.abort());
+    try {
+      const response = await fetch('http://localhost:8000/api/stream/portfolio', { signal: controller.signal });
+      if (!response.ok || !response.body) {
+        return res.status(502).json({ message: "Live updates unavailable" });
+      }
+      res.setHeader('Content-Type', 'text/event-stream');
+      res.setHeader('Cache-Control', 'no-cache');
+      res.setHeader('X-Accel-Buffering', 'no');
+      res.flushHeaders();
+      Readable.fromWeb(response.body as any).pipe(res);
+    } catch (error) {
+      if (!res.headersSent) {
+        console.error("Live update stream error:", error);
+        res.status(502).json({ message: "Live updates unavailable" });
+      }
+    }
+  });
+
   // Get sector performance - integrates with Flask backend
   app.get("/api/sector-performance", async (req, res) => {
     try {
@@ -99,6 +143,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
         const response = await fetch('http://localhost:8000/api/sector_performance');
         if (response.ok) {
           const sectorData = await response.json();
+          forwardPartialHeaders(response, res);
           return res.json(sectorData);
         }
       } catch (flaskError) {
@@ -154,6 +199,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
         const response = await fetch('http://localhost:8000/api/economic_indicators');
         if (response.ok) {
           const economicData = await response.json();
+          forwardPartialHeaders(response, res);
           return res.json(economicData);
         }
       } catch (flaskError) {
@@ -417,6 +463,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
         
         if (response.ok) {
           const realMarketData = await response.json();
+          forwardPartialHeaders(response, res);
           console.log('✅ Fetched real market data from Flask backend');
           
           // Convert to the format expected by the frontend
@@ -635,23 +682,31 @@ export async function registerRoutes(app: Express): Promise<Server> {
       // First try to fetch from Flask backend for real portfolio transactions
       try {
         console.log('🔍 Attempting to fetch transactions from Flask backend...');
-        const response = await fetch(`http://localhost:8000/api/transactions`);
+        // Forward limit/cursor/filters so Flask only reads the requested page
+        const query = new URLSearchParams(req.query as Record<string, string>).toString();
+        const response = await fetch(`http://localhost:8000/api/transactions${query ? `?${query}` : ''}`);
         
         if (response.ok) {
           const transactions = await response.json();
           console.log(`✅ Fetched ${transactions.length} transactions from Flask backend`);
           
-          // Apply limit only if explicitly specified
-          const limitedTransactions = limit ? transactions.slice(0, limit) : transactions;
-          return res.json(limitedTransactions);
-        } else {
-          console.log(`❌ Flask backend returned ${response.status} for transactions`);
+          const nextCursor = response.headers.get('x-next-cursor');
+          if (nextCursor) {
+            res.setHeader('X-Next-Cursor', nextCursor);
+          }
+          return res.json(transactions);
         }
+
+        // Flask answered, e.g. 400 for a bad cursor or filter: pass it on instead of serving mock data
+        console.log(`❌ Flask backend returned ${response.status} for transactions`);
+        res.status(response.status);
+        res.type(response.headers.get('content-type') || 'application/json');
+        return res.send(await response.text());
       } catch (flaskError) {
         console.log('⚠️ Flask backend error for transactions:', (flaskError as Error).message);
       }
 
-      // Fallback to mock data if Flask backend is not available
+      // Fallback to mock data only if the Flask backend could not be reached
       console.log('🔄 Using fallback transaction data');
       const userId = DEFAULT_USER_ID;
       const transactions = await storage.getUserTransactions(userId, limit || 10);
@@ -662,6 +717,41 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  // Whole-history trade totals, so the client can load transactions one page at a time
+  app.get("/api/transactions/summary", async (req, res) => {
+    try {
+      try {
+        const query = new URLSearchParams(req.query as Record<string, string>).toString();
+        const response = await fetch(`http://localhost:8000/api/transactions/summary${query ? `?${query}` : ''}`);
+        res.status(response.status);
+        res.type(response.headers.get('content-type') || 'application/json');
+        return res.send(await response.text());
+      } catch (flaskError) {
+        console.log('⚠️ Flask backend error for transaction summary:', (flaskError as Error).message);
+      }
+
+      // Fallback to the mock transactions only if the Flask backend could not be reached
+      const transactions = await storage.getUserTransactions(DEFAULT_USER_ID, Number.MAX_SAFE_INTEGER);
+      const valueOf = (type: string) => transactions
+        .filter(t => t.type === type)
+        .reduce((sum, t) => sum + parseFloat(t.totalAmount), 0);
+      const counts: Record<string, number> = {};
+      transactions.forEach(t => { counts[t.symbol] = (counts[t.symbol] || 0) + 1; });
+      res.json({
+        totalTransactions: transactions.length,
+        buyTransactions: transactions.filter(t => t.type === 'buy').length,
+        sellTransactions: transactions.filter(t => t.type === 'sell').length,
+        totalBuyValue: valueOf('buy'),
+        totalSellValue: valueOf('sell'),
+        tradingDays: new Set(transactions.map(t => t.createdAt?.toISOString().slice(0, 10))).size,
+        mostTradedSymbol: Object.entries(counts).sort(([, a], [, b]) => b - a)[0]?.[0] ?? null,
+      });
+    } catch (error) {
+      console.error("Transaction summary error:", error);
+      res.status(500).json({ message: "Failed to fetch transaction summary" });
+    }
+  });
+
   // Get chat history
   app.get("/api/chat/history", async (req, res) => {
     try {